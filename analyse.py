@@ -0,0 +1,196 @@
+import argparse, csv, json, os, threading, time
+from itertools import chain
+import numpy as np
+from db import versionen_lesen, shard
+
+# =============================================================
+# SAISON-ANALYSE (spaltenweise mit NumPy)
+# =============================================================
+# Lädt Reservierungen, Vergaben und loot_punkte einmal als Spalten-Arrays und rechnet alle
+# Kennzahlen mit vektorisierten Gruppierungen (bincount, unique, searchsorted) statt mit einer
+# SQL-Abfrage pro Item, Boss oder Klasse. Gezählt werden nur gesperrte Raids (punkte_vergeben = 1).
+# Vergaben kommen aus dem Punkte-Journal (Buchungsart 'vergabe'); ältere Vergaben, die nur im
+# Log-Buch stehen, fehlen. Der Bericht wird pro Prozess und Datenbank gehalten, bis raid_abschliessen den
+# Zähler 'analyse' erhöht. Export: python analyse.py [--ausgabe bericht.json] [--csv verzeichnis] [--gilde NAME]
+VERTEILUNG_MAX = 10  # Zeit bis Loot: Raids 1..9 einzeln, ab 10 in einem Bucket
+TOP_ITEMS = 50
+MIN_RAIDS = 3  # Items, die seltener reserviert wurden, tauchen in der Item-Rangliste nicht auf
+
+_berichte = {}  # Datenbank -> (version, bericht)
+_lock = threading.Lock()
+
+def _zeilen(conn, sql, spalten, params=()):
+    # Ohne sqlite3.Row und ohne Zwischenliste: die Tupel laufen direkt in ein flaches Array
+    cursor = conn.cursor(); cursor.row_factory = None
+    return np.fromiter(chain.from_iterable(cursor.execute(sql, params)), dtype=np.int64).reshape(-1, spalten)
+
+def _positionen(ids, werte):
+    # Index jedes Werts in ids (unsortiert erlaubt), -1 für unbekannte ids
+    if not len(ids): return np.full(len(werte), -1, dtype=np.int64)
+    reihenfolge = np.argsort(ids, kind='stable'); sortiert = ids[reihenfolge]
+    pos = np.minimum(np.searchsorted(sortiert, werte), len(sortiert) - 1)
+    return np.where(sortiert[pos] == werte, reihenfolge[pos], -1)
+
+def laden(conn):
+    # Alle Spalten in einer Lesetransaktion; ids sind auf Positionen 0..n-1 abgebildet, Raids chronologisch
+    eigene = not conn.in_transaction
+    if eigene: conn.execute('BEGIN')
+    try:
+        raids = conn.execute('SELECT id, raid_datum FROM raids WHERE punkte_vergeben = 1 ORDER BY raid_datum, raid_zeit, id').fetchall()
+        items = conn.execute('SELECT id, item_name, boss_name, raid_instanz, ruestungstyp FROM items ORDER BY id').fetchall()
+        charaktere = conn.execute('SELECT id, klasse FROM charaktere ORDER BY id').fetchall()
+        reservierungen = _zeilen(conn, 'SELECT a.raid_id, a.spieler_id, r.item_id FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id', 3)
+        vergaben = _zeilen(conn, 'SELECT raid_id, spieler_id, item_id FROM punkte_buchungen WHERE art = ? AND raid_id IS NOT NULL', 3, ('vergabe',))
+        punkte = _zeilen(conn, 'SELECT spieler_id, item_id, punkte FROM loot_punkte WHERE punkte > 0', 3)
+    finally:
+        if eigene: conn.rollback()
+    raid_ids = np.array([r[0] for r in raids], dtype=np.int64); item_ids = np.array([i[0] for i in items], dtype=np.int64)
+    charakter_ids = np.array([c[0] for c in charaktere], dtype=np.int64)
+    d = {'raid_datum': [r[1] for r in raids], 'items': [tuple(i[1:]) for i in items], 'klasse': [c[1] for c in charaktere]}
+    for name, zeilen in (('res', reservierungen), ('verg', vergaben)):
+        raid, spieler, item = _positionen(raid_ids, zeilen[:, 0]), _positionen(charakter_ids, zeilen[:, 1]), _positionen(item_ids, zeilen[:, 2])
+        gueltig = (raid >= 0) & (spieler >= 0) & (item >= 0)
+        d[name] = {'raid': raid[gueltig], 'spieler': spieler[gueltig], 'item': item[gueltig]}
+    spieler, item = _positionen(charakter_ids, punkte[:, 0]), _positionen(item_ids, punkte[:, 1])
+    gueltig = (spieler >= 0) & (item >= 0)
+    d['punkte'] = {'spieler': spieler[gueltig], 'item': item[gueltig], 'punkte': punkte[gueltig, 2]}
+    return d
+
+
+# --- Kennzahlen ---
+def _kennzahlen(werte):
+    if not len(werte): return {'anzahl': 0, 'mittel': None, 'median': None, 'p90': None, 'max': None}
+    return {'anzahl': int(len(werte)), 'mittel': round(float(werte.mean()), 2), 'median': round(float(np.median(werte)), 1),
+            'p90': round(float(np.percentile(werte, 90)), 1), 'max': int(werte.max())}
+
+def zeit_bis_loot(d):
+    # Pro Vergabe: in wie vielen gesperrten Raids hat der Charakter das Item seit der letzten Vergabe
+    # desselben Items an ihn reserviert (Vergabe-Raid eingeschlossen). Vergaben ohne Reservierung zählen nicht.
+    res, verg = d['res'], d['verg']; n_items = len(d['items']); faktor = len(d['raid_datum']) + 1
+    res_wert = np.sort((res['spieler'] * n_items + res['item']) * faktor + res['raid'])
+    schluessel = verg['spieler'] * n_items + verg['item']; reihenfolge = np.lexsort((verg['raid'], schluessel))
+    schluessel, raid, item = schluessel[reihenfolge], verg['raid'][reihenfolge], verg['item'][reihenfolge]
+    wert = schluessel * faktor + raid
+    gleich = np.r_[False, schluessel[1:] == schluessel[:-1]]
+    vorher = np.where(gleich, np.r_[0, wert[:-1]], schluessel * faktor - 1)
+    raids = np.searchsorted(res_wert, wert, side='right') - np.searchsorted(res_wert, vorher, side='right')
+    mit_reservierung = raids > 0; raids, item = raids[mit_reservierung], item[mit_reservierung]
+    instanzen, instanz_pro_item = np.unique(np.array([i[2] for i in d['items']] or [''], dtype=object), return_inverse=True)
+    instanz = instanz_pro_item[item] if len(item) else item
+    ergebnis = []
+    for pos, name in enumerate(instanzen):
+        werte = raids[instanz == pos]
+        if not len(werte): continue
+        verteilung = np.bincount(np.minimum(werte, VERTEILUNG_MAX), minlength=VERTEILUNG_MAX + 1)[1:]
+        ergebnis.append(dict(instanz=name, **_kennzahlen(werte), verteilung=verteilung.tolist()))
+    gesamt = np.bincount(np.minimum(raids, VERTEILUNG_MAX), minlength=VERTEILUNG_MAX + 1)[1:] if len(raids) else np.zeros(VERTEILUNG_MAX, dtype=np.int64)
+    return {'instanzen': ergebnis, 'gesamt': dict(_kennzahlen(raids), verteilung=gesamt.tolist())}
+
+def konkurrenz(d):
+    # Reservierer pro Raid und Item; daraus Kennzahlen pro Item und pro Boss (Instanz + Bossname)
+    res, verg = d['res'], d['verg']; n_items = len(d['items'])
+    if not n_items: return {'items': [], 'bosse': []}
+    raid_item, reservierer = np.unique(res['raid'] * n_items + res['item'], return_counts=True)
+    item = raid_item % n_items
+    raids = np.bincount(item, minlength=n_items); summe = np.bincount(item, weights=reservierer, minlength=n_items)
+    maximum = np.zeros(n_items, dtype=np.int64); np.maximum.at(maximum, item, reservierer)
+    vergaben = np.bincount(verg['item'], minlength=n_items)
+    mittel = np.divide(summe, raids, out=np.zeros(n_items), where=raids > 0)
+    rangfolge = [i for i in np.lexsort((-summe, -mittel)) if raids[i] >= MIN_RAIDS][:TOP_ITEMS]
+    items = [{'item': d['items'][i][0], 'boss': d['items'][i][1], 'instanz': d['items'][i][2], 'raids': int(raids[i]), 'reservierungen': int(summe[i]),
+              'reservierer_mittel': round(float(mittel[i]), 2), 'reservierer_max': int(maximum[i]), 'vergaben': int(vergaben[i]),
+              'reservierungen_pro_vergabe': round(float(summe[i] / vergaben[i]), 1) if vergaben[i] else None} for i in rangfolge]
+    bosse, boss_pro_item = np.unique(np.array([f'{i[2]}\x00{i[1]}' for i in d['items']], dtype=object), return_inverse=True)
+    n_bosse = len(bosse); boss_raids = np.bincount(boss_pro_item[item], minlength=n_bosse) if len(item) else np.zeros(n_bosse, dtype=np.int64)
+    boss_summe = np.bincount(boss_pro_item, weights=summe, minlength=n_bosse); boss_vergaben = np.bincount(boss_pro_item, weights=vergaben, minlength=n_bosse)
+    boss_items = np.bincount(boss_pro_item, weights=raids > 0, minlength=n_bosse)
+    bosse_liste = [{'instanz': name.split('\x00')[0], 'boss': name.split('\x00')[1], 'items': int(boss_items[b]), 'reservierungen': int(boss_summe[b]),
+                    'reservierer_mittel': round(float(boss_summe[b] / boss_raids[b]), 2), 'vergaben': int(boss_vergaben[b]),
+                    'reservierungen_pro_vergabe': round(float(boss_summe[b] / boss_vergaben[b]), 1) if boss_vergaben[b] else None}
+                   for b, name in enumerate(bosse) if boss_raids[b]]
+    return {'items': items, 'bosse': sorted(bosse_liste, key=lambda b: -b['reservierer_mittel'])}
+
+def punkte_pro_klasse(d, item_class_map):
+    # Aktueller Punktestand pro Klasse (Verteilung über die Charaktere) und Anteil der Punkte auf Items,
+    # die laut ITEM_CLASS_MAP nicht für die Klasse gedacht sind; dazu Gutschriften pro Quartal.
+    klassen, klasse_pro_charakter = np.unique(np.array(d['klasse'] or [''], dtype=object), return_inverse=True)
+    n_klassen = len(klassen); n_charaktere = len(d['klasse']); p = d['punkte']
+    pro_charakter = np.bincount(p['spieler'], weights=p['punkte'], minlength=n_charaktere)
+    typ = np.array([i[3] or '' for i in d['items']] or [''], dtype=object)
+    fremd_paare = {(t, k) for t in item_class_map for k in klassen if k not in item_class_map[t]}
+    fremd_matrix = np.array([[(t, k) in fremd_paare for k in klassen] for t in typ], dtype=bool).reshape(-1, n_klassen)
+    klasse_p = klasse_pro_charakter[p['spieler']] if len(p['spieler']) else p['spieler']
+    fremd = np.bincount(klasse_p, weights=p['punkte'] * fremd_matrix[p['item'], klasse_p], minlength=n_klassen) if len(klasse_p) else np.zeros(n_klassen)
+    ergebnis = []
+    for k, name in enumerate(klassen):
+        if not n_charaktere: break
+        werte = pro_charakter[klasse_pro_charakter == k]; summe = float(werte.sum())
+        ergebnis.append(dict(klasse=name, **_kennzahlen(werte), punkte=int(summe), fremd_anteil=round(float(fremd[k]) / summe * 100, 1) if summe else 0.0))
+    # Gutschriften pro Quartal: jede Reservierung eines gesperrten Raids ist ein Punkt
+    quartal_pro_raid = np.array([int(t[:4]) * 4 + (int(t[5:7]) - 1) // 3 for t in d['raid_datum']], dtype=np.int64)
+    res = d['res']; quartale = []; werte = []
+    if len(res['raid']) and n_charaktere:
+        quartal = quartal_pro_raid[res['raid']]; erstes = int(quartal.min()); q = quartal - erstes; n_q = int(q.max()) + 1
+        klasse_r = klasse_pro_charakter[res['spieler']]
+        gutschriften = np.bincount(q * n_klassen + klasse_r, minlength=n_q * n_klassen).reshape(n_q, n_klassen)
+        aktiv_paare = np.unique(q * n_charaktere + res['spieler'])
+        aktiv = np.bincount((aktiv_paare // n_charaktere) * n_klassen + klasse_pro_charakter[aktiv_paare % n_charaktere], minlength=n_q * n_klassen).reshape(n_q, n_klassen)
+        pro_aktivem = np.divide(gutschriften, aktiv, out=np.zeros(gutschriften.shape), where=aktiv > 0)
+        quartale = [f'{(erstes + i) // 4}-Q{(erstes + i) % 4 + 1}' for i in range(n_q)]
+        werte = np.round(pro_aktivem, 1).tolist()
+    return {'klassen': ergebnis, 'inflation': {'klassen': [str(k) for k in klassen] if n_charaktere else [], 'quartale': quartale, 'werte': werte}}
+
+def berechnen(conn, item_class_map):
+    start = time.perf_counter(); d = laden(conn); geladen = time.perf_counter()
+    bericht = {'erstellt': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'umfang': {'raids': len(d['raid_datum']), 'reservierungen': int(len(d['res']['raid'])), 'vergaben': int(len(d['verg']['raid'])), 'punkte_eintraege': int(len(d['punkte']['punkte']))},
+               'zeit_bis_loot': zeit_bis_loot(d), 'konkurrenz': konkurrenz(d), 'punkte': punkte_pro_klasse(d, item_class_map)}
+    bericht['dauer_ms'] = {'laden': round((geladen - start) * 1000, 1), 'rechnen': round((time.perf_counter() - geladen) * 1000, 1)}
+    return bericht
+
+def bericht(conn, item_class_map):
+    # Zwischengespeicherter Bericht; neu berechnet, sobald sich der Zähler 'analyse' geändert hat
+    version = versionen_lesen(conn, 'analyse')
+    with _lock:
+        eintrag = _berichte.get(shard(conn))
+        if eintrag is None or version is None or version != eintrag[0]: eintrag = _berichte[shard(conn)] = (version, berechnen(conn, item_class_map))
+        return eintrag[1]
+
+
+# --- Export ---
+def csv_schreiben(bericht, verzeichnis):
+    # Eine Datei pro Tabelle (Semikolon-getrennt); liefert die geschriebenen Pfade
+    os.makedirs(verzeichnis, exist_ok=True)
+    verteilung = [f'raids_{i}' for i in range(1, VERTEILUNG_MAX)] + [f'raids_{VERTEILUNG_MAX}_plus']
+    kennzahlen = ['anzahl', 'mittel', 'median', 'p90', 'max']; inflation = bericht['punkte']['inflation']
+    tabellen = {'zeit_bis_loot': (['instanz'] + kennzahlen + verteilung, [[z['instanz']] + [z[s] for s in kennzahlen] + z['verteilung'] for z in bericht['zeit_bis_loot']['instanzen']]),
+                'inflation': (['quartal'] + inflation['klassen'], [[q] + w for q, w in zip(inflation['quartale'], inflation['werte'])])}
+    for name, zeilen in (('konkurrenz_items', bericht['konkurrenz']['items']), ('konkurrenz_bosse', bericht['konkurrenz']['bosse']), ('punkte_klassen', bericht['punkte']['klassen'])):
+        kopf = list(zeilen[0]) if zeilen else []; tabellen[name] = (kopf, [[z[s] for s in kopf] for z in zeilen])
+    pfade = []
+    for name, (kopf, zeilen) in tabellen.items():
+        pfad = os.path.join(verzeichnis, f'{name}.csv')
+        with open(pfad, 'w', newline='', encoding='utf-8') as datei: writer = csv.writer(datei, delimiter=';'); writer.writerow(kopf); writer.writerows(zeilen)
+        pfade.append(pfad)
+    return pfade
+
+if __name__ == '__main__':
+    from db import verbinden
+    from database_setup import migrieren
+    import gilden
+    parser = argparse.ArgumentParser(description='Saison-Analyse über alle gesperrten Raids berechnen und exportieren.')
+    parser.add_argument('--ausgabe', help='JSON-Datei (ohne Angabe und ohne --csv: Ausgabe auf stdout)')
+    parser.add_argument('--csv', metavar='VERZEICHNIS', help='zusätzlich eine CSV-Datei pro Tabelle in dieses Verzeichnis schreiben')
+    gilden.optionen(parser); args = parser.parse_args()
+    if args.alle_gilden: parser.error('der Bericht gilt für eine Datenbank: --gilde NAME statt --alle-gilden')
+    from app import ITEM_CLASS_MAP
+    pfad = gilden.datenbanken(args)[0]; migrieren(pfad); conn = verbinden(pfad)
+    try: ergebnis = berechnen(conn, ITEM_CLASS_MAP)
+    finally: conn.close()
+    if args.ausgabe:
+        with open(args.ausgabe, 'w', encoding='utf-8') as datei: json.dump(ergebnis, datei, ensure_ascii=False, indent=2)
+        print(f"Bericht gespeichert: {args.ausgabe}")
+    if args.csv:
+        for pfad in csv_schreiben(ergebnis, args.csv): print(f"CSV gespeichert: {pfad}")
+    if not args.ausgabe and not args.csv: print(json.dumps(ergebnis, ensure_ascii=False, indent=2))
+    else: print(f"Laden {ergebnis['dauer_ms']['laden']} ms, Rechnen {ergebnis['dauer_ms']['rechnen']} ms ({ergebnis['umfang']['raids']} Raids, {ergebnis['umfang']['reservierungen']} Reservierungen).")
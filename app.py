@@ -1,544 +1,816 @@
-import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
-from collections import Counter
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_bcrypt import Bcrypt
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-
-app = Flask(__name__)
-app.secret_key = 'dein_sehr_geheimer_schluessel_muss_gesetzt_sein' 
-bcrypt = Bcrypt(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = "Bitte melde dich an, um diese Seite zu sehen."
-login_manager.login_message_category = "error"
-
-# =============================================================
-# GLOBALE EINSTELLUNGEN
-# =============================================================
-ALLOW_DUPLICATE_RESERVATIONS = False
-RESERVATION_SLOTS = { 'Tank': 3, 'Heal': 3, 'DPS': 2, 'default': 3 }
-WISHLIST_SLOTS = 6
-ITEM_CLASS_MAP = {
-    'Stoff': ['Magier', 'Hexenmeister', 'Priester', 'Druide', 'Schamane'],
-    'Leder': ['Schurke', 'Druide', 'Schamane', 'Krieger'],
-    'Kette': ['Jäger', 'Schamane'],
-    'Platte': ['Krieger', 'Paladin'],
-    'Zauberstab': ['Magier', 'Hexenmeister', 'Priester'],
-    'Schusswaffe': ['Jäger', 'Krieger', 'Schurke'],
-    'Wurfwaffe': ['Krieger', 'Schurke'],
-    'Relikt': ['Schamane', 'Druide', 'Paladin']
-}
-# =============================================================
-
-class User(UserMixin):
-    def __init__(self, id, username, role): self.id = id; self.username = username; self.role = role
-
-@login_manager.user_loader
-def load_user(user_id):
-    conn = get_db_connection(); user_data = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone(); conn.close()
-    return User(id=user_data['id'], username=user_data['username'], role=user_data['role']) if user_data else None
-
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role != 'admin':
-            flash('Für diese Aktion sind Admin-Rechte erforderlich.', 'error'); return redirect(url_for('raid_liste'))
-        return f(*args, **kwargs)
-    return decorated_function
-
-def get_db_connection():
-    conn = sqlite3.connect('loot_system.db'); conn.execute("PRAGMA foreign_keys = ON"); conn.row_factory = sqlite3.Row
-    return conn
-
-def log_action(aktion, details, raid_id=None):
-    conn = get_db_connection(); user = current_user.username if current_user.is_authenticated else "System"
-    full_details = f"[{user}] {details}"; conn.execute('INSERT INTO logs (aktion, details, raid_id) VALUES (?, ?, ?)', (aktion, full_details, raid_id)); conn.commit(); conn.close()
-
-# === BENUTZER-AUTHENTIFIZIERUNG & KONTO ===
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if current_user.is_authenticated: return redirect(url_for('raid_liste'))
-    if request.method == 'POST':
-        username = request.form['username']; password = request.form['password']; conn = get_db_connection()
-        if conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone():
-            flash('Dieser Benutzername ist bereits vergeben.', 'error'); return redirect(url_for('register'))
-        password_hash = generate_password_hash(password)
-        role = 'admin' if conn.execute('SELECT COUNT(id) as count FROM users').fetchone()['count'] == 0 else 'member'
-        conn.execute('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)', (username, password_hash, role)); conn.commit(); conn.close()
-        flash(f'Account erstellt! Der erste User ist automatisch Admin. Bitte einloggen.', 'success'); return redirect(url_for('login'))
-    return render_template('register.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated: return redirect(url_for('raid_liste'))
-    if request.method == 'POST':
-        username = request.form['username']; password = request.form['password']; conn = get_db_connection()
-        user_data = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone(); conn.close()
-        if user_data and check_password_hash(user_data['password_hash'], password):
-            login_user(User(id=user_data['id'], username=user_data['username'], role=user_data['role'])); return redirect(url_for('raid_liste'))
-        else: flash('Falscher Benutzername oder Passwort.', 'error')
-    return render_template('login.html')
-
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user(); return redirect(url_for('login'))
-
-# === ÖFFENTLICHE & BENUTZER-SEITEN ===
-@app.route('/')
-def index(): 
-    return redirect(url_for('raid_liste'))
-
-@app.route('/raids')
-def raid_liste():
-    conn = get_db_connection(); raids = conn.execute("SELECT * FROM raids WHERE status != 'Abgeschlossen' ORDER BY raid_datum DESC, raid_zeit DESC").fetchall(); conn.close()
-    return render_template('raid_liste.html', raid_liste=raids)
-
-@app.route('/punkte')
-@login_required
-def punkte_uebersicht():
-    sort_by = request.args.get('sort', 'item_name'); order = request.args.get('order', 'asc')
-    allowed_sorts = ['item_name', 'charakter_name', 'punkte']
-    if sort_by not in allowed_sorts: sort_by = 'item_name'
-    if order not in ['asc', 'desc']: order = 'asc'
-    conn = get_db_connection()
-    query = f"SELECT i.item_name, c.charakter_name, lp.punkte FROM loot_punkte lp JOIN charaktere c ON lp.spieler_id = c.id JOIN items i ON lp.item_id = i.id WHERE lp.punkte > 0 ORDER BY {sort_by} {order}"
-    punkte_liste = conn.execute(query).fetchall(); conn.close()
-    next_orders = {col: 'desc' if sort_by == col and order == 'asc' else 'asc' for col in allowed_sorts}
-    return render_template('punkte_uebersicht.html', punkte_liste=punkte_liste, current_sort=sort_by, current_order=order, next_orders=next_orders)
-
-@app.route('/raid/<int:raid_id>/anmelden', methods=['GET', 'POST'])
-@login_required
-def raid_anmelden(raid_id):
-    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
-    if raid['status'] != 'Offen': return "Anmeldungen für diesen Raid sind geschlossen.", 403
-    charaktere_des_users = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall()
-    if request.method == 'POST':
-        spieler_id = request.form['spieler_id']
-        if not conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (spieler_id, current_user.id)).fetchone():
-            flash('Ungültige Charakterauswahl.', 'error'); return redirect(url_for('raid_anmelden', raid_id=raid_id))
-        if conn.execute('SELECT id FROM anmeldungen WHERE spieler_id = ? AND raid_id = ?', (spieler_id, raid_id)).fetchone():
-            flash('Dieser Charakter ist bereits für den Raid angemeldet.', 'error'); return redirect(url_for('raid_anmelden', raid_id=raid_id))
-        rolle_angemeldet = request.form['rolle_angemeldet']; item_ids = [item_id for item_id in request.form.getlist('item_ids') if item_id]
-        cursor = conn.cursor(); cursor.execute('INSERT INTO anmeldungen (spieler_id, raid_id, rolle_angemeldet) VALUES (?, ?, ?)', (spieler_id, raid_id, rolle_angemeldet))
-        anmeldung_id = cursor.lastrowid
-        processed_items = list(set(item_ids))
-        for item_id in processed_items: conn.execute('INSERT OR IGNORE INTO reservierungen (anmeldung_id, item_id) VALUES (?, ?)', (anmeldung_id, item_id))
-        conn.commit(); conn.close(); flash(f'Anmeldung erfolgreich!', 'success'); return redirect(url_for('raid_liste'))
-    
-    angemeldete_spieler = conn.execute('SELECT spieler_id FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchall()
-    angemeldete_spieler_ids = [row['spieler_id'] for row in angemeldete_spieler]
-    item_liste_rows = conn.execute('SELECT * FROM items WHERE raid_instanz = ? ORDER BY boss_name, item_name', (raid['raid_instanz'],)).fetchall(); conn.close()
-    item_liste_dicts = [dict(row) for row in item_liste_rows]
-    return render_template('raid_anmelden.html', raid=raid, spieler_liste=charaktere_des_users, item_liste=item_liste_dicts, allow_duplicates=ALLOW_DUPLICATE_RESERVATIONS, angemeldete_spieler_ids=angemeldete_spieler_ids, reservation_slots=RESERVATION_SLOTS)
-
-@app.route('/meine-anmeldungen')
-@login_required
-def meine_anmeldungen():
-    conn = get_db_connection()
-    anmeldungen = conn.execute('SELECT a.id as anmeldung_id, a.rolle_angemeldet, c.charakter_name, r.* FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id JOIN raids r ON a.raid_id = r.id WHERE c.user_id = ? AND r.status != "Abgeschlossen" ORDER BY r.raid_datum, r.raid_zeit', (current_user.id,)).fetchall(); conn.close()
-    return render_template('meine_anmeldungen.html', anmeldungen=anmeldungen)
-
-@app.route('/anmeldung/<int:anmeldung_id>/stornieren', methods=['POST'])
-@login_required
-def anmeldung_stornieren(anmeldung_id):
-    conn = get_db_connection()
-    anmeldung = conn.execute('SELECT a.*, c.user_id, r.status, r.punkte_vergeben FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id JOIN raids r ON a.raid_id = r.id WHERE a.id = ?', (anmeldung_id,)).fetchone()
-    if not anmeldung or anmeldung['user_id'] != current_user.id:
-        flash("Anmeldung nicht gefunden oder keine Berechtigung.", "error"); return redirect(url_for('meine_anmeldungen'))
-    if anmeldung['status'] != 'Offen':
-        flash("Stornierung nicht möglich, da der Raid bereits gesperrt ist.", "error"); return redirect(url_for('meine_anmeldungen'))
-    if anmeldung['punkte_vergeben']:
-        reservierungen = conn.execute('SELECT item_id FROM reservierungen WHERE anmeldung_id = ?', (anmeldung_id,)).fetchall(); item_ids = [r['item_id'] for r in reservierungen]; item_counts = Counter(item_ids)
-        for item_id, anzahl in item_counts.items():
-            conn.execute('UPDATE loot_punkte SET punkte = punkte - ? WHERE spieler_id = ? AND item_id = ? AND punkte >= ?', (anzahl, anmeldung['spieler_id'], item_id, anzahl))
-    conn.execute('DELETE FROM anmeldungen WHERE id = ?', (anmeldung_id,)); conn.commit(); conn.close()
-    log_action("Anmeldung storniert", f"Anmeldung ID {anmeldung_id} wurde storniert."); flash("Anmeldung erfolgreich storniert.", "success")
-    return redirect(url_for('meine_anmeldungen'))
-
-# === PROFIL & WISHLIST FUNKTIONEN ===
-@app.route('/profil')
-@login_required
-def profil():
-    conn = get_db_connection(); charaktere = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall(); conn.close()
-    return render_template('profil.html', charaktere=charaktere)
-
-@app.route('/api/charakter/<int:charakter_id>/punkte')
-@login_required
-def api_charakter_punkte(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    punkte_liste = conn.execute('SELECT i.item_name, lp.punkte FROM loot_punkte lp JOIN items i ON lp.item_id = i.id WHERE lp.spieler_id = ? AND lp.punkte > 0 ORDER BY lp.punkte DESC', (charakter_id,)).fetchall(); conn.close()
-    return jsonify([dict(row) for row in punkte_liste])
-
-@app.route('/api/charakter/<int:charakter_id>/wishlist')
-@login_required
-def api_get_wishlist(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    wishlist = conn.execute('SELECT w.item_id, w.prioritaet, i.item_name FROM wishlist w JOIN items i ON w.item_id = i.id WHERE w.charakter_id = ? ORDER BY w.prioritaet ASC', (charakter_id,)).fetchall(); conn.close()
-    return jsonify([dict(row) for row in wishlist])
-
-@app.route('/api/items/search')
-@login_required
-def api_item_search():
-    query = request.args.get('q', ''); charakter_klasse = request.args.get('klasse', '')
-    conn = get_db_connection()
-    
-    universelle_typen = ['Reittier', 'Schmuckstück', 'Ring', 'Hals', 'Umhang', 'Einhand', 'Zweihand', 'Schildhand', 'Questgegenstand', 'Rezept', 'Sonstiges']
-    
-    allowed_types = universelle_typen[:]
-    
-    if charakter_klasse:
-        for r_typ, klassen in ITEM_CLASS_MAP.items():
-            if charakter_klasse in klassen: allowed_types.append(r_typ)
-    else: 
-        allowed_types.extend(ITEM_CLASS_MAP.keys())
-
-    placeholders = ','.join('?' for _ in allowed_types)
-    params = ['%'+query+'%'] + allowed_types
-    
-    items = conn.execute(f"SELECT * FROM items WHERE item_name LIKE ? AND ruestungstyp IN ({placeholders}) LIMIT 10", params).fetchall(); conn.close()
-    return jsonify([dict(row) for row in items])
-
-@app.route('/api/charakter/<int:charakter_id>/wishlist/add', methods=['POST'])
-@login_required
-def api_wishlist_add(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    item_id = request.json['item_id']
-    count = conn.execute('SELECT count(item_id) as c FROM wishlist WHERE charakter_id = ?', (charakter_id,)).fetchone()['c']
-    if count >= WISHLIST_SLOTS: return jsonify({'success': False, 'error': f'Wishlist ist voll (max. {WISHLIST_SLOTS} Items).'})
-    prios = conn.execute('SELECT prioritaet FROM wishlist WHERE charakter_id = ?', (charakter_id,)).fetchall(); prio_zahlen = {p['prioritaet'] for p in prios}
-    naechste_prio = 1
-    while naechste_prio in prio_zahlen: naechste_prio += 1
-    conn.execute('INSERT OR IGNORE INTO wishlist (charakter_id, item_id, prioritaet) VALUES (?, ?, ?)', (charakter_id, item_id, naechste_prio)); conn.commit(); conn.close()
-    return jsonify({'success': True})
-
-@app.route('/api/charakter/<int:charakter_id>/wishlist/remove', methods=['POST'])
-@login_required
-def api_wishlist_remove(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    item_id = request.json['item_id']
-    conn.execute('DELETE FROM wishlist WHERE charakter_id = ? AND item_id = ?', (charakter_id, item_id)); conn.commit()
-    wishlist = conn.execute('SELECT * FROM wishlist WHERE charakter_id = ? ORDER BY prioritaet ASC', (charakter_id,)).fetchall()
-    for i, item in enumerate(wishlist): conn.execute('UPDATE wishlist SET prioritaet = ? WHERE charakter_id = ? AND item_id = ?', (i + 1, charakter_id, item['item_id']))
-    conn.commit(); conn.close()
-    return jsonify({'success': True})
-
-@app.route('/api/charakter/<int:charakter_id>/wishlist/move', methods=['POST'])
-@login_required
-def api_wishlist_move(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    item_id = request.json['item_id']; direction = request.json['direction']
-    current_item = conn.execute('SELECT * FROM wishlist WHERE charakter_id = ? AND item_id = ?', (charakter_id, item_id)).fetchone()
-    if not current_item: return jsonify({'success': False})
-    current_prio = current_item['prioritaet']
-    if direction == 'up' and current_prio > 1: swap_prio = current_prio - 1
-    elif direction == 'down': swap_prio = current_prio + 1
-    else: return jsonify({'success': False})
-    swap_item = conn.execute('SELECT * FROM wishlist WHERE charakter_id = ? AND prioritaet = ?', (charakter_id, swap_prio)).fetchone()
-    if swap_item:
-        conn.execute('UPDATE wishlist SET prioritaet = ? WHERE charakter_id = ? AND item_id = ?', (swap_prio, charakter_id, current_item['item_id']))
-        conn.execute('UPDATE wishlist SET prioritaet = ? WHERE charakter_id = ? AND item_id = ?', (current_prio, charakter_id, swap_item['item_id']))
-        conn.commit()
-    conn.close()
-    return jsonify({'success': True})
-
-@app.route('/api/raid/<int:raid_id>/wishlist-helper/<int:charakter_id>')
-@login_required
-def api_wishlist_helper(raid_id, charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
-    raid = conn.execute('SELECT raid_instanz FROM raids WHERE id = ?', (raid_id,)).fetchone()
-    wishlist_items = conn.execute('SELECT w.item_id, w.prioritaet, i.item_name FROM wishlist w JOIN items i ON w.item_id = i.id WHERE w.charakter_id = ? AND i.raid_instanz = ? ORDER BY w.prioritaet', (charakter_id, raid['raid_instanz'])).fetchall()
-    konkurrenten_reservierungen = conn.execute('SELECT r.item_id, a.spieler_id FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id WHERE a.raid_id = ? AND a.spieler_id != ?', (raid_id, charakter_id)).fetchall()
-    konkurrenz_map = {}
-    for res in konkurrenten_reservierungen:
-        if res['item_id'] not in konkurrenz_map: konkurrenz_map[res['item_id']] = []
-        konkurrenz_map[res['item_id']].append(res['spieler_id'])
-    result_data = []
-    for item in wishlist_items:
-        item_id = item['item_id']
-        deine_punkte_row = conn.execute('SELECT punkte FROM loot_punkte WHERE spieler_id = ? AND item_id = ?', (charakter_id, item_id)).fetchone()
-        deine_punkte = deine_punkte_row['punkte'] if deine_punkte_row else 0
-        konkurrenz_anzahl = len(konkurrenz_map.get(item_id, [])); max_konkurrenz_punkte = None
-        if konkurrenz_anzahl > 0:
-            konkurrenten_ids = konkurrenz_map[item_id]; placeholders = ','.join('?' for _ in konkurrenten_ids)
-            punkte_row = conn.execute(f'SELECT MAX(punkte) as max_p FROM loot_punkte WHERE spieler_id IN ({placeholders}) AND item_id = ?', konkurrenten_ids + [item_id]).fetchone()
-            max_konkurrenz_punkte = punkte_row['max_p'] if punkte_row and punkte_row['max_p'] is not None else 0
-        result_data.append({'item_id': item_id, 'prioritaet': item['prioritaet'], 'item_name': item['item_name'], 'deine_punkte': deine_punkte, 'konkurrenz_punkte': max_konkurrenz_punkte, 'konkurrenz_anzahl': konkurrenz_anzahl})
-    conn.close()
-    return jsonify(result_data)
-
-# === PERSÖNLICHE CHARAKTERVERWALTUNG ===
-@app.route('/meine-charaktere')
-@login_required
-def meine_charaktere():
-    conn = get_db_connection(); charaktere = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall(); conn.close()
-    return render_template('meine_charaktere.html', charaktere=charaktere)
-
-@app.route('/charakter/neu', methods=['GET', 'POST'])
-@login_required
-def charakter_erstellen():
-    if request.method == 'POST':
-        charakter_name = request.form['charakter_name']; klasse = request.form['klasse']; rollen_liste = request.form.getlist('rollen'); rollen_string = ",".join(rollen_liste); conn = get_db_connection()
-        if conn.execute('SELECT id FROM charaktere WHERE charakter_name = ?', (charakter_name,)).fetchone():
-            flash('Ein Charakter mit diesem Namen existiert bereits.', 'error'); return redirect(url_for('charakter_erstellen'))
-        conn.execute('INSERT INTO charaktere (user_id, charakter_name, klasse, rollen) VALUES (?, ?, ?, ?)', (current_user.id, charakter_name, klasse, rollen_string)); conn.commit(); conn.close()
-        return redirect(url_for('meine_charaktere'))
-    return render_template('spieler_hinzufuegen.html')
-
-@app.route('/charakter/<int:charakter_id>/bearbeiten', methods=['GET', 'POST'])
-@login_required
-def charakter_bearbeiten(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT * FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if not charakter: flash('Charakter nicht gefunden oder keine Berechtigung.', 'error'); return redirect(url_for('meine_charaktere'))
-    if request.method == 'POST':
-        charakter_name = request.form['charakter_name']; klasse = request.form['klasse']; rollen_liste = request.form.getlist('rollen'); rollen_string = ",".join(rollen_liste)
-        conn.execute('UPDATE charaktere SET charakter_name = ?, klasse = ?, rollen = ? WHERE id = ?', (charakter_name, klasse, rollen_string, charakter_id)); conn.commit(); conn.close()
-        return redirect(url_for('meine_charaktere'))
-    conn.close(); return render_template('spieler_bearbeiten.html', spieler=charakter)
-
-@app.route('/charakter/<int:charakter_id>/loeschen', methods=['POST'])
-@login_required
-def charakter_loeschen(charakter_id):
-    conn = get_db_connection(); charakter = conn.execute('SELECT * FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
-    if charakter: conn.execute('DELETE FROM charaktere WHERE id = ?', (charakter_id,)); conn.commit()
-    conn.close(); return redirect(url_for('meine_charaktere'))
-
-# === ADMIN-BEREICH ===
-@app.route('/admin/logs')
-@login_required
-@admin_required
-def log_liste():
-    conn = get_db_connection(); logs = conn.execute('SELECT * FROM logs ORDER BY zeitstempel DESC').fetchall(); conn.close()
-    return render_template('logs.html', log_liste=logs)
-
-@app.route('/admin/archiv')
-@login_required
-@admin_required
-def archiv_liste():
-    conn = get_db_connection(); raids = conn.execute("SELECT * FROM raids WHERE status = 'Abgeschlossen' ORDER BY raid_datum DESC, raid_zeit DESC").fetchall(); conn.close()
-    return render_template('archiv_liste.html', raid_liste=raids)
-
-@app.route('/admin/archiv/raid/<int:raid_id>')
-@login_required
-@admin_required
-def archiv_detail(raid_id):
-    conn = get_db_connection(); raid = conn.execute("SELECT * FROM raids WHERE id = ?", (raid_id,)).fetchone()
-    teilnehmerliste = conn.execute('SELECT c.charakter_name, a.rolle_angemeldet FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id WHERE a.raid_id = ? ORDER BY c.charakter_name', (raid_id,)).fetchall()
-    loot_logs = conn.execute("SELECT zeitstempel, details FROM logs WHERE raid_id = ? AND aktion = 'Item Vergeben' ORDER BY zeitstempel ASC", (raid_id,)).fetchall(); conn.close()
-    return render_template('archiv_detail.html', raid=raid, teilnehmerliste=teilnehmerliste, loot_logs=loot_logs)
-
-@app.route('/admin/charaktere')
-@login_required
-@admin_required
-def admin_charakter_liste():
-    conn = get_db_connection(); charaktere = conn.execute('SELECT c.*, u.username FROM charaktere c JOIN users u ON c.user_id = u.id ORDER BY c.charakter_name').fetchall(); conn.close()
-    return render_template('admin_charakter_liste.html', spieler_liste=charaktere)
-
-@app.route('/admin/charaktere/<int:charakter_id>/loeschen', methods=['POST'])
-@login_required
-@admin_required
-def admin_charakter_loeschen(charakter_id):
-    conn = get_db_connection(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (charakter_id,)).fetchone()
-    if spieler: conn.execute('DELETE FROM charaktere WHERE id = ?', (charakter_id,)); conn.commit(); log_action("Admin: Charakter Gelöscht", f"Charakter '{spieler['charakter_name']}' wurde vom Admin gelöscht.")
-    conn.close(); return redirect(url_for('admin_charakter_liste'))
-
-@app.route('/admin/users')
-@login_required
-@admin_required
-def admin_user_liste():
-    conn = get_db_connection(); users = conn.execute('SELECT * FROM users ORDER BY username').fetchall(); conn.close()
-    return render_template('admin_user_liste.html', user_liste=users)
-
-@app.route('/admin/user/<int:user_id>/loeschen', methods=['POST'])
-@login_required
-@admin_required
-def admin_user_loeschen(user_id):
-    if user_id == current_user.id: flash("Du kannst deinen eigenen Account nicht löschen.", "error"); return redirect(url_for('admin_user_liste'))
-    conn = get_db_connection(); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
-    if user: conn.execute('DELETE FROM users WHERE id = ?', (user_id,)); conn.commit(); log_action("Admin: Benutzer Gelöscht", f"Benutzer '{user['username']}' wurde gelöscht."); flash(f"Benutzer '{user['username']}' wurde gelöscht.", "success")
-    conn.close(); return redirect(url_for('admin_user_liste'))
-
-@app.route('/admin/user/<int:user_id>/promote', methods=['POST'])
-@login_required
-@admin_required
-def admin_user_promote(user_id):
-    conn = get_db_connection(); conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,)); conn.commit(); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone(); conn.close()
-    log_action("Admin: Benutzer befördert", f"Benutzer '{user['username']}' wurde zum Admin ernannt."); flash(f"'{user['username']}' ist jetzt ein Admin.", "success"); return redirect(url_for('admin_user_liste'))
-
-@app.route('/admin/user/<int:user_id>/demote', methods=['POST'])
-@login_required
-@admin_required
-def admin_user_demote(user_id):
-    if user_id == 1: flash("Der Haupt-Admin kann nicht degradiert werden.", "error"); return redirect(url_for('admin_user_liste'))
-    conn = get_db_connection(); conn.execute("UPDATE users SET role = 'member' WHERE id = ?", (user_id,)); conn.commit(); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone(); conn.close()
-    log_action("Admin: Benutzer degradiert", f"Benutzer '{user['username']}' wurde zum Mitglied degradiert."); flash(f"'{user['username']}' ist jetzt ein Mitglied.", "success"); return redirect(url_for('admin_user_liste'))
-
-@app.route('/dashboard')
-@login_required
-@admin_required
-def dashboard():
-    conn = get_db_connection(); raids = conn.execute("SELECT * FROM raids WHERE status != 'Abgeschlossen' ORDER BY raid_datum DESC").fetchall(); spieler = conn.execute('SELECT * FROM charaktere ORDER BY charakter_name').fetchall(); items = conn.execute('SELECT * FROM items ORDER BY item_name').fetchall(); conn.close()
-    return render_template('dashboard.html', raid_liste=raids, spieler_liste=spieler, item_liste=items)
-
-@app.route('/dashboard/punkte_anpassen', methods=['POST'])
-@login_required
-@admin_required
-def punkte_anpassen():
-    spieler_id = request.form['spieler_id']; item_id = request.form['item_id']; punkte = request.form['punkte']; begruendung = request.form['begruendung']; conn = get_db_connection(); eintrag = conn.execute('SELECT * FROM loot_punkte WHERE spieler_id = ? AND item_id = ?', (spieler_id, item_id)).fetchone()
-    if eintrag: conn.execute('UPDATE loot_punkte SET punkte = ? WHERE spieler_id = ? AND item_id = ?', (punkte, spieler_id, item_id))
-    else: conn.execute('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (?, ?, ?)', (spieler_id, item_id, punkte))
-    conn.commit(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (spieler_id,)).fetchone(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone(); conn.close()
-    log_details = f"Punkte für '{spieler['charakter_name']}' auf Item '{item['item_name']}' manuell auf {punkte} gesetzt. Grund: {begruendung}"; log_action("Punkte Manuell Angepasst", log_details); return redirect(url_for('dashboard'))
-
-@app.route('/dashboard/raid/<int:raid_id>')
-@login_required
-@admin_required
-def raid_dashboard(raid_id):
-    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone(); 
-    bosse = conn.execute('SELECT DISTINCT boss_name FROM items WHERE raid_instanz = ? ORDER BY boss_name', (raid['raid_instanz'],)).fetchall()
-    item_liste_rows = conn.execute('SELECT * FROM items WHERE raid_instanz = ? ORDER BY item_name', (raid['raid_instanz'],)).fetchall()
-    item_liste = [dict(row) for row in item_liste_rows]
-    anmeldungen_raw = conn.execute('SELECT a.id as anmeldung_id, c.id as spieler_id, c.charakter_name, a.rolle_angemeldet FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id WHERE a.raid_id = ?', (raid_id,)).fetchall(); anmeldungen = []
-    for anmeldung in anmeldungen_raw:
-        reservierungen = conn.execute('SELECT i.item_name, IFNULL(lp.punkte, 0) as punkte FROM reservierungen r JOIN items i ON r.item_id = i.id LEFT JOIN loot_punkte lp ON r.item_id = lp.item_id AND lp.spieler_id = ? WHERE r.anmeldung_id = ?', (anmeldung['spieler_id'], anmeldung['anmeldung_id'])).fetchall()
-        anmeldungen.append({'anmeldung_id': anmeldung['anmeldung_id'], 'spieler_id': anmeldung['spieler_id'], 'charakter_name': anmeldung['charakter_name'], 'rolle_angemeldet': anmeldung['rolle_angemeldet'], 'reservierungen': reservierungen})
-    conn.close(); return render_template('raid_dashboard.html', raid=raid, anmeldungen=anmeldungen, item_liste=item_liste, bosse=bosse)
-
-@app.route('/dashboard/raid/<int:raid_id>/vergeben', methods=['POST'])
-@login_required
-@admin_required
-def item_vergeben(raid_id):
-    item_id = request.form.get('item_id'); spieler_id = request.form.get('spieler_id')
-    if not spieler_id: return redirect(url_for('raid_dashboard', raid_id=raid_id))
-    conn = get_db_connection(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (spieler_id,)).fetchone()
-    punkte_alt = conn.execute('SELECT punkte FROM loot_punkte WHERE item_id = ? AND spieler_id = ?', (item_id, spieler_id)).fetchone(); punkte_alt_wert = punkte_alt['punkte'] if punkte_alt else 0
-    conn.execute('UPDATE loot_punkte SET punkte = 0 WHERE item_id = ? AND spieler_id = ?', (item_id, spieler_id)); conn.commit(); conn.close()
-    log_action("Item Vergeben", f"Item '{item['item_name']}' an '{spieler['charakter_name']}' vergeben. Punkte von {punkte_alt_wert} auf 0 gesetzt.", raid_id=raid_id); return redirect(url_for('raid_dashboard', raid_id=raid_id))
-
-@app.route('/raids/neu', methods=['GET', 'POST'])
-@login_required
-@admin_required
-def raid_erstellen():
-    conn = get_db_connection(); instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall()
-    if request.method == 'POST':
-        raid_instanz = request.form['raid_instanz']; raid_titel = request.form['raid_titel']; raid_datum = request.form['raid_datum']; raid_zeit = request.form['raid_zeit']
-        conn.execute('INSERT INTO raids (raid_instanz, raid_titel, raid_datum, raid_zeit) VALUES (?, ?, ?, ?)', (raid_instanz, raid_titel, raid_datum, raid_zeit)); conn.commit(); conn.close()
-        log_action("Raid Erstellt", f"Raid '{raid_instanz} - {raid_titel}' am {raid_datum} wurde erstellt."); return redirect(url_for('raid_liste'))
-    conn.close(); return render_template('raid_erstellen.html', instanzen=instanzen)
-
-@app.route('/raid/<int:raid_id>/bearbeiten', methods=['GET', 'POST'])
-@login_required
-@admin_required
-def raid_bearbeiten(raid_id):
-    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone(); instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall()
-    if request.method == 'POST':
-        raid_instanz = request.form['raid_instanz']; raid_titel = request.form['raid_titel']; raid_datum = request.form['raid_datum']; raid_zeit = request.form['raid_zeit']
-        conn.execute('UPDATE raids SET raid_instanz = ?, raid_titel = ?, raid_datum = ?, raid_zeit = ? WHERE id = ?', (raid_instanz, raid_titel, raid_datum, raid_zeit, raid_id)); conn.commit(); conn.close()
-        log_action("Raid Bearbeitet", f"Raid '{raid_instanz} - {raid_titel}' wurde bearbeitet."); return redirect(url_for('raid_liste'))
-    conn.close(); return render_template('raid_bearbeiten.html', raid=raid, instanzen=instanzen)
-    
-@app.route('/raid/<int:raid_id>/loeschen', methods=['POST'])
-@login_required
-@admin_required
-def raid_loeschen(raid_id):
-    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
-    if raid['punkte_vergeben']:
-        anmeldungen = conn.execute('SELECT id, spieler_id FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchall()
-        for anmeldung in anmeldungen:
-            reservierungen = conn.execute('SELECT item_id FROM reservierungen WHERE anmeldung_id = ?', (anmeldung['id'],)).fetchall(); item_ids = [r['item_id'] for r in reservierungen]; item_counts = Counter(item_ids)
-            for item_id, anzahl in item_counts.items(): conn.execute('UPDATE loot_punkte SET punkte = punkte - ? WHERE spieler_id = ? AND item_id = ? AND punkte >= ?', (anzahl, anmeldung['spieler_id'], item_id, anzahl))
-    conn.execute('DELETE FROM raids WHERE id = ?', (raid_id,)); conn.commit(); conn.close()
-    log_action("Raid Gelöscht", f"Raid '{raid['raid_instanz']}' vom {raid['raid_datum']} wurde gelöscht."); return redirect(url_for('raid_liste'))
-
-@app.route('/raid/<int:raid_id>/toggle_lock', methods=['POST'])
-@login_required
-@admin_required
-def raid_toggle_lock(raid_id):
-    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
-    if raid['status'] == 'Offen':
-        neuer_status = 'Gestartet'; aktion = "Raid gesperrt/gestartet"; details = f"Anmeldungen für '{raid['raid_instanz']}' geschlossen."
-        if not raid['punkte_vergeben']:
-            anmeldungen = conn.execute('SELECT id, spieler_id FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchall(); punkte_vergeben_count = 0
-            for anmeldung in anmeldungen:
-                reservierungen = conn.execute('SELECT item_id FROM reservierungen WHERE anmeldung_id = ?', (anmeldung['id'],)).fetchall(); item_ids = [r['item_id'] for r in reservierungen]; item_counts = Counter(item_ids)
-                for item_id, anzahl in item_counts.items():
-                    punkt_eintrag = conn.execute('SELECT * FROM loot_punkte WHERE spieler_id = ? AND item_id = ?', (anmeldung['spieler_id'], item_id)).fetchone()
-                    if punkt_eintrag: conn.execute('UPDATE loot_punkte SET punkte = punkte + ? WHERE spieler_id = ? AND item_id = ?', (anzahl, anmeldung['spieler_id'], item_id))
-                    else: conn.execute('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (?, ?, ?)', (anmeldung['spieler_id'], item_id, anzahl))
-                    punkte_vergeben_count += anzahl
-            conn.execute("UPDATE raids SET punkte_vergeben = 1 WHERE id = ?", (raid_id,)); details += f" {punkte_vergeben_count} Punkte vergeben."
-    elif raid['status'] == 'Gestartet':
-        neuer_status = 'Offen'; aktion = "Raid geöffnet"; details = f"Anmeldungen für '{raid['raid_instanz']}' geöffnet."
-    else: neuer_status = raid['status']
-    conn.execute("UPDATE raids SET status = ? WHERE id = ?", (neuer_status, raid_id)); conn.commit(); conn.close(); log_action(aktion, details); return redirect(url_for('raid_liste'))
-
-@app.route('/raid/<int:raid_id>/abschliessen', methods=['POST'])
-@login_required
-@admin_required
-def raid_abschliessen(raid_id):
-    conn = get_db_connection(); conn.execute("UPDATE raids SET status = 'Abgeschlossen' WHERE id = ?", (raid_id,)); conn.commit(); raid = conn.execute('SELECT raid_instanz, raid_titel FROM raids WHERE id = ?', (raid_id,)).fetchone(); conn.close()
-    log_action("Raid Abgeschlossen", f"Raid '{raid['raid_instanz']} - {raid['raid_titel']}' wurde abgeschlossen."); return redirect(url_for('raid_liste'))
-
-@app.route('/anmeldung/<int:anmeldung_id>/entfernen', methods=['POST'])
-@login_required
-@admin_required
-def anmeldung_entfernen(anmeldung_id):
-    conn = get_db_connection(); anmeldung = conn.execute('SELECT * FROM anmeldungen WHERE id = ?', (anmeldung_id,)).fetchone()
-    if not anmeldung: return "Anmeldung nicht gefunden", 404
-    raid = conn.execute('SELECT * FROM raids WHERE id = ?', (anmeldung['raid_id'],)).fetchone()
-    if raid['punkte_vergeben']:
-        reservierungen = conn.execute('SELECT item_id FROM reservierungen WHERE anmeldung_id = ?', (anmeldung_id,)).fetchall(); item_ids = [r['item_id'] for r in reservierungen]; item_counts = Counter(item_ids)
-        for item_id, anzahl in item_counts.items(): conn.execute('UPDATE loot_punkte SET punkte = punkte - ? WHERE spieler_id = ? AND item_id = ? AND punkte >= ?', (anzahl, anmeldung['spieler_id'], item_id, anzahl))
-    conn.execute('DELETE FROM anmeldungen WHERE id = ?', (anmeldung_id,)); conn.commit(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (anmeldung['spieler_id'],)).fetchone(); conn.close()
-    log_action("Teilnehmer Entfernt", f"Spieler '{spieler['charakter_name']}' wurde aus Raid '{raid['raid_instanz']}' entfernt.")
-    return redirect(url_for('raid_dashboard', raid_id=anmeldung['raid_id']))
-
-@app.route('/admin/items')
-@login_required
-@admin_required
-def item_liste():
-    conn = get_db_connection(); items = conn.execute('SELECT * FROM items ORDER BY raid_instanz, boss_name, item_name').fetchall(); conn.close()
-    return render_template('item_liste.html', item_liste=items)
-
-@app.route('/admin/items/neu', methods=['GET', 'POST'])
-@login_required
-@admin_required
-def item_hinzufuegen():
-    conn = get_db_connection(); raid_instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall(); boss_namen = conn.execute('SELECT DISTINCT boss_name FROM items ORDER BY boss_name').fetchall()
-    if request.method == 'POST':
-        item_name = request.form['item_name']; boss_name = request.form['boss_name']; raid_instanz = request.form['raid_instanz']; ruestungstyp = request.form['ruestungstyp']
-        conn.execute('INSERT INTO items (item_name, boss_name, raid_instanz, ruestungstyp) VALUES (?, ?, ?, ?)', (item_name, boss_name, raid_instanz, ruestungstyp)); conn.commit(); conn.close()
-        return redirect(url_for('item_liste'))
-    conn.close(); return render_template('item_hinzufuegen.html', raid_instanzen=raid_instanzen, boss_namen=boss_namen)
-
-@app.route('/admin/item/<int:item_id>/bearbeiten', methods=['GET', 'POST'])
-@login_required
-@admin_required
-def item_bearbeiten(item_id):
-    conn = get_db_connection(); item = conn.execute('SELECT * FROM items WHERE id = ?', (item_id,)).fetchone(); raid_instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall(); boss_namen = conn.execute('SELECT DISTINCT boss_name FROM items ORDER BY boss_name').fetchall()
-    if request.method == 'POST':
-        item_name = request.form['item_name']; boss_name = request.form['boss_name']; raid_instanz = request.form['raid_instanz']; ruestungstyp = request.form['ruestungstyp']
-        conn.execute('UPDATE items SET item_name = ?, boss_name = ?, raid_instanz = ?, ruestungstyp = ? WHERE id = ?', (item_name, boss_name, raid_instanz, ruestungstyp, item_id)); conn.commit(); conn.close()
-        log_action("Item Bearbeitet", f"Item '{item_name}' wurde aktualisiert.")
-        return redirect(url_for('item_liste'))
-    conn.close(); return render_template('item_bearbeiten.html', item=item, raid_instanzen=raid_instanzen, boss_namen=boss_namen)
-
-@app.route('/admin/item/<int:item_id>/loeschen', methods=['POST'])
-@login_required
-@admin_required
-def item_loeschen(item_id):
-    conn = get_db_connection(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone(); conn.execute('DELETE FROM items WHERE id = ?', (item_id,)); conn.commit(); conn.close()
-    log_action("Item Gelöscht", f"Item '{item['item_name']}' wurde entfernt.")
-    return redirect(url_for('item_liste'))
-
-if __name__ == '__main__':
+import hmac, json, os, secrets, sqlite3
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, g, make_response, Response, session, abort
+from flask.sessions import SecureCookieSessionInterface
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from functools import wraps
+from jinja2 import FileSystemBytecodeCache
+from db import DATENBANK_PFAD, pool_fuer, verbinden, version_erhoehen, schreibsperre, SchreibsperreBelegt
+from database_setup import migrieren
+from punkte import punkte_vergeben, punkte_entziehen, punkte_setzen, VERGABE
+import raid_index, item_katalog, punkte_stand, metriken, raid_events, benutzer_cache, passwort, analyse, gilden, sicherung, protokoll
+from log_archiv import archivierte_logs
+from protokoll import eintraege_schreiben
+
+app = Flask(__name__)
+app.secret_key = 'dein_sehr_geheimer_schluessel_muss_gesetzt_sein' 
+app.config['DATABASE'] = DATENBANK_PFAD  # ohne LOOT_GILDEN die einzige Datenbank, sonst siehe db_pfad()
+
+class GildenSitzung(SecureCookieSessionInterface):
+    # Eigenes Session-Cookie pro Gilde: mit URL-Prefix gilt es nur unter /g/<gilde>, Subdomains trennen ohnehin
+    def get_cookie_path(self, app): return request.script_root or super().get_cookie_path(app)
+
+if gilden.VERZEICHNIS: app.wsgi_app = gilden.Weiche(app.wsgi_app); app.session_interface = GildenSitzung()
+
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'login'
+login_manager.login_message = "Bitte melde dich an, um diese Seite zu sehen."
+login_manager.login_message_category = "error"
+
+# =============================================================
+# GLOBALE EINSTELLUNGEN
+# =============================================================
+ALLOW_DUPLICATE_RESERVATIONS = False
+RESERVATION_SLOTS = { 'Tank': 3, 'Heal': 3, 'DPS': 2, 'default': 3 }
+WISHLIST_SLOTS = 6
+LOG_SEITE = 100
+PUNKTE_SEITE = 100
+AUSWAHL_SEITE = 20  # Einträge pro Seite in den Auswahlfeldern mit Suche (Admin-Dashboard)
+JINJA_CACHE = os.environ.get('LOOT_JINJA_CACHE')  # Verzeichnis für kompilierte Templates; ohne Angabe ein Temp-Verzeichnis pro Benutzer
+METRIKEN_TOKEN = os.environ.get('LOOT_METRIKEN_TOKEN')  # Bearer-Token für /metrics (Prometheus); ohne Token nur für eingeloggte Admins
+LOG_HINTERGRUND = False  # True: Log-Einträge nach dem Commit gebündelt von einem Hintergrund-Thread schreiben lassen
+ITEM_CLASS_MAP = {
+    'Stoff': ['Magier', 'Hexenmeister', 'Priester', 'Druide', 'Schamane'],
+    'Leder': ['Schurke', 'Druide', 'Schamane', 'Krieger'],
+    'Kette': ['Jäger', 'Schamane'],
+    'Platte': ['Krieger', 'Paladin'],
+    'Zauberstab': ['Magier', 'Hexenmeister', 'Priester'],
+    'Schusswaffe': ['Jäger', 'Krieger', 'Schurke'],
+    'Wurfwaffe': ['Krieger', 'Schurke'],
+    'Relikt': ['Schamane', 'Druide', 'Paladin']
+}
+KLASSEN_TYPEN = item_katalog.erlaubte_typen(ITEM_CLASS_MAP)
+# Kompilierte Templates überleben Worker-Neustarts; Jinja prüft beim Laden die Änderungszeit der Vorlage
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE)
+# =============================================================
+
+class User(UserMixin):
+    def __init__(self, id, username, role): self.id = id; self.username = username; self.role = role
+
+@login_manager.user_loader
+def load_user(user_id):
+    # Über benutzer_cache: bei einem Treffer ohne Abfrage und ohne Verbindung aus dem Pool
+    # Die Session gilt nur für die Gilde, in der sie angemeldet wurde (user_ids gibt es in jeder Gilde)
+    if session.get('gilde') != request.environ.get('loot.gilde'): return None
+    user_data = benutzer_cache.laden(db_pfad(), get_db_connection, user_id)
+    return User(*user_data) if user_data else None
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.role != 'admin':
+            flash('Für diese Aktion sind Admin-Rechte erforderlich.', 'error'); return redirect(url_for('raid_liste'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def db_einrichten(pfad):
+    # Beim ersten Zugriff wird das Schema auf den aktuellen Stand migriert und der Item-Katalog geladen
+    migrieren(pfad); conn = verbinden(pfad)
+    try: item_katalog.katalog(conn)
+    finally: conn.close()
+
+def db_pfad():
+    # Datenbank der Gilde dieser Anfrage (gilden.Weiche); ohne LOOT_GILDEN immer app.config['DATABASE']
+    if 'db_pfad' not in g:
+        if not gilden.VERZEICHNIS: g.db_pfad = app.config['DATABASE']
+        else:
+            gilde = request.environ.get('loot.gilde')
+            if not gilden.vorhanden(gilde): abort(404)
+            g.db_pfad = gilden.pfad(gilde)
+    return g.db_pfad
+
+def db_pool():
+    return pool_fuer(db_pfad(), einrichten=db_einrichten, factory=metriken.MessVerbindung)
+
+def get_db_connection():
+    # Eine Verbindung pro Anfrage (App-Kontext), geteilt von load_user, View und log_action
+    if 'db' not in g: g.db_pool = db_pool(); g.db = g.db_pool.holen()
+    return g.db
+
+@app.before_request
+def metriken_beginnen(): metriken.anfrage_beginnen(request.endpoint or 'unbekannt')
+
+@app.before_request
+def gilde_pruefen():
+    # Unbekannte Gilden enden hier mit 404, bevor irgendein Cache oder Pool für sie entsteht
+    if request.endpoint != 'static': db_pfad()
+
+@app.teardown_request
+def metriken_beenden(exception): metriken.anfrage_beenden()
+
+@app.teardown_appcontext
+def close_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None: g.pop('db_pool').zurueckgeben(conn)
+
+def log_action(aktion, details, raid_id=None, item_id=None, charakter_id=None, punkte_alt=None, punkte_neu=None):
+    # Merkt den Eintrag nur vor; geschrieben wird er von db_commit() zusammen mit der eigentlichen Änderung
+    user = current_user.username if current_user.is_authenticated else "System"
+    g.setdefault('log_eintraege', []).append({'aktion': aktion, 'details': f"[{user}] {details}", 'benutzer': user, 'raid_id': raid_id, 'item_id': item_id, 'charakter_id': charakter_id, 'punkte_alt': punkte_alt, 'punkte_neu': punkte_neu})
+
+def raid_ereignis(conn, raid_id, typ, **daten):
+    # Live-Ereignis für /raid/<id>/events; wird mit der Änderung committet, db_commit() weckt danach die Streams
+    raid_events.ereignis_schreiben(conn, raid_id, typ, **daten); g.raid_ereignis = True
+
+def anmeldungen_anzahl(conn, raid_id):
+    return conn.execute('SELECT COUNT(*) AS anzahl FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchone()['anzahl']
+
+def db_commit(conn):
+    eintraege = g.pop('log_eintraege', [])
+    if not LOG_HINTERGRUND: eintraege_schreiben(conn, eintraege)
+    conn.commit()
+    if g.pop('raid_ereignis', False): raid_events.verteiler(db_pfad()).wecken()
+    if LOG_HINTERGRUND and eintraege: protokoll.schreiber(db_pfad()).einreihen(eintraege)
+
+# === BENUTZER-AUTHENTIFIZIERUNG & KONTO ===
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated: return redirect(url_for('raid_liste'))
+    if request.method == 'POST':
+        username = request.form['username']; password = request.form['password']; conn = get_db_connection()
+        if conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone():
+            flash('Dieser Benutzername ist bereits vergeben.', 'error'); return redirect(url_for('register'))
+        try: password_hash = passwort.hashen(password, ip=request.remote_addr)
+        except passwort.Ueberlastet: return ueberlastet('register.html')
+        role = 'admin' if conn.execute('SELECT COUNT(id) as count FROM users').fetchone()['count'] == 0 else 'member'
+        conn.execute('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)', (username, password_hash, role)); version_erhoehen(conn, 'users'); conn.commit(); benutzer_cache.verwerfen(db_pfad())
+        flash(f'Account erstellt! Der erste User ist automatisch Admin. Bitte einloggen.', 'success'); return redirect(url_for('login'))
+    return render_template('register.html')
+
+def ueberlastet(template):
+    flash('Gerade melden sich sehr viele gleichzeitig an. Bitte in ein paar Sekunden erneut versuchen.', 'error')
+    return render_template(template), 429, {'Retry-After': '2'}
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated: return redirect(url_for('raid_liste'))
+    if request.method == 'POST':
+        username = request.form['username']; password = request.form['password']; conn = get_db_connection()
+        user_data = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        try: korrekt, neuer_hash = passwort.pruefen(user_data['password_hash'] if user_data else None, password, ip=request.remote_addr, name=username.lower())
+        except passwort.Ueberlastet: return ueberlastet('login.html')
+        if korrekt:
+            if neuer_hash: conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (neuer_hash, user_data['id'])); conn.commit()
+            session['gilde'] = request.environ.get('loot.gilde'); login_user(User(id=user_data['id'], username=user_data['username'], role=user_data['role'])); return redirect(url_for('raid_liste'))
+        else: flash('Falscher Benutzername oder Passwort.', 'error')
+    return render_template('login.html')
+
+@app.route('/logout')
+@login_required
+def logout():
+    logout_user(); return redirect(url_for('login'))
+
+# === ÖFFENTLICHE & BENUTZER-SEITEN ===
+@app.route('/')
+def index(): 
+    return redirect(url_for('raid_liste'))
+
+@app.route('/raids')
+def raid_liste():
+    conn = get_db_connection(); raids = conn.execute("SELECT r.*, (SELECT COUNT(*) FROM anmeldungen a WHERE a.raid_id = r.id) AS anmeldungen FROM raids r WHERE r.status != 'Abgeschlossen' ORDER BY r.raid_datum DESC, r.raid_zeit DESC").fetchall()
+    return render_template('raid_liste.html', raid_liste=raids)
+
+@app.route('/punkte')
+@login_required
+def punkte_uebersicht():
+    sort_by = request.args.get('sort', 'item_name'); order = request.args.get('order', 'asc')
+    allowed_sorts = list(punkte_stand.SORTIERUNGEN)
+    if sort_by not in allowed_sorts: sort_by = 'item_name'
+    if order not in ['asc', 'desc']: order = 'asc'
+    item_id = request.args.get('item_id', type=int); klasse = request.args.get('klasse') or None
+    conn = get_db_connection(); version = punkte_stand.version(conn)
+    # Unveränderter Punktestand: 304 anhand der Versionszähler, ohne Snapshot oder Template anzufassen
+    etag = f"punkte-{version[0]}-{version[1]}-{current_user.id}" if version else None
+    if etag and request.if_none_match.contains_weak(etag):
+        response = make_response('', 304); response.set_etag(etag, weak=True); return response
+    stand = punkte_stand.stand(conn)
+    nach = punkte_stand.cursor_lesen(request.args['nach'], sort_by) if request.args.get('nach') else None
+    punkte_liste, weiter = stand.seite(sort_by, order == 'desc', nach, item_id, klasse, PUNKTE_SEITE)
+    next_orders = {col: 'desc' if sort_by == col and order == 'asc' else 'asc' for col in allowed_sorts}
+    filter_args = {k: v for k, v in (('item_id', item_id), ('klasse', klasse)) if v}
+    items = sorted({e['item_id']: e['item_name'] for e in stand.eintraege.values()}.items(), key=lambda i: i[1])
+    klassen = sorted({k for liste in ITEM_CLASS_MAP.values() for k in liste})
+    response = make_response(render_template('punkte_uebersicht.html', punkte_liste=punkte_liste, current_sort=sort_by, current_order=order, next_orders=next_orders,
+                                             filter_args=filter_args, items=items, klassen=klassen, naechste_seite=json.dumps(weiter) if weiter else None, erste_seite=nach is not None))
+    if etag: response.set_etag(etag, weak=True)
+    response.last_modified = stand.geaendert; response.cache_control.private = True; response.cache_control.no_cache = True
+    return response
+
+@app.route('/raid/<int:raid_id>/anmelden', methods=['GET', 'POST'])
+@login_required
+def raid_anmelden(raid_id):
+    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
+    if raid['status'] != 'Offen': return "Anmeldungen für diesen Raid sind geschlossen.", 403
+    if request.method == 'POST':
+        # Idempotenz-Token aus dem Formular (oder Header): ein zweites Absenden liefert dasselbe Ergebnis statt einer Fehlermeldung
+        token = request.headers.get('Idempotency-Key') or request.form.get('anmelde_token') or None
+        def abbrechen(meldung): conn.rollback(); flash(meldung, 'error'); return redirect(url_for('raid_anmelden', raid_id=raid_id))
+        try: schreibsperre(conn)
+        except SchreibsperreBelegt: flash('Gerade melden sich sehr viele gleichzeitig an. Bitte noch einmal absenden.', 'error'); return redirect(url_for('raid_anmelden', raid_id=raid_id))
+        # Ab hier hält die Anfrage die Schreibsperre: alle Prüfungen gelten bis zum Commit
+        if token and conn.execute('SELECT 1 FROM idempotenz WHERE schluessel = ? AND user_id = ?', (token, current_user.id)).fetchone():
+            conn.rollback(); flash(f'Anmeldung erfolgreich!', 'success'); return redirect(url_for('raid_liste'))
+        if conn.execute('SELECT status FROM raids WHERE id = ?', (raid_id,)).fetchone()['status'] != 'Offen': conn.rollback(); return "Anmeldungen für diesen Raid sind geschlossen.", 403
+        charakter = conn.execute('SELECT id, charakter_name, rollen FROM charaktere WHERE id = ? AND user_id = ?', (request.form.get('spieler_id'), current_user.id)).fetchone()
+        if not charakter: return abbrechen('Ungültige Charakterauswahl.')
+        rolle_angemeldet = request.form.get('rolle_angemeldet', '')
+        if rolle_angemeldet not in [rolle.strip() for rolle in charakter['rollen'].split(',')]: return abbrechen('Diese Rolle hat der Charakter nicht.')
+        try: item_ids = [int(item_id) for item_id in request.form.getlist('item_ids') if item_id]
+        except ValueError: return abbrechen('Ungültige Item-Auswahl.')
+        if len(set(item_ids)) != len(item_ids):
+            if not ALLOW_DUPLICATE_RESERVATIONS: return abbrechen('Jedes Item darf nur einmal reserviert werden.')
+            item_ids = list(dict.fromkeys(item_ids))
+        slots = RESERVATION_SLOTS.get(rolle_angemeldet, RESERVATION_SLOTS['default'])
+        if len(item_ids) > slots: return abbrechen(f'Als {rolle_angemeldet} sind höchstens {slots} Reservierungen erlaubt.')
+        katalog = item_katalog.katalog(conn)
+        if any(item_id not in katalog.nach_id or katalog.nach_id[item_id]['raid_instanz'] != raid['raid_instanz'] for item_id in item_ids): return abbrechen('Mindestens ein Item gehört nicht zu diesem Raid.')
+        # Doppelte Anmeldungen verhindert der UNIQUE-Index auf anmeldungen (spieler_id, raid_id)
+        try: anmeldung_id = conn.execute('INSERT INTO anmeldungen (spieler_id, raid_id, rolle_angemeldet) VALUES (?, ?, ?)', (charakter['id'], raid_id, rolle_angemeldet)).lastrowid
+        except sqlite3.IntegrityError as e:
+            if 'UNIQUE' not in str(e): raise
+            return abbrechen('Dieser Charakter ist bereits für den Raid angemeldet.')
+        conn.executemany('INSERT INTO reservierungen (anmeldung_id, item_id) VALUES (?, ?)', [(anmeldung_id, item_id) for item_id in item_ids])
+        if token: conn.execute('INSERT INTO idempotenz (schluessel, user_id, raid_id) VALUES (?, ?, ?)', (token, current_user.id, raid_id))
+        version_erhoehen(conn, f'raid:{raid_id}'); raid_ereignis(conn, raid_id, 'anmeldung', spieler_id=charakter['id'], charakter_name=charakter['charakter_name'], rolle=rolle_angemeldet, anzahl=anmeldungen_anzahl(conn, raid_id))
+        db_commit(conn); flash(f'Anmeldung erfolgreich!', 'success'); return redirect(url_for('raid_liste'))
+    
+    charaktere_des_users = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall()
+    angemeldete_spieler = conn.execute('SELECT spieler_id FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchall()
+    angemeldete_spieler_ids = [row['spieler_id'] for row in angemeldete_spieler]
+    item_liste_rows = conn.execute('SELECT * FROM items WHERE raid_instanz = ? ORDER BY boss_name, item_name', (raid['raid_instanz'],)).fetchall()
+    item_liste_dicts = [dict(row) for row in item_liste_rows]
+    return render_template('raid_anmelden.html', raid=raid, spieler_liste=charaktere_des_users, item_liste=item_liste_dicts, allow_duplicates=ALLOW_DUPLICATE_RESERVATIONS, angemeldete_spieler_ids=angemeldete_spieler_ids, reservation_slots=RESERVATION_SLOTS, anmelde_token=secrets.token_urlsafe(16))
+
+@app.route('/meine-anmeldungen')
+@login_required
+def meine_anmeldungen():
+    conn = get_db_connection()
+    anmeldungen = conn.execute('SELECT a.id as anmeldung_id, a.rolle_angemeldet, c.charakter_name, r.* FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id JOIN raids r ON a.raid_id = r.id WHERE c.user_id = ? AND r.status != "Abgeschlossen" ORDER BY r.raid_datum, r.raid_zeit', (current_user.id,)).fetchall()
+    return render_template('meine_anmeldungen.html', anmeldungen=anmeldungen)
+
+@app.route('/anmeldung/<int:anmeldung_id>/stornieren', methods=['POST'])
+@login_required
+def anmeldung_stornieren(anmeldung_id):
+    conn = get_db_connection()
+    anmeldung = conn.execute('SELECT a.*, c.user_id, r.status, r.punkte_vergeben FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id JOIN raids r ON a.raid_id = r.id WHERE a.id = ?', (anmeldung_id,)).fetchone()
+    if not anmeldung or anmeldung['user_id'] != current_user.id:
+        flash("Anmeldung nicht gefunden oder keine Berechtigung.", "error"); return redirect(url_for('meine_anmeldungen'))
+    if anmeldung['status'] != 'Offen':
+        flash("Stornierung nicht möglich, da der Raid bereits gesperrt ist.", "error"); return redirect(url_for('meine_anmeldungen'))
+    if anmeldung['punkte_vergeben']: punkte_entziehen(conn, anmeldung_id=anmeldung_id); version_erhoehen(conn, 'loot_punkte')
+    conn.execute('DELETE FROM anmeldungen WHERE id = ?', (anmeldung_id,)); version_erhoehen(conn, f"raid:{anmeldung['raid_id']}")
+    raid_ereignis(conn, anmeldung['raid_id'], 'abmeldung', spieler_id=anmeldung['spieler_id'], anzahl=anmeldungen_anzahl(conn, anmeldung['raid_id']))
+    log_action("Anmeldung storniert", f"Anmeldung ID {anmeldung_id} wurde storniert.", raid_id=anmeldung['raid_id'], charakter_id=anmeldung['spieler_id']); db_commit(conn); flash("Anmeldung erfolgreich storniert.", "success")
+    return redirect(url_for('meine_anmeldungen'))
+
+# === PROFIL & WISHLIST FUNKTIONEN ===
+@app.route('/profil')
+@login_required
+def profil():
+    conn = get_db_connection(); charaktere = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall()
+    return render_template('profil.html', charaktere=charaktere, wishlist_slots=WISHLIST_SLOTS)
+
+@app.route('/api/charakter/<int:charakter_id>/punkte')
+@login_required
+def api_charakter_punkte(charakter_id):
+    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    punkte_liste = conn.execute('SELECT i.item_name, lp.punkte FROM loot_punkte lp JOIN items i ON lp.item_id = i.id WHERE lp.spieler_id = ? AND lp.punkte > 0 ORDER BY lp.punkte DESC', (charakter_id,)).fetchall()
+    return jsonify([dict(row) for row in punkte_liste])
+
+@app.route('/api/charakter/<int:charakter_id>/wishlist')
+@login_required
+def api_get_wishlist(charakter_id):
+    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    wishlist = conn.execute('SELECT w.item_id, w.prioritaet, i.item_name FROM wishlist w JOIN items i ON w.item_id = i.id WHERE w.charakter_id = ? ORDER BY w.prioritaet ASC', (charakter_id,)).fetchall()
+    return jsonify([dict(row) for row in wishlist])
+
+@app.route('/api/items/search')
+@login_required
+def api_item_search():
+    query = request.args.get('q', ''); charakter_klasse = request.args.get('klasse', '')
+    # Suche im In-Process-Katalog statt LIKE '%...%' über die ganze items-Tabelle
+    typen = KLASSEN_TYPEN.get(charakter_klasse) or frozenset(item_katalog.UNIVERSELLE_TYPEN)
+    return jsonify(item_katalog.katalog(get_db_connection()).suchen(query, typen, limit=10))
+
+@app.route('/api/admin/charaktere')
+@login_required
+@admin_required
+def api_charakter_auswahl():
+    # Namensanfang ohne Groß-/Kleinschreibung über idx_charaktere_name_nocase, seitenweise per (Name, id)
+    q = ''.join(z for z in request.args.get('q', '') if z not in '%_'); conn = get_db_connection()
+    try: nach = tuple(json.loads(request.args['nach'])) if request.args.get('nach') else ('', 0)
+    except (ValueError, TypeError): nach = ('', 0)
+    if len(nach) != 2: nach = ('', 0)
+    rows = conn.execute('SELECT id, charakter_name, klasse FROM charaktere WHERE charakter_name LIKE ? AND (charakter_name COLLATE NOCASE, id) > (?, ?) ORDER BY charakter_name COLLATE NOCASE, id LIMIT ?',
+                        (q + '%', nach[0], nach[1], AUSWAHL_SEITE + 1)).fetchall()
+    weiter = [rows[AUSWAHL_SEITE - 1]['charakter_name'], rows[AUSWAHL_SEITE - 1]['id']] if len(rows) > AUSWAHL_SEITE else None
+    return jsonify({'eintraege': [dict(row) for row in rows[:AUSWAHL_SEITE]], 'weiter': weiter})
+
+@app.route('/api/admin/items')
+@login_required
+@admin_required
+def api_item_auswahl():
+    # Aus dem Item-Katalog, optional auf eine Instanz und einen Boss eingeschränkt; mit charakter_id samt dessen Punkten
+    conn = get_db_connection(); start = max(request.args.get('nach', 0, type=int), 0)
+    items, weiter = item_katalog.katalog(conn).seite(request.args.get('q', ''), request.args.get('instanz') or None, request.args.get('boss') or None, start, AUSWAHL_SEITE)
+    charakter_id = request.args.get('charakter_id', type=int)
+    if charakter_id and items:
+        punkte = {row['item_id']: row['punkte'] for row in conn.execute(f"SELECT item_id, punkte FROM loot_punkte WHERE spieler_id = ? AND item_id IN ({','.join('?' for _ in items)})", [charakter_id] + [item['id'] for item in items])}
+        for item in items: item['punkte'] = punkte.get(item['id'], 0)
+    return jsonify({'eintraege': items, 'weiter': weiter})
+
+def wishlist_sperren(conn):
+    # Schreibsperre, bevor eine Route die bisherige Wishlist liest; liefert bei Überlast die fertige 503-Antwort
+    try: schreibsperre(conn)
+    except SchreibsperreBelegt: return jsonify({'success': False, 'error': 'Gerade ändern sehr viele gleichzeitig ihre Wishlist. Bitte noch einmal versuchen.'}), 503
+
+def wishlist_speichern(conn, charakter, item_ids):
+    # Prüft die komplette Reihenfolge (Slots, doppelte Items, Klasse) und schreibt sie mit einem executemany; liefert
+    # eine Fehlermeldung oder None. Läuft in der Transaktion von wishlist_sperren, Prüfung und Schreiben sehen also denselben Stand
+    try: item_ids = [int(item_id) for item_id in item_ids]
+    except (TypeError, ValueError): return 'Ungültige Item-Liste.'
+    if len(item_ids) > WISHLIST_SLOTS: return f'Wishlist ist voll (max. {WISHLIST_SLOTS} Items).'
+    if len(set(item_ids)) != len(item_ids): return 'Jedes Item darf nur einmal auf der Wishlist stehen.'
+    bisherige = {row['item_id'] for row in conn.execute('SELECT item_id FROM wishlist WHERE charakter_id = ?', (charakter['id'],))}
+    katalog = item_katalog.katalog(conn); typen = KLASSEN_TYPEN.get(charakter['klasse']) or frozenset(item_katalog.UNIVERSELLE_TYPEN)
+    for item_id in item_ids:
+        item = katalog.nach_id.get(item_id)
+        if item is None: return f'Unbekanntes Item ({item_id}).'
+        # Schon eingetragene Items bleiben erlaubt, auch wenn die Klasse des Charakters inzwischen eine andere ist
+        if item_id not in bisherige and item['ruestungstyp'] not in typen: return f"'{item['item_name']}' kann von der Klasse {charakter['klasse']} nicht getragen werden."
+    conn.execute('DELETE FROM wishlist WHERE charakter_id = ?', (charakter['id'],))
+    conn.executemany('INSERT INTO wishlist (charakter_id, item_id, prioritaet) VALUES (?, ?, ?)', [(charakter['id'], item_id, prio) for prio, item_id in enumerate(item_ids, start=1)])
+    conn.commit()
+
+def wishlist_ids(conn, charakter_id):
+    return [row['item_id'] for row in conn.execute('SELECT item_id FROM wishlist WHERE charakter_id = ? ORDER BY prioritaet ASC', (charakter_id,))]
+
+def eigener_charakter(conn, charakter_id):
+    return conn.execute('SELECT id, klasse FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+
+@app.route('/api/charakter/<int:charakter_id>/wishlist/order', methods=['POST'])
+@login_required
+def api_wishlist_order(charakter_id):
+    # Komplette Reihenfolge in einem Request, z.B. nach Drag & Drop: {"item_ids": [Prio 1, Prio 2, ...]}
+    conn = get_db_connection(); charakter = eigener_charakter(conn, charakter_id)
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    belegt = wishlist_sperren(conn)
+    if belegt: return belegt
+    item_ids = (request.get_json(silent=True) or {}).get('item_ids')
+    fehler = wishlist_speichern(conn, charakter, item_ids) if isinstance(item_ids, list) else 'Ungültige Item-Liste.'
+    if fehler: return jsonify({'success': False, 'error': fehler}), 400
+    return jsonify({'success': True, 'item_ids': wishlist_ids(conn, charakter_id)})
+
+@app.route('/api/charakter/<int:charakter_id>/wishlist/add', methods=['POST'])
+@login_required
+def api_wishlist_add(charakter_id):
+    conn = get_db_connection(); charakter = eigener_charakter(conn, charakter_id)
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    belegt = wishlist_sperren(conn)
+    if belegt: return belegt
+    item_id = request.json['item_id']; item_ids = wishlist_ids(conn, charakter_id)
+    if item_id in item_ids: return jsonify({'success': True})
+    fehler = wishlist_speichern(conn, charakter, item_ids + [item_id])
+    return (jsonify({'success': False, 'error': fehler}), 400) if fehler else jsonify({'success': True})
+
+@app.route('/api/charakter/<int:charakter_id>/wishlist/remove', methods=['POST'])
+@login_required
+def api_wishlist_remove(charakter_id):
+    conn = get_db_connection(); charakter = eigener_charakter(conn, charakter_id)
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    belegt = wishlist_sperren(conn)
+    if belegt: return belegt
+    item_id = request.json['item_id']
+    fehler = wishlist_speichern(conn, charakter, [i for i in wishlist_ids(conn, charakter_id) if i != item_id])
+    return (jsonify({'success': False, 'error': fehler}), 400) if fehler else jsonify({'success': True})
+
+@app.route('/api/charakter/<int:charakter_id>/wishlist/move', methods=['POST'])
+@login_required
+def api_wishlist_move(charakter_id):
+    conn = get_db_connection(); charakter = eigener_charakter(conn, charakter_id)
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    belegt = wishlist_sperren(conn)
+    if belegt: return belegt
+    item_id = request.json['item_id']; direction = request.json['direction']; item_ids = wishlist_ids(conn, charakter_id)
+    if item_id not in item_ids: return jsonify({'success': False})
+    pos = item_ids.index(item_id); ziel = pos - 1 if direction == 'up' else pos + 1 if direction == 'down' else -1
+    if ziel < 0: return jsonify({'success': False})
+    if ziel < len(item_ids):
+        item_ids[pos], item_ids[ziel] = item_ids[ziel], item_ids[pos]; fehler = wishlist_speichern(conn, charakter, item_ids)
+        if fehler: return jsonify({'success': False, 'error': fehler}), 400
+    return jsonify({'success': True})
+
+def wishlist_analyse(conn, raid_id, charakter_filter, params):
+    # Eigene Punkte, Anzahl Konkurrenten und deren Höchstpunkte für alle Wishlist-Items in einer gruppierten Abfrage
+    query = f'''SELECT w.charakter_id, w.item_id, w.prioritaet, i.item_name, IFNULL(own.punkte, 0) as deine_punkte, COUNT(k.spieler_id) as konkurrenz_anzahl,
+        CASE WHEN COUNT(k.spieler_id) > 0 THEN MAX(IFNULL(klp.punkte, 0)) END as konkurrenz_punkte
+        FROM wishlist w JOIN items i ON w.item_id = i.id JOIN raids rd ON rd.id = ? AND i.raid_instanz = rd.raid_instanz
+        LEFT JOIN loot_punkte own ON own.spieler_id = w.charakter_id AND own.item_id = w.item_id
+        LEFT JOIN (SELECT r.item_id, a.spieler_id FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id WHERE a.raid_id = ?) k ON k.item_id = w.item_id AND k.spieler_id != w.charakter_id
+        LEFT JOIN loot_punkte klp ON klp.spieler_id = k.spieler_id AND klp.item_id = k.item_id
+        WHERE {charakter_filter} GROUP BY w.charakter_id, w.item_id ORDER BY w.charakter_id, w.prioritaet'''
+    result_data = {}
+    for row in conn.execute(query, [raid_id, raid_id] + list(params)):
+        eintrag = dict(row); result_data.setdefault(eintrag.pop('charakter_id'), []).append(eintrag)
+    return result_data
+
+@app.route('/api/raid/<int:raid_id>/wishlist-helper/<int:charakter_id>')
+@login_required
+def api_wishlist_helper(raid_id, charakter_id):
+    conn = get_db_connection(); charakter = conn.execute('SELECT id FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+    if not charakter: return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(wishlist_analyse(conn, raid_id, 'w.charakter_id = ?', [charakter_id]).get(charakter_id, []))
+
+@app.route('/api/raid/<int:raid_id>/wishlist-helper')
+@login_required
+def api_wishlist_helper_alle(raid_id):
+    # Sammelabfrage für alle Charaktere des Users: {charakter_id: [...]}
+    conn = get_db_connection(); charaktere = conn.execute('SELECT id FROM charaktere WHERE user_id = ?', (current_user.id,)).fetchall()
+    result_data = wishlist_analyse(conn, raid_id, 'w.charakter_id IN (SELECT id FROM charaktere WHERE user_id = ?)', [current_user.id])
+    return jsonify({str(c['id']): result_data.get(c['id'], []) for c in charaktere})
+
+# === PERSÖNLICHE CHARAKTERVERWALTUNG ===
+@app.route('/meine-charaktere')
+@login_required
+def meine_charaktere():
+    conn = get_db_connection(); charaktere = conn.execute('SELECT * FROM charaktere WHERE user_id = ? ORDER BY charakter_name', (current_user.id,)).fetchall()
+    return render_template('meine_charaktere.html', charaktere=charaktere)
+
+@app.route('/charakter/neu', methods=['GET', 'POST'])
+@login_required
+def charakter_erstellen():
+    if request.method == 'POST':
+        charakter_name = request.form['charakter_name']; klasse = request.form['klasse']; rollen_liste = request.form.getlist('rollen'); rollen_string = ",".join(rollen_liste); conn = get_db_connection()
+        if conn.execute('SELECT id FROM charaktere WHERE charakter_name = ?', (charakter_name,)).fetchone():
+            flash('Ein Charakter mit diesem Namen existiert bereits.', 'error'); return redirect(url_for('charakter_erstellen'))
+        conn.execute('INSERT INTO charaktere (user_id, charakter_name, klasse, rollen) VALUES (?, ?, ?, ?)', (current_user.id, charakter_name, klasse, rollen_string)); conn.commit()
+        return redirect(url_for('meine_charaktere'))
+    return render_template('spieler_hinzufuegen.html')
+
+@app.route('/charakter/<int:charakter_id>/bearbeiten', methods=['GET', 'POST'])
+@login_required
+def charakter_bearbeiten(charakter_id):
+    conn = get_db_connection(); charakter = conn.execute('SELECT * FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+    if not charakter: flash('Charakter nicht gefunden oder keine Berechtigung.', 'error'); return redirect(url_for('meine_charaktere'))
+    if request.method == 'POST':
+        charakter_name = request.form['charakter_name']; klasse = request.form['klasse']; rollen_liste = request.form.getlist('rollen'); rollen_string = ",".join(rollen_liste)
+        conn.execute('UPDATE charaktere SET charakter_name = ?, klasse = ?, rollen = ? WHERE id = ?', (charakter_name, klasse, rollen_string, charakter_id)); version_erhoehen(conn, 'loot_punkte'); conn.commit()
+        return redirect(url_for('meine_charaktere'))
+    return render_template('spieler_bearbeiten.html', spieler=charakter)
+
+@app.route('/charakter/<int:charakter_id>/loeschen', methods=['POST'])
+@login_required
+def charakter_loeschen(charakter_id):
+    conn = get_db_connection(); charakter = conn.execute('SELECT * FROM charaktere WHERE id = ? AND user_id = ?', (charakter_id, current_user.id)).fetchone()
+    if charakter: conn.execute('DELETE FROM charaktere WHERE id = ?', (charakter_id,)); version_erhoehen(conn, 'loot_punkte'); conn.commit()
+    return redirect(url_for('meine_charaktere'))
+
+# === ADMIN-BEREICH ===
+@app.route('/admin/logs')
+@login_required
+@admin_required
+def log_liste():
+    # Keyset-Pagination über (zeitstempel, id); ?vor=<zeitstempel>|<id> liefert die nächst älteren Einträge
+    aktion = request.args.get('aktion', ''); benutzer = request.args.get('benutzer', ''); vor = request.args.get('vor', '')
+    raid_id = request.args.get('raid_id', type=int); charakter_id = request.args.get('charakter_id', type=int); item_id = request.args.get('item_id', type=int)
+    bedingungen = []; params = []
+    for spalte, wert in (('aktion', aktion), ('raid_id', raid_id), ('benutzer', benutzer), ('charakter_id', charakter_id), ('item_id', item_id)):
+        if wert: bedingungen.append(f'{spalte} = ?'); params.append(wert)
+    if '|' in vor:
+        vor_zeit, vor_id = vor.rsplit('|', 1)
+        if vor_id.isdigit(): bedingungen.append('(zeitstempel, id) < (?, ?)'); params += [vor_zeit, int(vor_id)]
+    where = f"WHERE {' AND '.join(bedingungen)}" if bedingungen else ''
+    conn = get_db_connection(); logs = conn.execute(f'SELECT * FROM logs {where} ORDER BY zeitstempel DESC, id DESC LIMIT ?', params + [LOG_SEITE + 1]).fetchall()
+    naechste_seite = f"{logs[LOG_SEITE - 1]['zeitstempel']}|{logs[LOG_SEITE - 1]['id']}" if len(logs) > LOG_SEITE else None
+    aktionen = protokoll.aktionen(conn)
+    filter_args = {k: v for k, v in (('aktion', aktion), ('raid_id', raid_id), ('benutzer', benutzer), ('charakter_id', charakter_id), ('item_id', item_id)) if v}
+    return render_template('logs.html', log_liste=logs[:LOG_SEITE], aktionen=aktionen, filter_args=filter_args, naechste_seite=naechste_seite)
+
+@app.route('/admin/analyse')
+@login_required
+@admin_required
+def admin_analyse():
+    # Bleibt pro Worker zwischengespeichert, bis der nächste Raid abgeschlossen wird
+    return render_template('admin_analyse.html', bericht=analyse.bericht(get_db_connection(), ITEM_CLASS_MAP), verteilung_max=analyse.VERTEILUNG_MAX)
+
+@app.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metriken():
+    routen = sorted(r for r in app.view_functions if r != 'static')
+    return render_template('admin_metriken.html', routen_metriken=metriken.zusammenfassung(), langsame=metriken.langsame_abfragen(), langsam_ms=metriken.LANGSAM_MS,
+                           profiler=metriken.profiler, profil_bericht=metriken.profiler.bericht(), routen=routen)
+
+@app.route('/admin/metrics/profiler', methods=['POST'])
+@login_required
+@admin_required
+def admin_metriken_profiler():
+    # Stichproben-Profiling einer einzelnen Route zur Laufzeit ein- oder ausschalten
+    route = request.form.get('route', '')
+    if request.form.get('aktion') == 'stoppen' or route not in app.view_functions: metriken.profiler.stoppen()
+    else: metriken.profiler.starten(route, jede=request.form.get('jede', 1, type=int), anfragen=request.form.get('anfragen', 20, type=int))
+    return redirect(url_for('admin_metriken'))
+
+@app.route('/admin/metrics/zuruecksetzen', methods=['POST'])
+@login_required
+@admin_required
+def admin_metriken_zuruecksetzen():
+    metriken.zuruecksetzen(); return redirect(url_for('admin_metriken'))
+
+@app.route('/metrics')
+def metriken_prometheus():
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    erlaubt = hmac.compare_digest(token, METRIKEN_TOKEN) if METRIKEN_TOKEN else current_user.is_authenticated and current_user.role == 'admin'
+    if not erlaubt: return 'Forbidden', 403
+    return metriken.prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/admin/archiv')
+@login_required
+@admin_required
+def archiv_liste():
+    conn = get_db_connection(); raids = conn.execute("SELECT * FROM raids WHERE status = 'Abgeschlossen' ORDER BY raid_datum DESC, raid_zeit DESC").fetchall()
+    return render_template('archiv_liste.html', raid_liste=raids)
+
+@app.route('/admin/archiv/raid/<int:raid_id>')
+@login_required
+@admin_required
+def archiv_detail(raid_id):
+    conn = get_db_connection(); raid = conn.execute("SELECT * FROM raids WHERE id = ?", (raid_id,)).fetchone()
+    teilnehmerliste = conn.execute('SELECT c.charakter_name, a.rolle_angemeldet FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id WHERE a.raid_id = ? ORDER BY c.charakter_name', (raid_id,)).fetchall()
+    loot_logs = conn.execute("SELECT zeitstempel, details FROM logs WHERE raid_id = ? AND aktion = 'Item Vergeben' ORDER BY zeitstempel ASC", (raid_id,)).fetchall()
+    loot_logs = archivierte_logs(conn, raid_id, aktion='Item Vergeben') + [dict(row) for row in loot_logs]
+    return render_template('archiv_detail.html', raid=raid, teilnehmerliste=teilnehmerliste, loot_logs=loot_logs)
+
+@app.route('/admin/charaktere')
+@login_required
+@admin_required
+def admin_charakter_liste():
+    conn = get_db_connection(); charaktere = conn.execute('SELECT c.*, u.username FROM charaktere c JOIN users u ON c.user_id = u.id ORDER BY c.charakter_name').fetchall()
+    return render_template('admin_charakter_liste.html', spieler_liste=charaktere)
+
+@app.route('/admin/charaktere/<int:charakter_id>/loeschen', methods=['POST'])
+@login_required
+@admin_required
+def admin_charakter_loeschen(charakter_id):
+    conn = get_db_connection(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (charakter_id,)).fetchone()
+    if spieler: conn.execute('DELETE FROM charaktere WHERE id = ?', (charakter_id,)); version_erhoehen(conn, 'loot_punkte'); log_action("Admin: Charakter Gelöscht", f"Charakter '{spieler['charakter_name']}' wurde vom Admin gelöscht.", charakter_id=charakter_id); db_commit(conn)
+    return redirect(url_for('admin_charakter_liste'))
+
+@app.route('/admin/users')
+@login_required
+@admin_required
+def admin_user_liste():
+    conn = get_db_connection(); users = conn.execute('SELECT * FROM users ORDER BY username').fetchall()
+    return render_template('admin_user_liste.html', user_liste=users)
+
+@app.route('/admin/user/<int:user_id>/loeschen', methods=['POST'])
+@login_required
+@admin_required
+def admin_user_loeschen(user_id):
+    if user_id == current_user.id: flash("Du kannst deinen eigenen Account nicht löschen.", "error"); return redirect(url_for('admin_user_liste'))
+    conn = get_db_connection(); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
+    if user: conn.execute('DELETE FROM users WHERE id = ?', (user_id,)); version_erhoehen(conn, 'loot_punkte', 'users'); log_action("Admin: Benutzer Gelöscht", f"Benutzer '{user['username']}' wurde gelöscht."); db_commit(conn); benutzer_cache.verwerfen(db_pfad()); flash(f"Benutzer '{user['username']}' wurde gelöscht.", "success")
+    return redirect(url_for('admin_user_liste'))
+
+@app.route('/admin/user/<int:user_id>/promote', methods=['POST'])
+@login_required
+@admin_required
+def admin_user_promote(user_id):
+    conn = get_db_connection(); conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,)); version_erhoehen(conn, 'users'); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
+    log_action("Admin: Benutzer befördert", f"Benutzer '{user['username']}' wurde zum Admin ernannt."); db_commit(conn); benutzer_cache.verwerfen(db_pfad()); flash(f"'{user['username']}' ist jetzt ein Admin.", "success"); return redirect(url_for('admin_user_liste'))
+
+@app.route('/admin/user/<int:user_id>/demote', methods=['POST'])
+@login_required
+@admin_required
+def admin_user_demote(user_id):
+    if user_id == 1: flash("Der Haupt-Admin kann nicht degradiert werden.", "error"); return redirect(url_for('admin_user_liste'))
+    conn = get_db_connection(); conn.execute("UPDATE users SET role = 'member' WHERE id = ?", (user_id,)); version_erhoehen(conn, 'users'); user = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
+    log_action("Admin: Benutzer degradiert", f"Benutzer '{user['username']}' wurde zum Mitglied degradiert."); db_commit(conn); benutzer_cache.verwerfen(db_pfad()); flash(f"'{user['username']}' ist jetzt ein Mitglied.", "success"); return redirect(url_for('admin_user_liste'))
+
+@app.route('/dashboard')
+@login_required
+@admin_required
+def dashboard():
+    # Charaktere und Items lädt das Formular bei Bedarf über /api/admin/charaktere und /api/admin/items
+    conn = get_db_connection(); raids = conn.execute("SELECT * FROM raids WHERE status != 'Abgeschlossen' ORDER BY raid_datum DESC").fetchall()
+    return render_template('dashboard.html', raid_liste=raids)
+
+@app.route('/dashboard/punkte_anpassen', methods=['POST'])
+@login_required
+@admin_required
+def punkte_anpassen():
+    spieler_id = request.form['spieler_id']; item_id = request.form['item_id']; punkte = request.form['punkte']; begruendung = request.form['begruendung']; conn = get_db_connection(); eintrag = conn.execute('SELECT * FROM loot_punkte WHERE spieler_id = ? AND item_id = ?', (spieler_id, item_id)).fetchone()
+    punkte_setzen(conn, int(spieler_id), int(item_id), int(punkte))
+    version_erhoehen(conn, 'loot_punkte')
+    spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (spieler_id,)).fetchone(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone()
+    log_details = f"Punkte für '{spieler['charakter_name']}' auf Item '{item['item_name']}' manuell auf {punkte} gesetzt. Grund: {begruendung}"
+    log_action("Punkte Manuell Angepasst", log_details, item_id=int(item_id), charakter_id=int(spieler_id), punkte_alt=eintrag['punkte'] if eintrag else 0, punkte_neu=int(punkte)); db_commit(conn)
+    punkte_stand.punkte_setzen(conn, int(spieler_id), int(item_id), int(punkte)); return redirect(url_for('dashboard'))
+
+def dashboard_anmeldungen(conn, raid_id, spieler_ids=None):
+    # Alle Anmeldungen samt Reservierungen und Punkten in einer Abfrage, in Python pro Anmeldung gruppiert
+    query = 'SELECT a.id as anmeldung_id, c.id as spieler_id, c.charakter_name, a.rolle_angemeldet, r.item_id, i.item_name, IFNULL(lp.punkte, 0) as punkte FROM anmeldungen a JOIN charaktere c ON a.spieler_id = c.id LEFT JOIN reservierungen r ON r.anmeldung_id = a.id LEFT JOIN items i ON r.item_id = i.id LEFT JOIN loot_punkte lp ON lp.item_id = r.item_id AND lp.spieler_id = a.spieler_id WHERE a.raid_id = ?'
+    params = [raid_id]
+    if spieler_ids: query += f" AND a.spieler_id IN ({','.join('?' for _ in spieler_ids)})"; params += spieler_ids
+    anmeldungen = {}
+    for row in conn.execute(query + ' ORDER BY a.id, r.item_id', params):
+        anmeldung = anmeldungen.setdefault(row['anmeldung_id'], {'anmeldung_id': row['anmeldung_id'], 'spieler_id': row['spieler_id'], 'charakter_name': row['charakter_name'], 'rolle_angemeldet': row['rolle_angemeldet'], 'reservierungen': []})
+        if row['item_id'] is not None: anmeldung['reservierungen'].append({'item_id': row['item_id'], 'item_name': row['item_name'], 'punkte': row['punkte']})
+    return list(anmeldungen.values())
+
+@app.route('/dashboard/raid/<int:raid_id>')
+@login_required
+@admin_required
+def raid_dashboard(raid_id):
+    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
+    bosse = conn.execute('SELECT DISTINCT boss_name FROM items WHERE raid_instanz = ? ORDER BY boss_name', (raid['raid_instanz'],)).fetchall()
+    anmeldungen = dashboard_anmeldungen(conn, raid_id)
+    return render_template('raid_dashboard.html', raid=raid, anmeldungen=anmeldungen, bosse=bosse)
+
+@app.route('/api/raid/<int:raid_id>/dashboard')
+@login_required
+@admin_required
+def api_raid_dashboard(raid_id):
+    # JSON-Variante des Dashboards; mit ?spieler_id=.. nur die geänderten Zeilen
+    spieler_ids = request.args.getlist('spieler_id', type=int)
+    return jsonify(dashboard_anmeldungen(get_db_connection(), raid_id, spieler_ids))
+
+def ereignis_stream(raid_id=None):
+    # Der Stream läuft nach dem Ende der Anfrage weiter; die Datenbankverbindung der Anfrage ist dann schon zurück im Pool.
+    # Sind alle raid_events.MAX_STREAMS Plätze des Prozesses belegt: 204, der Browser fragt dann ereignisse_neu ab
+    if not raid_events.stream_platz(): return Response(status=204)
+    try:
+        letzte_id = request.headers.get('Last-Event-ID', type=int)
+        response = Response(raid_events.verteiler(db_pfad()).abonnieren(raid_id, letzte_id), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except Exception: raid_events.stream_freigeben(); raise
+    response.call_on_close(raid_events.stream_freigeben); return response
+
+def ereignisse_neu(raid_id=None):
+    ereignisse, letzte_id = raid_events.seit(get_db_connection(), request.args.get('nach', type=int), raid_id)
+    return jsonify({'ereignisse': ereignisse, 'letzte_id': letzte_id})
+
+@app.route('/raid/<int:raid_id>/events')
+@login_required
+def raid_events_stream(raid_id): return ereignis_stream(raid_id)
+
+@app.route('/raids/events')
+@login_required
+def raids_events_stream(): return ereignis_stream()
+
+@app.route('/raid/<int:raid_id>/events/neu')
+@login_required
+def raid_events_neu(raid_id): return ereignisse_neu(raid_id)
+
+@app.route('/raids/events/neu')
+@login_required
+def raids_events_neu(): return ereignisse_neu()
+
+@app.route('/api/raid/<int:raid_id>/item/<int:item_id>/reservierungen')
+@login_required
+@admin_required
+def api_item_reservierungen(raid_id, item_id):
+    return jsonify(raid_index.reservierungen_fuer_item(get_db_connection(), raid_id, item_id))
+
+@app.route('/dashboard/raid/<int:raid_id>/vergeben', methods=['POST'])
+@login_required
+@admin_required
+def item_vergeben(raid_id):
+    item_id = request.form.get('item_id'); spieler_id = request.form.get('spieler_id'); als_json = request.accept_mimetypes.best == 'application/json'
+    if not spieler_id: return jsonify({'success': False}) if als_json else redirect(url_for('raid_dashboard', raid_id=raid_id))
+    conn = get_db_connection(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone(); spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (spieler_id,)).fetchone()
+    punkte_alt = conn.execute('SELECT punkte FROM loot_punkte WHERE item_id = ? AND spieler_id = ?', (item_id, spieler_id)).fetchone(); punkte_alt_wert = punkte_alt['punkte'] if punkte_alt else 0
+    punkte_setzen(conn, int(spieler_id), int(item_id), 0, art=VERGABE, raid_id=raid_id); version_erhoehen(conn, 'loot_punkte')
+    raid_ereignis(conn, raid_id, 'vergabe', spieler_id=int(spieler_id), item_id=int(item_id), charakter_name=spieler['charakter_name'], item_name=item['item_name'])
+    log_action("Item Vergeben", f"Item '{item['item_name']}' an '{spieler['charakter_name']}' vergeben. Punkte von {punkte_alt_wert} auf 0 gesetzt.", raid_id=raid_id, item_id=int(item_id), charakter_id=int(spieler_id), punkte_alt=punkte_alt_wert, punkte_neu=0); db_commit(conn)
+    raid_index.punkte_setzen(conn, raid_id, int(spieler_id), int(item_id), 0); punkte_stand.punkte_setzen(conn, int(spieler_id), int(item_id), 0)
+    if als_json: return jsonify({'success': True, 'spieler_id': int(spieler_id), 'item_id': int(item_id)})
+    return redirect(url_for('raid_dashboard', raid_id=raid_id))
+
+@app.route('/raids/neu', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def raid_erstellen():
+    conn = get_db_connection(); instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall()
+    if request.method == 'POST':
+        raid_instanz = request.form['raid_instanz']; raid_titel = request.form['raid_titel']; raid_datum = request.form['raid_datum']; raid_zeit = request.form['raid_zeit']
+        neue_raid_id = conn.execute('INSERT INTO raids (raid_instanz, raid_titel, raid_datum, raid_zeit) VALUES (?, ?, ?, ?)', (raid_instanz, raid_titel, raid_datum, raid_zeit)).lastrowid
+        log_action("Raid Erstellt", f"Raid '{raid_instanz} - {raid_titel}' am {raid_datum} wurde erstellt.", raid_id=neue_raid_id); db_commit(conn); return redirect(url_for('raid_liste'))
+    return render_template('raid_erstellen.html', instanzen=instanzen)
+
+@app.route('/raid/<int:raid_id>/bearbeiten', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def raid_bearbeiten(raid_id):
+    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone(); instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall()
+    if request.method == 'POST':
+        raid_instanz = request.form['raid_instanz']; raid_titel = request.form['raid_titel']; raid_datum = request.form['raid_datum']; raid_zeit = request.form['raid_zeit']
+        conn.execute('UPDATE raids SET raid_instanz = ?, raid_titel = ?, raid_datum = ?, raid_zeit = ? WHERE id = ?', (raid_instanz, raid_titel, raid_datum, raid_zeit, raid_id))
+        log_action("Raid Bearbeitet", f"Raid '{raid_instanz} - {raid_titel}' wurde bearbeitet.", raid_id=raid_id); db_commit(conn); return redirect(url_for('raid_liste'))
+    return render_template('raid_bearbeiten.html', raid=raid, instanzen=instanzen)
+    
+@app.route('/raid/<int:raid_id>/loeschen', methods=['POST'])
+@login_required
+@admin_required
+def raid_loeschen(raid_id):
+    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
+    if raid['punkte_vergeben']: punkte_entziehen(conn, raid_id=raid_id); version_erhoehen(conn, 'loot_punkte')
+    conn.execute('DELETE FROM raids WHERE id = ?', (raid_id,)); conn.execute('DELETE FROM idempotenz WHERE raid_id = ?', (raid_id,)); raid_ereignis(conn, raid_id, 'status', status='Gelöscht')
+    log_action("Raid Gelöscht", f"Raid '{raid['raid_instanz']}' vom {raid['raid_datum']} wurde gelöscht.", raid_id=raid_id); db_commit(conn); raid_index.verwerfen(conn, raid_id); return redirect(url_for('raid_liste'))
+
+@app.route('/raid/<int:raid_id>/toggle_lock', methods=['POST'])
+@login_required
+@admin_required
+def raid_toggle_lock(raid_id):
+    conn = get_db_connection(); raid = conn.execute('SELECT * FROM raids WHERE id = ?', (raid_id,)).fetchone()
+    if raid['status'] == 'Offen':
+        neuer_status = 'Gestartet'; aktion = "Raid gesperrt/gestartet"; details = f"Anmeldungen für '{raid['raid_instanz']}' geschlossen."
+        sicherung.planen(db_pfad(), f'vor-sperre-raid-{raid_id}')  # hält den Stand vor dem Sperren fest, kopiert wird im Hintergrund
+        if not raid['punkte_vergeben']:
+            punkte_vergeben_count = punkte_vergeben(conn, raid_id)
+            conn.execute("UPDATE raids SET punkte_vergeben = 1 WHERE id = ?", (raid_id,)); details += f" {punkte_vergeben_count} Punkte vergeben."
+            version_erhoehen(conn, 'loot_punkte', f'raid:{raid_id}')
+        conn.execute('DELETE FROM idempotenz WHERE raid_id = ?', (raid_id,))
+    elif raid['status'] == 'Gestartet':
+        neuer_status = 'Offen'; aktion = "Raid geöffnet"; details = f"Anmeldungen für '{raid['raid_instanz']}' geöffnet."
+    else: neuer_status = raid['status']
+    conn.execute("UPDATE raids SET status = ? WHERE id = ?", (neuer_status, raid_id)); raid_ereignis(conn, raid_id, 'status', status=neuer_status)
+    log_action(aktion, details, raid_id=raid_id); db_commit(conn)
+    if neuer_status == 'Gestartet' and raid['status'] == 'Offen': raid_index.index_aufbauen(conn, raid_id)
+    return redirect(url_for('raid_liste'))
+
+@app.route('/raid/<int:raid_id>/abschliessen', methods=['POST'])
+@login_required
+@admin_required
+def raid_abschliessen(raid_id):
+    conn = get_db_connection(); conn.execute("UPDATE raids SET status = 'Abgeschlossen' WHERE id = ?", (raid_id,)); raid = conn.execute('SELECT raid_instanz, raid_titel FROM raids WHERE id = ?', (raid_id,)).fetchone()
+    raid_ereignis(conn, raid_id, 'status', status='Abgeschlossen'); version_erhoehen(conn, 'analyse')
+    log_action("Raid Abgeschlossen", f"Raid '{raid['raid_instanz']} - {raid['raid_titel']}' wurde abgeschlossen.", raid_id=raid_id); db_commit(conn); raid_index.verwerfen(conn, raid_id)
+    sicherung.planen(db_pfad(), f'abgeschlossen-raid-{raid_id}'); return redirect(url_for('raid_liste'))
+
+@app.route('/anmeldung/<int:anmeldung_id>/entfernen', methods=['POST'])
+@login_required
+@admin_required
+def anmeldung_entfernen(anmeldung_id):
+    conn = get_db_connection(); anmeldung = conn.execute('SELECT * FROM anmeldungen WHERE id = ?', (anmeldung_id,)).fetchone()
+    if not anmeldung: return "Anmeldung nicht gefunden", 404
+    raid = conn.execute('SELECT * FROM raids WHERE id = ?', (anmeldung['raid_id'],)).fetchone()
+    if raid['punkte_vergeben']: punkte_entziehen(conn, anmeldung_id=anmeldung_id); version_erhoehen(conn, 'loot_punkte')
+    conn.execute('DELETE FROM anmeldungen WHERE id = ?', (anmeldung_id,)); version_erhoehen(conn, f"raid:{raid['id']}")
+    spieler = conn.execute('SELECT charakter_name FROM charaktere WHERE id = ?', (anmeldung['spieler_id'],)).fetchone()
+    raid_ereignis(conn, raid['id'], 'abmeldung', spieler_id=anmeldung['spieler_id'], anzahl=anmeldungen_anzahl(conn, raid['id']))
+    log_action("Teilnehmer Entfernt", f"Spieler '{spieler['charakter_name']}' wurde aus Raid '{raid['raid_instanz']}' entfernt.", raid_id=raid['id'], charakter_id=anmeldung['spieler_id']); db_commit(conn)
+    raid_index.spieler_entfernen(conn, raid['id'], anmeldung['spieler_id'], punkte_erhoeht=1 if raid['punkte_vergeben'] else 0)
+    return redirect(url_for('raid_dashboard', raid_id=anmeldung['raid_id']))
+
+@app.route('/admin/items')
+@login_required
+@admin_required
+def item_liste():
+    conn = get_db_connection(); items = conn.execute('SELECT * FROM items ORDER BY raid_instanz, boss_name, item_name').fetchall()
+    return render_template('item_liste.html', item_liste=items)
+
+@app.route('/admin/items/neu', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def item_hinzufuegen():
+    conn = get_db_connection(); raid_instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall(); boss_namen = conn.execute('SELECT DISTINCT boss_name FROM items ORDER BY boss_name').fetchall()
+    if request.method == 'POST':
+        item_name = request.form['item_name']; boss_name = request.form['boss_name']; raid_instanz = request.form['raid_instanz']; ruestungstyp = request.form['ruestungstyp']
+        conn.execute('INSERT INTO items (item_name, boss_name, raid_instanz, ruestungstyp) VALUES (?, ?, ?, ?)', (item_name, boss_name, raid_instanz, ruestungstyp)); version_erhoehen(conn, 'items'); db_commit(conn)
+        return redirect(url_for('item_liste'))
+    return render_template('item_hinzufuegen.html', raid_instanzen=raid_instanzen, boss_namen=boss_namen)
+
+@app.route('/admin/item/<int:item_id>/bearbeiten', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def item_bearbeiten(item_id):
+    conn = get_db_connection(); item = conn.execute('SELECT * FROM items WHERE id = ?', (item_id,)).fetchone(); raid_instanzen = conn.execute('SELECT DISTINCT raid_instanz FROM items ORDER BY raid_instanz').fetchall(); boss_namen = conn.execute('SELECT DISTINCT boss_name FROM items ORDER BY boss_name').fetchall()
+    if request.method == 'POST':
+        item_name = request.form['item_name']; boss_name = request.form['boss_name']; raid_instanz = request.form['raid_instanz']; ruestungstyp = request.form['ruestungstyp']
+        conn.execute('UPDATE items SET item_name = ?, boss_name = ?, raid_instanz = ?, ruestungstyp = ? WHERE id = ?', (item_name, boss_name, raid_instanz, ruestungstyp, item_id)); version_erhoehen(conn, 'items')
+        log_action("Item Bearbeitet", f"Item '{item_name}' wurde aktualisiert.", item_id=item_id); db_commit(conn)
+        return redirect(url_for('item_liste'))
+    return render_template('item_bearbeiten.html', item=item, raid_instanzen=raid_instanzen, boss_namen=boss_namen)
+
+@app.route('/admin/item/<int:item_id>/loeschen', methods=['POST'])
+@login_required
+@admin_required
+def item_loeschen(item_id):
+    conn = get_db_connection(); item = conn.execute('SELECT item_name FROM items WHERE id = ?', (item_id,)).fetchone(); conn.execute('DELETE FROM items WHERE id = ?', (item_id,)); version_erhoehen(conn, 'loot_punkte', 'items')
+    log_action("Item Gelöscht", f"Item '{item['item_name']}' wurde entfernt.", item_id=item_id); db_commit(conn)
+    return redirect(url_for('item_liste'))
+
+if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Benchmark-Suite: synthetische Gildendaten (daten.py) und Messung der heißen Routen (lauf.py).
+# Aufruf aus dem Projektverzeichnis: python -m benchmark --help
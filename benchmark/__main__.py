@@ -0,0 +1,17 @@
+import argparse, json
+from benchmark import daten, lauf
+
+parser = argparse.ArgumentParser(prog='python -m benchmark', description='Synthetische Gildendaten erzeugen und die heißen Routen messen.')
+parser.add_argument('--wiederholungen', type=int, default=200, help='Anfragen pro Route (Standard: 200)')
+for name, standard in daten.STANDARD.items():
+    if name not in daten.INTERN: parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=standard, dest=name, help=f'Standard: {standard}')
+parser.add_argument('--parallel', type=int, default=100, help='gleichzeitige Anmeldungen im Stresstest, 0 = aus (Standard: 100)')
+parser.add_argument('--datenbank', help='Datenbank hier anlegen und behalten statt in einem temporären Verzeichnis')
+parser.add_argument('--ausgabe', default='benchmark_ergebnis.json', help='JSON-Ergebnis (Standard: benchmark_ergebnis.json)')
+parser.add_argument('--vergleich', metavar='ALT.json', help='Ergebnis mit einem früheren Lauf vergleichen')
+args = parser.parse_args()
+
+ergebnis = lauf.ausfuehren(args.datenbank, args.wiederholungen, args.parallel, **{name: getattr(args, name) for name in daten.STANDARD if name not in daten.INTERN})
+lauf.speichern(ergebnis, args.ausgabe); print(f"\nErgebnis gespeichert: {args.ausgabe}")
+if args.vergleich:
+    with open(args.vergleich, encoding='utf-8') as datei: lauf.vergleichen(json.load(datei), ergebnis)
@@ -0,0 +1,101 @@
+import os, random
+from db import verbinden, version_erhoehen
+from database_setup import migrieren
+from importer import items_importieren
+from punkte import punkte_vergeben, punkte_setzen, VERGABE
+from passwort import hashen
+
+# =============================================================
+# SYNTHETISCHE GILDENDATEN
+# =============================================================
+# Baut eine frisch migrierte Datenbank in realistischer Größe: Items aus den import_*.csv plus
+# synthetische, Benutzer mit Charakteren und Wishlists, abgeschlossene Raids mit 40 Anmeldungen
+# und Reservierungen (Punkte über punkte_vergeben wie beim echten Sperren, zwei Raids pro Woche,
+# pro Raid 'vergaben' Items an den Reservierer mit den meisten Punkten) und ein großes Logbuch.
+# --raids 520 entspricht etwa fünf Jahren Raid-Historie.
+# Mit demselben seed entsteht immer derselbe Datensatz.
+BASIS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KLASSEN = ['Krieger', 'Paladin', 'Jäger', 'Schurke', 'Priester', 'Schamane', 'Magier', 'Hexenmeister', 'Druide']
+ROLLEN = ['Tank', 'Heal', 'DPS']
+INSTANZEN = ['Naxxramas', 'AQ40']
+TYPEN = ['Stoff', 'Leder', 'Kette', 'Platte', 'Ring', 'Hals', 'Umhang', 'Schmuckstück', 'Einhand', 'Zweihand']
+AKTIONEN = ['Raid Erstellt', 'Raid gesperrt/gestartet', 'Item Vergeben', 'Teilnehmer Entfernt', 'Punkte Manuell Angepasst', 'Raid Abgeschlossen']
+PASSWORT = 'benchmark'
+
+STANDARD = {'benutzer': 2000, 'charaktere_pro_benutzer': 2, 'items': 1000, 'raids': 300, 'teilnehmer': 40,
+            'reservierungen': 3, 'vergaben': 4, 'wishlist': 6, 'logs': 200000, 'anmelder_charaktere': 200, 'zu_sperren': 201, 'seed': 1}
+INTERN = ('anmelder_charaktere', 'zu_sperren')  # setzt lauf.ausfuehren passend zu --wiederholungen, keine eigenen Optionen
+
+def erzeugen(pfad, **parameter):
+    # Liefert ein dict mit den Ids, die der Benchmark für seine Anfragen braucht
+    p = dict(STANDARD, **parameter); rnd = random.Random(p['seed'])
+    for endung in ('', '-wal', '-shm'):
+        if os.path.exists(pfad + endung): os.remove(pfad + endung)
+    migrieren(pfad); conn = verbinden(pfad)
+    try:
+        items_importieren(conn, [os.path.join(BASIS, name) for name in ('import_aq40.csv', 'import_naxx.csv')])
+        with conn:
+            conn.executemany('INSERT INTO items (item_name, boss_name, raid_instanz, ruestungstyp) VALUES (?, ?, ?, ?)',
+                             [(f'Synthetisches Item {i} {rnd.choice(TYPEN)}', f'Boss {i % 15}', INSTANZEN[i % 2], rnd.choice(TYPEN)) for i in range(p['items'])])
+            items = {instanz: [row[0] for row in conn.execute('SELECT id FROM items WHERE raid_instanz = ?', (instanz,))] for instanz in INSTANZEN}
+
+            # Ein Hash für alle: bei tausenden Benutzern würde das Hashen sonst die Laufzeit bestimmen
+            passwort_hash = hashen(PASSWORT)
+            benutzer = [('admin', 'admin'), ('anmelder', 'member')] + [(f'spieler{i}', 'member') for i in range(p['benutzer'])]
+            conn.executemany('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)', [(name, passwort_hash, rolle) for name, rolle in benutzer])
+            user_ids = {row[1]: row[0] for row in conn.execute('SELECT id, username FROM users')}
+            charaktere = [(user_ids[f'spieler{i}'], f'Char{i}x{j}', rnd.choice(KLASSEN), ','.join(rnd.sample(ROLLEN, rnd.randint(1, 2))))
+                          for i in range(p['benutzer']) for j in range(p['charaktere_pro_benutzer'])]
+            charaktere += [(user_ids['anmelder'], f'Anmelder{j}', rnd.choice(KLASSEN), 'DPS') for j in range(p['anmelder_charaktere'])]
+            conn.executemany('INSERT INTO charaktere (user_id, charakter_name, klasse, rollen) VALUES (?, ?, ?, ?)', charaktere)
+            spieler = [row[0] for row in conn.execute('SELECT c.id FROM charaktere c JOIN users u ON c.user_id = u.id WHERE u.username != ?', ('anmelder',))]
+            anmelder = [row[0] for row in conn.execute('SELECT c.id FROM charaktere c JOIN users u ON c.user_id = u.id WHERE u.username = ?', ('anmelder',))]
+            conn.executemany('INSERT INTO wishlist (charakter_id, item_id, prioritaet) VALUES (?, ?, ?)',
+                             [(s, item_id, prio) for s in spieler + anmelder for prio, item_id in enumerate(rnd.sample(items[rnd.choice(INSTANZEN)], p['wishlist']), start=1)])
+
+        # Historische Raids: einzeln gesperrt, damit sich die Punkte wie im Betrieb aufsummieren
+        raid_ids = []
+        for r in range(p['raids']):
+            with conn:
+                instanz = INSTANZEN[r % 2]
+                raid_id = conn.execute("INSERT INTO raids (raid_instanz, raid_datum, raid_zeit, raid_titel, status) VALUES (?, date('now', ?), '20:00', ?, 'Offen')",
+                                       (instanz, f'-{(p["raids"] - r) * 7 // 2} days', f'Raid {r}')).lastrowid
+                _anmelden(conn, rnd, raid_id, rnd.sample(spieler, p['teilnehmer']), items[instanz], p['reservierungen'])
+                punkte_vergeben(conn, raid_id); conn.execute("UPDATE raids SET status = 'Abgeschlossen', punkte_vergeben = 1 WHERE id = ?", (raid_id,))
+                _vergeben(conn, rnd, raid_id, p['vergaben'])
+                raid_ids.append(raid_id)
+
+        with conn:
+            # Aktuelle Raids: einer offen (Anmeldungen), einer gestartet (Dashboard/Vergabe) und 'zu_sperren' offene Raids,
+            # damit jede gemessene Sperre einen frischen Raid trifft und wirklich Punkte vergibt
+            aktuell = {}
+            for name in ['offen', 'gestartet'] + [f'sperren {i}' for i in range(p['zu_sperren'])]:
+                aktuell[name] = conn.execute("INSERT INTO raids (raid_instanz, raid_datum, raid_zeit, raid_titel, status) VALUES ('Naxxramas', date('now', '+1 day'), '20:00', ?, 'Offen')", (name,)).lastrowid
+                _anmelden(conn, rnd, aktuell[name], rnd.sample(spieler, p['teilnehmer'] - 1), items['Naxxramas'], p['reservierungen'])
+            aktuell['sperren'] = [aktuell.pop(f'sperren {i}') for i in range(p['zu_sperren'])]
+            punkte_vergeben(conn, aktuell['gestartet']); conn.execute("UPDATE raids SET status = 'Gestartet', punkte_vergeben = 1 WHERE id = ?", (aktuell['gestartet'],))
+            version_erhoehen(conn, 'loot_punkte', 'items')
+
+            namen = list(user_ids)
+            conn.executemany("INSERT INTO logs (zeitstempel, aktion, details, benutzer, raid_id, item_id, charakter_id) VALUES (datetime('now', ?), ?, ?, ?, ?, ?, ?)",
+                             ((f'-{rnd.randint(0, 365 * 24 * 3600)} seconds', aktion, f'[{benutzer_name}] Synthetischer Eintrag {i}', benutzer_name, rnd.choice(raid_ids) if raid_ids else None,
+                               rnd.choice(items['Naxxramas']) if aktion in ('Item Vergeben', 'Punkte Manuell Angepasst') else None, rnd.choice(spieler))
+                              for i in range(p['logs']) for aktion, benutzer_name in [(rnd.choice(AKTIONEN), rnd.choice(namen[:50]))]))
+        conn.execute('PRAGMA optimize')
+
+        vergabe = [tuple(row) for row in conn.execute('SELECT a.spieler_id, r.item_id FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id WHERE a.raid_id = ?', (aktuell['gestartet'],))]
+        return {'raids': aktuell, 'anmelder': anmelder, 'vergabe': vergabe, 'items': items['Naxxramas'], 'parameter': p,
+                'anzahl': {tabelle: conn.execute(f'SELECT COUNT(*) FROM {tabelle}').fetchone()[0] for tabelle in ('users', 'charaktere', 'items', 'raids', 'anmeldungen', 'reservierungen', 'wishlist', 'loot_punkte', 'logs')}}
+    finally: conn.close()
+
+def _anmelden(conn, rnd, raid_id, spieler_ids, item_ids, reservierungen):
+    conn.executemany('INSERT INTO anmeldungen (spieler_id, raid_id, rolle_angemeldet) VALUES (?, ?, ?)', [(s, raid_id, rnd.choice(ROLLEN)) for s in spieler_ids])
+    anmeldungen = conn.execute('SELECT id FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchall()
+    conn.executemany('INSERT INTO reservierungen (anmeldung_id, item_id) VALUES (?, ?)', [(a[0], item_id) for a in anmeldungen for item_id in rnd.sample(item_ids, reservierungen)])
+
+def _vergeben(conn, rnd, raid_id, anzahl):
+    # Vergibt zufällige reservierte Items des Raids jeweils an den Reservierer mit den meisten Punkten
+    bester = {}
+    for spieler_id, item_id, punkte in conn.execute('SELECT a.spieler_id, r.item_id, lp.punkte FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id JOIN loot_punkte lp ON lp.spieler_id = a.spieler_id AND lp.item_id = r.item_id WHERE a.raid_id = ?', (raid_id,)):
+        if item_id not in bester or punkte > bester[item_id][1]: bester[item_id] = (spieler_id, punkte)
+    for item_id in rnd.sample(sorted(bester), min(anzahl, len(bester))): punkte_setzen(conn, bester[item_id][0], item_id, 0, art=VERGABE, raid_id=raid_id)
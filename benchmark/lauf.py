@@ -0,0 +1,165 @@
+import json, math, os, platform, random, sqlite3, subprocess, tempfile, threading, time
+from benchmark import daten
+from db import pool_fuer, verbinden
+
+# =============================================================
+# BENCHMARK DER HEISSEN ROUTEN
+# =============================================================
+# Schickt die Anfragen über Flasks Test-Client (ohne Netzwerk, aber mit Login, Templates und
+# der echten Datenbankschicht) und misst pro Route Latenz-Perzentile, Durchsatz und die Anzahl
+# SQL-Anweisungen pro Anfrage (über set_trace_callback auf der Verbindung der Anfrage).
+
+def _perzentil(werte, p):
+    # Nearest-Rank auf den sortierten Werten
+    return werte[max(0, math.ceil(p / 100 * len(werte)) - 1)]
+
+class Messung:
+    def __init__(self, app):
+        self.app = app; self.anweisungen = 0; self.ergebnisse = {}
+        app.before_request(self._verfolgen)
+
+    def _verfolgen(self):
+        from app import get_db_connection
+        get_db_connection().set_trace_callback(self._zaehlen)
+
+    def _zaehlen(self, sql): self.anweisungen += 1
+
+    def messen(self, name, client, anfragen, erwartet=(200, 302)):
+        # anfragen: Liste von (methode, url, kwargs); die erste dient zum Aufwärmen und zählt nicht
+        latenzen = []; anweisungen = []
+        methode, url, kwargs = anfragen[0]; client.open(url, method=methode, **kwargs)
+        start = time.perf_counter()
+        for methode, url, kwargs in anfragen[1:]:
+            self.anweisungen = 0; t = time.perf_counter()
+            antwort = client.open(url, method=methode, **kwargs)
+            latenzen.append((time.perf_counter() - t) * 1000); anweisungen.append(self.anweisungen)
+            if antwort.status_code not in erwartet: raise RuntimeError(f'{name}: {methode} {url} -> {antwort.status_code}')
+        gesamt = time.perf_counter() - start; latenzen.sort()
+        self.ergebnisse[name] = {'anfragen': len(latenzen), 'p50_ms': round(_perzentil(latenzen, 50), 3), 'p95_ms': round(_perzentil(latenzen, 95), 3),
+                                 'p99_ms': round(_perzentil(latenzen, 99), 3), 'mittel_ms': round(sum(latenzen) / len(latenzen), 3),
+                                 'durchsatz_rps': round(len(latenzen) / gesamt, 1), 'abfragen_pro_request': round(sum(anweisungen) / len(anweisungen), 2),
+                                 'abfragen_max': max(anweisungen)}
+        print(f"{name:<28} p50 {self.ergebnisse[name]['p50_ms']:>8.2f} ms  p95 {self.ergebnisse[name]['p95_ms']:>8.2f} ms  p99 {self.ergebnisse[name]['p99_ms']:>8.2f} ms  "
+              f"{self.ergebnisse[name]['durchsatz_rps']:>7.1f}/s  {self.ergebnisse[name]['abfragen_pro_request']:>6.1f} SQL/Req")
+
+def _einloggen(app, benutzername):
+    client = app.test_client()
+    antwort = client.post('/login', data={'username': benutzername, 'password': daten.PASSWORT})
+    if antwort.status_code != 302: raise RuntimeError(f'Login als {benutzername} fehlgeschlagen')
+    return client
+
+def anmelde_stress(app, pfad, client, datensatz, parallel):
+    # parallel Threads schicken gleichzeitig Anmeldungen für einen frischen Raid; je zwei davon mit demselben
+    # Charakter und Token (Doppelklick). Erwartet: parallel/2 Anmeldungen, keine doppelten, und jede Anfrage
+    # endet mit der Erfolgsweiterleitung (Fehler = jede andere Antwort, auch eine belegte Schreibsperre).
+    conn = sqlite3.connect(pfad)
+    with conn: raid_id = conn.execute("INSERT INTO raids (raid_instanz, raid_datum, raid_zeit, raid_titel) VALUES ('Naxxramas', date('now', '+2 days'), '20:00', 'Stress')").lastrowid
+    rnd = random.Random(datensatz['parameter']['seed']); sitzung = client.get_cookie('session').value
+    latenzen = []; status = []; start_signal = threading.Barrier(parallel)
+    def senden(i):
+        eigener = app.test_client(); eigener.set_cookie('session', sitzung)
+        daten_formular = {'spieler_id': datensatz['anmelder'][i // 2], 'rolle_angemeldet': 'DPS', 'anmelde_token': f'stress-{raid_id}-{i // 2}', 'item_ids': [str(x) for x in rnd.sample(datensatz['items'], 2)]}
+        start_signal.wait(); t = time.perf_counter()
+        antwort = eigener.post(f'/raid/{raid_id}/anmelden', data=daten_formular)
+        latenzen.append((time.perf_counter() - t) * 1000); status.append(antwort.status_code == 302 and antwort.location.endswith('/raids'))
+    threads = [threading.Thread(target=senden, args=(i,)) for i in range(parallel)]
+    start = time.perf_counter()
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    gesamt = time.perf_counter() - start; latenzen.sort()
+    anmeldungen, charaktere = conn.execute('SELECT COUNT(*), COUNT(DISTINCT spieler_id) FROM anmeldungen WHERE raid_id = ?', (raid_id,)).fetchone(); conn.close()
+    ergebnis = {'anfragen': parallel, 'p50_ms': round(_perzentil(latenzen, 50), 3), 'p95_ms': round(_perzentil(latenzen, 95), 3), 'p99_ms': round(_perzentil(latenzen, 99), 3),
+                'mittel_ms': round(sum(latenzen) / len(latenzen), 3), 'durchsatz_rps': round(parallel / gesamt, 1), 'abfragen_pro_request': None,
+                'anmeldungen': anmeldungen, 'erwartet': (parallel + 1) // 2, 'doppelte': anmeldungen - charaktere, 'fehler': status.count(False)}
+    print(f"{'raid_anmelden (parallel)':<28} p50 {ergebnis['p50_ms']:>8.2f} ms  p95 {ergebnis['p95_ms']:>8.2f} ms  p99 {ergebnis['p99_ms']:>8.2f} ms  "
+          f"{ergebnis['durchsatz_rps']:>7.1f}/s  {anmeldungen}/{ergebnis['erwartet']} Anmeldungen, {ergebnis['doppelte']} doppelt, {ergebnis['fehler']} Fehler")
+    return ergebnis
+
+def analyse_messen(pfad, anzahl=5):
+    # Saison-Analyse ohne Cache neu berechnen, wie nach dem Abschließen eines Raids
+    import analyse
+    from app import ITEM_CLASS_MAP
+    conn = verbinden(pfad); latenzen = []
+    try:
+        for _ in range(anzahl):
+            t = time.perf_counter(); bericht = analyse.berechnen(conn, ITEM_CLASS_MAP); latenzen.append((time.perf_counter() - t) * 1000)
+    finally: conn.close()
+    latenzen.sort()
+    ergebnis = {'anfragen': anzahl, 'p50_ms': round(_perzentil(latenzen, 50), 3), 'p95_ms': round(_perzentil(latenzen, 95), 3), 'p99_ms': round(_perzentil(latenzen, 99), 3),
+                'mittel_ms': round(sum(latenzen) / anzahl, 3), 'durchsatz_rps': round(anzahl / sum(latenzen) * 1000, 1), 'abfragen_pro_request': None, 'umfang': bericht['umfang']}
+    print(f"{'analyse (neu berechnet)':<28} p50 {ergebnis['p50_ms']:>8.2f} ms  p95 {ergebnis['p95_ms']:>8.2f} ms  p99 {ergebnis['p99_ms']:>8.2f} ms  "
+          f"{bericht['umfang']['raids']} Raids, {bericht['umfang']['reservierungen']} Reservierungen, {bericht['umfang']['vergaben']} Vergaben")
+    return ergebnis
+
+def sicherung_messen(messung, client, pfad, anfragen):
+    # Schreib-Latenz, während im Hintergrund ohne Unterbrechung Online-Sicherungen der Datenbank laufen;
+    # im Vergleich mit der Messung ohne Sicherung zeigt sich, ob die Backup-API Schreiber aufhält
+    import sicherung
+    ende = threading.Event(); laeufe = []
+    def sichern(basis):
+        while not ende.is_set(): laeufe.append(sicherung.erstellen(pfad, 'benchmark', basis))
+    with tempfile.TemporaryDirectory() as basis:
+        thread = threading.Thread(target=sichern, args=(basis,)); thread.start()
+        try: messung.messen('item_vergeben (+ Backup)', client, anfragen)
+        finally: ende.set(); thread.join()
+    dauer = sorted(lauf['gesamt_s'] * 1000 for lauf in laeufe)
+    ergebnis = {'anfragen': len(laeufe), 'p50_ms': round(_perzentil(dauer, 50), 3), 'p95_ms': round(_perzentil(dauer, 95), 3), 'p99_ms': round(_perzentil(dauer, 99), 3),
+                'mittel_ms': round(sum(dauer) / len(dauer), 3), 'durchsatz_rps': None, 'abfragen_pro_request': None, 'bytes': laeufe[-1]['bytes'], 'bytes_gz': laeufe[-1]['bytes_gz']}
+    print(f"{'sicherung (online)':<28} p50 {ergebnis['p50_ms']:>8.2f} ms  p95 {ergebnis['p95_ms']:>8.2f} ms  p99 {ergebnis['p99_ms']:>8.2f} ms  "
+          f"{len(laeufe)} Sicherungen, {ergebnis['bytes'] / 1e6:.1f} MB -> {ergebnis['bytes_gz'] / 1e6:.1f} MB gz")
+    return ergebnis
+
+def ausfuehren(pfad=None, wiederholungen=200, parallel=100, **parameter):
+    eigenes_verzeichnis = None
+    if pfad is None: eigenes_verzeichnis = tempfile.TemporaryDirectory(); pfad = os.path.join(eigenes_verzeichnis.name, 'benchmark.db')
+    start = time.perf_counter(); datensatz = daten.erzeugen(pfad, anmelder_charaktere=max(wiederholungen + 1, (parallel + 1) // 2), zu_sperren=wiederholungen + 1, **parameter)
+    print(f"Datensatz in {time.perf_counter() - start:.1f}s erzeugt: " + ', '.join(f'{k} {v}' for k, v in datensatz['anzahl'].items()))
+    from app import app
+    import sicherung; sicherung.AUTOMATISCH = False  # gemessen wird die Sicherung einzeln, siehe sicherung_messen
+    app.config['DATABASE'] = pfad; app.config['TESTING'] = True
+    rnd = random.Random(datensatz['parameter']['seed']); n = wiederholungen + 1
+    messung = Messung(app); admin = _einloggen(app, 'admin'); mitglied = _einloggen(app, 'anmelder')
+    raids = datensatz['raids']; anmelder = datensatz['anmelder']
+
+    try:
+        messung.messen('raid_anmelden (GET)', mitglied, [('GET', f"/raid/{raids['offen']}/anmelden", {})] * n)
+        messung.messen('raid_anmelden (POST)', mitglied, [('POST', f"/raid/{raids['offen']}/anmelden", {'data': {'spieler_id': s, 'rolle_angemeldet': 'DPS', 'item_ids': [str(i) for i in rnd.sample(datensatz['items'], 2)]}}) for s in anmelder[:n]])
+        messung.messen('raid_dashboard', admin, [('GET', f"/dashboard/raid/{raids['gestartet']}", {})] * n)
+        vergabe = [rnd.choice(datensatz['vergabe']) for _ in range(n)]
+        vergabe_anfragen = [('POST', f"/dashboard/raid/{raids['gestartet']}/vergeben", {'data': {'spieler_id': s, 'item_id': i}, 'headers': {'Accept': 'application/json'}}) for s, i in vergabe]
+        messung.messen('item_vergeben', admin, vergabe_anfragen)
+        messung.messen('punkte_uebersicht', mitglied, [('GET', '/punkte', {}), ('GET', '/punkte?sort=punkte&order=desc', {})] * (n // 2 + 1))
+        messung.messen('api_wishlist_helper', mitglied, [('GET', f"/api/raid/{raids['offen']}/wishlist-helper/{rnd.choice(anmelder)}", {}) for _ in range(n)])
+        messung.messen('api_wishlist_helper (alle)', mitglied, [('GET', f"/api/raid/{raids['offen']}/wishlist-helper", {})] * n)
+        suchbegriffe = ['ro', 'rob', 'stab', 'ring', 'platte', 'synth', 'item 1', 'des', 'schild', 'xyz']
+        messung.messen('api_item_search', mitglied, [('GET', f"/api/items/search?q={rnd.choice(suchbegriffe)}&klasse={rnd.choice(daten.KLASSEN)}", {}) for _ in range(n)])
+        messung.messen('log_liste', admin, [('GET', '/admin/logs', {})] * n)
+        messung.messen('log_liste (Filter)', admin, [('GET', f"/admin/logs?aktion={rnd.choice(daten.AKTIONEN)}&benutzer=spieler{rnd.randint(0, 40)}", {}) for _ in range(n)])
+        messung.messen('admin_analyse', admin, [('GET', '/admin/analyse', {})] * n)
+        messung.ergebnisse['analyse (neu berechnet)'] = analyse_messen(pfad)
+        messung.ergebnisse['sicherung (online)'] = sicherung_messen(messung, admin, pfad, vergabe_anfragen)
+        # Jede Sperre trifft einen frischen Raid und vergibt dessen Punkte; erst nach den anderen Routen, weil die
+        # zusätzlich gesperrten Raids den Punktestand vergrößern
+        messung.messen('raid_toggle_lock', admin, [('POST', f'/raid/{raid_id}/toggle_lock', {}) for raid_id in raids['sperren']])
+        if parallel: messung.ergebnisse['raid_anmelden (parallel)'] = anmelde_stress(app, pfad, mitglied, datensatz, parallel)
+    finally:
+        pool_fuer(pfad).schliessen()
+        if eigenes_verzeichnis: eigenes_verzeichnis.cleanup()
+    return {'commit': _commit(), 'zeitpunkt': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'parameter': dict(datensatz['parameter'], wiederholungen=wiederholungen, parallel=parallel), 'datensatz': datensatz['anzahl'], 'routen': messung.ergebnisse}
+
+def _commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=daten.BASIS, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def vergleichen(alt, neu):
+    # Druckt die Veränderung von p95 und SQL/Request je Route gegenüber einem früheren Lauf
+    print(f"\nVergleich mit {alt.get('commit') or 'früherem Lauf'} ({alt.get('zeitpunkt')}):")
+    for name, werte in neu['routen'].items():
+        vorher = alt.get('routen', {}).get(name)
+        if not vorher: print(f"{name:<28} neu"); continue
+        aenderung = (werte['p95_ms'] - vorher['p95_ms']) / vorher['p95_ms'] * 100 if vorher['p95_ms'] else 0
+        print(f"{name:<28} p95 {vorher['p95_ms']:>8.2f} -> {werte['p95_ms']:>8.2f} ms ({aenderung:+.0f}%)  SQL/Req {vorher['abfragen_pro_request']} -> {werte['abfragen_pro_request']}")
+
+def speichern(ergebnis, ausgabe):
+    with open(ausgabe, 'w', encoding='utf-8') as datei: json.dump(ergebnis, datei, ensure_ascii=False, indent=2)
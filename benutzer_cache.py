@@ -0,0 +1,55 @@
+import threading, time
+from collections import OrderedDict
+from db import versionen_lesen
+
+# =============================================================
+# BENUTZER-CACHE (für load_user)
+# =============================================================
+# Flask-Login lädt den Benutzer bei jeder angemeldeten Anfrage. (id, username, role) ändern sich nur
+# in register() und den Admin-Routen für Benutzer; die erhöhen den Versionszähler 'users'. Jeder
+# Worker prüft den Zähler höchstens alle TTL_SEKUNDEN und leert bei einer Änderung den ganzen Cache.
+# Im eigenen Worker wirkt verwerfen() sofort, in den anderen nach spätestens TTL_SEKUNDEN.
+# Treffer innerhalb der TTL brauchen keine Abfrage und keine Verbindung aus dem Pool.
+TTL_SEKUNDEN = 5
+GROESSE = 1024  # Einträge pro Datenbank
+
+
+class _Cache:
+    def __init__(self):
+        self.eintraege = OrderedDict(); self.version = None; self.geprueft = 0.0
+        self.generation = 0  # steigt bei jedem Leeren; verhindert, dass eine vorher gelesene Zeile danach eingetragen wird
+
+
+_caches = {}  # pro Datenbank (Gilde); user_ids sind nur innerhalb einer Datenbank eindeutig
+_lock = threading.Lock()
+
+def _cache(pfad):
+    with _lock: return _caches.get(pfad) or _caches.setdefault(pfad, _Cache())
+
+def laden(pfad, verbindung, user_id):
+    # verbindung: Funktion, die erst bei Bedarf eine Verbindung liefert; Ergebnis (id, username, role) oder None
+    try: user_id = int(user_id)
+    except (TypeError, ValueError): return None
+    cache = _cache(pfad); jetzt = time.monotonic()
+    if jetzt - cache.geprueft > TTL_SEKUNDEN:
+        version = versionen_lesen(verbindung(), 'users')
+        with _lock:
+            if version is None or version != cache.version: cache.eintraege.clear(); cache.version = version; cache.generation += 1
+            cache.geprueft = jetzt
+    with _lock:
+        eintrag = cache.eintraege.get(user_id)
+        if eintrag is not None: cache.eintraege.move_to_end(user_id); return eintrag
+        generation = cache.generation
+    row = verbindung().execute('SELECT id, username, role FROM users WHERE id = ?', (user_id,)).fetchone()
+    if row is None: return None
+    eintrag = (row['id'], row['username'], row['role'])
+    with _lock:
+        if generation != cache.generation: return eintrag
+        cache.eintraege[user_id] = eintrag
+        if len(cache.eintraege) > GROESSE: cache.eintraege.popitem(last=False)
+    return eintrag
+
+def verwerfen(pfad):
+    # Nach dem Commit einer Änderung an users aufrufen (der Zähler 'users' ist dann schon erhöht)
+    cache = _cache(pfad)
+    with _lock: cache.eintraege.clear(); cache.geprueft = 0.0; cache.generation += 1
@@ -1,30 +1,135 @@
-import sqlite3
-
-connection = sqlite3.connect('loot_system.db')
-connection.execute("PRAGMA foreign_keys = ON")
-cursor = connection.cursor()
-
-# Logs-Tabelle: Erweitert um eine optionale raid_id
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        zeitstempel TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        aktion TEXT NOT NULL,
-        details TEXT NOT NULL,
-        raid_id INTEGER
-    )
-''')
-
-# --- Alle anderen Tabellen (unverändert) ---
-cursor.execute('''CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT NOT NULL UNIQUE, boss_name TEXT NOT NULL, raid_instanz TEXT NOT NULL, ruestungstyp TEXT)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'member')''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS charaktere (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, charakter_name TEXT NOT NULL UNIQUE, klasse TEXT NOT NULL, rollen TEXT NOT NULL, FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS raids (id INTEGER PRIMARY KEY AUTOINCREMENT, raid_instanz TEXT NOT NULL, raid_datum DATE NOT NULL, raid_zeit TIME NOT NULL, raid_titel TEXT, status TEXT NOT NULL DEFAULT 'Offen', punkte_vergeben INTEGER NOT NULL DEFAULT 0, erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS anmeldungen (id INTEGER PRIMARY KEY AUTOINCREMENT, spieler_id INTEGER NOT NULL, raid_id INTEGER NOT NULL, rolle_angemeldet TEXT NOT NULL, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (raid_id) REFERENCES raids (id) ON DELETE CASCADE)''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS loot_punkte (spieler_id INTEGER, item_id INTEGER, punkte INTEGER NOT NULL DEFAULT 0, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (spieler_id, item_id))''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS reservierungen (anmeldung_id INTEGER NOT NULL, item_id INTEGER NOT NULL, FOREIGN KEY (anmeldung_id) REFERENCES anmeldungen (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (anmeldung_id, item_id))''')
-cursor.execute('''CREATE TABLE IF NOT EXISTS wishlist (charakter_id INTEGER NOT NULL, item_id INTEGER NOT NULL, prioritaet INTEGER NOT NULL, FOREIGN KEY (charakter_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (charakter_id, item_id))''')
-
-connection.commit()
-connection.close()
-print("Finale Datenbankstruktur mit Raid-Archiv-Unterstützung wurde erstellt!")
\ No newline at end of file
+import argparse, os, sqlite3
+from db import DATENBANK_PFAD
+
+# =============================================================
+# SCHEMA-MIGRATIONEN
+# =============================================================
+# Jede Migration hebt die Datenbank von PRAGMA user_version n-1 auf n und läuft in einer
+# eigenen Transaktion. Bestehende Migrationen nie ändern, neue nur hinten anhängen.
+
+def _basis_schema(cursor):
+    # Logs-Tabelle: Erweitert um eine optionale raid_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            zeitstempel TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            aktion TEXT NOT NULL,
+            details TEXT NOT NULL,
+            raid_id INTEGER
+        )
+    ''')
+
+    # --- Alle anderen Tabellen (unverändert) ---
+    cursor.execute('''CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT NOT NULL UNIQUE, boss_name TEXT NOT NULL, raid_instanz TEXT NOT NULL, ruestungstyp TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'member')''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS charaktere (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, charakter_name TEXT NOT NULL UNIQUE, klasse TEXT NOT NULL, rollen TEXT NOT NULL, FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS raids (id INTEGER PRIMARY KEY AUTOINCREMENT, raid_instanz TEXT NOT NULL, raid_datum DATE NOT NULL, raid_zeit TIME NOT NULL, raid_titel TEXT, status TEXT NOT NULL DEFAULT 'Offen', punkte_vergeben INTEGER NOT NULL DEFAULT 0, erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS anmeldungen (id INTEGER PRIMARY KEY AUTOINCREMENT, spieler_id INTEGER NOT NULL, raid_id INTEGER NOT NULL, rolle_angemeldet TEXT NOT NULL, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (raid_id) REFERENCES raids (id) ON DELETE CASCADE)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS loot_punkte (spieler_id INTEGER, item_id INTEGER, punkte INTEGER NOT NULL DEFAULT 0, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (spieler_id, item_id))''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS reservierungen (anmeldung_id INTEGER NOT NULL, item_id INTEGER NOT NULL, FOREIGN KEY (anmeldung_id) REFERENCES anmeldungen (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (anmeldung_id, item_id))''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS wishlist (charakter_id INTEGER NOT NULL, item_id INTEGER NOT NULL, prioritaet INTEGER NOT NULL, FOREIGN KEY (charakter_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (charakter_id, item_id))''')
+
+    # Versionszähler für die In-Process-Caches der App (Raid-Index usw.)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS cache_versionen (schluessel TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)''')
+
+def _indizes_und_eindeutigkeit(cursor):
+    # Doppelte Anmeldungen (gleicher Charakter, gleicher Raid) zusammenführen: die älteste bleibt
+    # und übernimmt die Reservierungen der anderen, danach greift der UNIQUE-Index
+    cursor.execute('''INSERT OR IGNORE INTO reservierungen (anmeldung_id, item_id)
+        SELECT k.behalten, r.item_id FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id
+        JOIN (SELECT spieler_id, raid_id, MIN(id) as behalten FROM anmeldungen GROUP BY spieler_id, raid_id HAVING COUNT(*) > 1) k ON k.spieler_id = a.spieler_id AND k.raid_id = a.raid_id
+        WHERE a.id != k.behalten''')
+    cursor.execute('DELETE FROM anmeldungen WHERE id NOT IN (SELECT MIN(id) FROM anmeldungen GROUP BY spieler_id, raid_id)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_anmeldungen_spieler_raid ON anmeldungen (spieler_id, raid_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_anmeldungen_raid ON anmeldungen (raid_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_charaktere_user ON charaktere (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_instanz_boss ON items (raid_instanz, boss_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_raid_aktion ON logs (raid_id, aktion, zeitstempel)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_zeitstempel ON logs (zeitstempel)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raids_status_datum ON raids (status, raid_datum)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_wishlist_prioritaet ON wishlist (charakter_id, prioritaet)')
+    # Für ON DELETE CASCADE beim Löschen von Items und für Abfragen je Item
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservierungen_item ON reservierungen (item_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_loot_punkte_item ON loot_punkte (item_id)')
+
+def _log_filter_und_archiv(cursor):
+    # Eigene Spalte für den handelnden Benutzer (bisher nur als "[name]" am Anfang von details)
+    cursor.execute('ALTER TABLE logs ADD COLUMN benutzer TEXT')
+    cursor.execute("UPDATE logs SET benutzer = substr(details, 2, instr(details, ']') - 2) WHERE details LIKE '[%]%'")
+    # Keyset-Pagination des Log-Buchs über (zeitstempel, id), jeweils auch je Filter
+    cursor.execute('DROP INDEX IF EXISTS idx_logs_zeitstempel')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_zeit_id ON logs (zeitstempel, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_aktion_zeit ON logs (aktion, zeitstempel, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_raid_zeit ON logs (raid_id, zeitstempel, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_benutzer_zeit ON logs (benutzer, zeitstempel, id)')
+    # Archivierte Logs abgeschlossener Raids: ein komprimierter JSON-Block pro Raid
+    cursor.execute('''CREATE TABLE IF NOT EXISTS logs_archiv (raid_id INTEGER PRIMARY KEY, archiviert_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP, anzahl INTEGER NOT NULL, daten BLOB NOT NULL)''')
+
+def _strukturierte_logs(cursor):
+    # Betroffene Objekte und Punktestände als eigene Spalten, damit Loot-Streitfälle per Index statt LIKE beantwortet werden
+    for spalte in ('item_id INTEGER', 'charakter_id INTEGER', 'punkte_alt INTEGER', 'punkte_neu INTEGER'): cursor.execute(f'ALTER TABLE logs ADD COLUMN {spalte}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_charakter_zeit ON logs (charakter_id, zeitstempel, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_item_zeit ON logs (item_id, zeitstempel, id)')
+
+def _raid_events(cursor):
+    # Kurzlebige Ereignisse für die Live-Ansichten (SSE); andere Worker lesen sie per Polling über die id
+    cursor.execute('''CREATE TABLE IF NOT EXISTS raid_events (id INTEGER PRIMARY KEY AUTOINCREMENT, raid_id INTEGER NOT NULL, typ TEXT NOT NULL, daten TEXT NOT NULL, zeit TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raid_events_raid ON raid_events (raid_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raid_events_zeit ON raid_events (zeit)')
+
+def _punkte_buchungen(cursor):
+    # Append-only Journal aller Punkteänderungen; loot_punkte ist daraus abgeleitet (siehe punkte.py).
+    # Snapshots halten den abgespielten Stand bis zu einer Buchung fest, damit nicht immer alles abgespielt wird.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS punkte_buchungen (id INTEGER PRIMARY KEY AUTOINCREMENT, spieler_id INTEGER NOT NULL, item_id INTEGER NOT NULL, raid_id INTEGER, art TEXT NOT NULL, wert INTEGER NOT NULL, zeit TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE)''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_buchungen_spieler_item ON punkte_buchungen (spieler_id, item_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_buchungen_item ON punkte_buchungen (item_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_buchungen_raid ON punkte_buchungen (raid_id, id)')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS punkte_snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, buchung_id INTEGER NOT NULL, erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_snapshots_buchung ON punkte_snapshots (buchung_id)')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS punkte_snapshot_werte (snapshot_id INTEGER NOT NULL, spieler_id INTEGER NOT NULL, item_id INTEGER NOT NULL, punkte INTEGER NOT NULL, FOREIGN KEY (snapshot_id) REFERENCES punkte_snapshots (id) ON DELETE CASCADE, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (snapshot_id, spieler_id, item_id)) WITHOUT ROWID''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_snapshot_werte_spieler ON punkte_snapshot_werte (spieler_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_punkte_snapshot_werte_item ON punkte_snapshot_werte (item_id)')
+    # Der bisherige Stand wird als Startbuchung übernommen
+    cursor.execute("INSERT INTO punkte_buchungen (spieler_id, item_id, raid_id, art, wert) SELECT spieler_id, item_id, NULL, 'uebernahme', punkte FROM loot_punkte ORDER BY spieler_id, item_id")
+
+def _auswahl_indizes(cursor):
+    # Charaktersuche im Admin-Dashboard: LIKE 'anfang%' ohne Groß-/Kleinschreibung und Sortierung über denselben Index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_charaktere_name_nocase ON charaktere (charakter_name COLLATE NOCASE)')
+
+def _idempotenz(cursor):
+    # Bereits verarbeitete Anmelde-Tokens (Doppelklick, erneutes Absenden); werden beim Sperren des Raids gelöscht
+    cursor.execute('''CREATE TABLE IF NOT EXISTS idempotenz (schluessel TEXT PRIMARY KEY, user_id INTEGER NOT NULL, raid_id INTEGER NOT NULL, erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP) WITHOUT ROWID''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotenz_raid ON idempotenz (raid_id)')
+
+MIGRATIONEN = [_basis_schema, _indizes_und_eindeutigkeit, _log_filter_und_archiv, _strukturierte_logs, _raid_events, _punkte_buchungen, _auswahl_indizes, _idempotenz]
+
+def migrieren(pfad=DATENBANK_PFAD):
+    # Bringt eine bestehende Datenbank ohne Datenverlust auf den aktuellen Stand; liefert (alt, neu).
+    # Die Version wird erst unter der Schreibsperre gelesen, parallel startende Worker migrieren also nie doppelt.
+    connection = sqlite3.connect(pfad, isolation_level=None, timeout=30)
+    connection.execute("PRAGMA foreign_keys = ON")
+    try:
+        alt = None
+        while True:
+            cursor = connection.cursor(); cursor.execute('BEGIN IMMEDIATE')
+            try:
+                version = cursor.execute('PRAGMA user_version').fetchone()[0]
+                if alt is None: alt = version
+                if version >= len(MIGRATIONEN): cursor.execute('COMMIT'); return alt, version
+                MIGRATIONEN[version](cursor); cursor.execute(f'PRAGMA user_version = {version + 1}'); cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK'); raise
+    finally: connection.close()
+
+if __name__ == '__main__':
+    import gilden
+    parser = argparse.ArgumentParser(description='Datenbank anlegen bzw. auf die aktuelle Schema-Version migrieren. Mit --gilde wird die Datenbank einer neuen Gilde angelegt.')
+    parser.add_argument('pfad', nargs='?', help=f'Datenbank-Datei (Standard: {DATENBANK_PFAD})')
+    gilden.optionen(parser); args = parser.parse_args()
+    pfade = [args.pfad] if args.pfad else gilden.datenbanken(args, anlegen=True)
+    if args.alle_gilden and not pfade: print("Keine Gilden-Datenbanken gefunden.")
+    for pfad in pfade:
+        if os.path.dirname(pfad): os.makedirs(os.path.dirname(pfad), exist_ok=True)
+        alt, neu = migrieren(pfad)
+        if alt == neu: print(f"Datenbank '{pfad}' ist aktuell (Schema-Version {neu}).")
+        else: print(f"Datenbank '{pfad}' von Schema-Version {alt} auf {neu} migriert.")
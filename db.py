@@ -0,0 +1,136 @@
+import os, queue, random, sqlite3, threading, time
+from collections import OrderedDict
+
+# =============================================================
+# DATENBANK-VERBINDUNGEN
+# =============================================================
+# Pfad kann per Umgebungsvariable überschrieben werden (z.B. für Tests oder mehrere Instanzen)
+DATENBANK_PFAD = os.environ.get('LOOT_DB', 'loot_system.db')
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE = 256
+POOL_GROESSE = 16
+SPERRE_VERSUCHE = 4
+SPERRE_WARTEN_MS = 500  # busy_timeout pro Versuch in schreibsperre()
+SPERRE_BACKOFF_MS = 50
+MAX_POOLS = int(os.environ.get('LOOT_MAX_POOLS', 32))  # gleichzeitig offene Datenbanken (Gilden) pro Prozess
+POOL_LEERLAUF_SEKUNDEN = 300  # so lange unbenutzte Pools werden geschlossen
+
+
+class Verbindung(sqlite3.Connection):
+    # Kennt ihren Pfad; die In-Process-Caches halten ihren Stand pro Datenbank (Gilde) unter diesem Schlüssel
+    pfad = None
+
+def shard(conn):
+    # Cache-Schlüssel einer Verbindung; None für Verbindungen, die nicht über verbinden() entstanden sind
+    return getattr(conn, 'pfad', None)
+
+def verbinden(pfad=DATENBANK_PFAD, factory=Verbindung):
+    # Öffnet eine Verbindung und setzt alle PRAGMAs genau einmal pro Verbindung.
+    # factory: Unterklasse von Verbindung, z.B. metriken.MessVerbindung
+    conn = sqlite3.connect(pfad, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, cached_statements=STATEMENT_CACHE, factory=factory)
+    conn.pfad = pfad
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ConnectionPool:
+    # Hält bereits konfigurierte Verbindungen vor, damit nicht jede Anfrage neu verbindet.
+    # Nach einem fork() (gunicorn --preload) werden geerbte Verbindungen verworfen.
+    def __init__(self, pfad, groesse=POOL_GROESSE, factory=Verbindung):
+        self.pfad = pfad; self.groesse = groesse; self.factory = factory
+        self._frei = queue.LifoQueue(); self._pid = os.getpid(); self.benutzt = time.monotonic(); self.geschlossen = False
+
+    def holen(self):
+        if self._pid != os.getpid(): self._frei = queue.LifoQueue(); self._pid = os.getpid()
+        try: return self._frei.get_nowait()
+        except queue.Empty: return verbinden(self.pfad, self.factory)
+
+    def zurueckgeben(self, conn):
+        # Nicht abgeschlossene Transaktionen werden verworfen, nie an die nächste Anfrage vererbt
+        try:
+            if conn.in_transaction: conn.rollback()
+        except sqlite3.Error: conn.close(); return
+        if self.geschlossen or self._pid != os.getpid() or self._frei.qsize() >= self.groesse: conn.close(); return
+        self._frei.put_nowait(conn)
+
+    def schliessen(self):
+        # Noch ausgeliehene Verbindungen werden bei der Rückgabe geschlossen
+        self.geschlossen = True
+        while True:
+            try: self._frei.get_nowait().close()
+            except queue.Empty: break
+
+
+class SchreibsperreBelegt(Exception):
+    pass
+
+def schreibsperre(conn, versuche=SPERRE_VERSUCHE):
+    # BEGIN IMMEDIATE: holt die Schreibsperre gleich zu Beginn, damit alles, was danach in der Transaktion
+    # gelesen und geprüft wird, bis zum Commit gilt. Jeder Versuch wartet höchstens SPERRE_WARTEN_MS,
+    # dazwischen exponentielles Backoff mit Jitter; danach SchreibsperreBelegt.
+    conn.execute(f'PRAGMA busy_timeout = {SPERRE_WARTEN_MS}')
+    try:
+        for versuch in range(versuche):
+            try: conn.execute('BEGIN IMMEDIATE'); return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e): raise
+                if versuch == versuche - 1: raise SchreibsperreBelegt() from e
+                time.sleep(SPERRE_BACKOFF_MS * 2 ** versuch * random.uniform(0.5, 1) / 1000)
+    finally: conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+
+
+_pools = OrderedDict()  # pfad -> Pool, zuletzt benutzter am Ende
+_eingerichtet = set()
+_pools_lock = threading.Lock()
+_beim_schliessen = []
+
+def beim_schliessen(funktion):
+    # Registriert funktion(pfad) für Module mit eigenen Threads oder Verbindungen pro Datenbank (Log-Schreiber,
+    # Raid-Ereignisse, Sicherungen): pool_fuer ruft sie auf, wenn es den Pool des Pfads schließt
+    _beim_schliessen.append(funktion); return funktion
+
+def pool_fuer(pfad, einrichten=None, factory=Verbindung):
+    # einrichten (z.B. die Schema-Migration) läuft einmal pro Prozess und Pfad, bevor der erste Pool entsteht.
+    # Es bleiben höchstens MAX_POOLS Pools offen; der am längsten unbenutzte und alle, die länger als
+    # POOL_LEERLAUF_SEKUNDEN unbenutzt sind, werden geschlossen und beim nächsten Zugriff neu angelegt;
+    # mit ihnen alles, was sich über beim_schliessen angemeldet hat.
+    jetzt = time.monotonic(); schliessen = []
+    with _pools_lock:
+        pool = _pools.get(pfad)
+        if pool is None:
+            if einrichten and pfad not in _eingerichtet: einrichten(pfad); _eingerichtet.add(pfad)
+            pool = _pools[pfad] = ConnectionPool(pfad, factory=factory)
+        _pools.move_to_end(pfad); pool.benutzt = jetzt
+        while len(_pools) > MAX_POOLS or jetzt - next(iter(_pools.values())).benutzt > POOL_LEERLAUF_SEKUNDEN: schliessen.append(_pools.popitem(last=False)[1])
+    for alt in schliessen:
+        alt.schliessen()
+        for funktion in _beim_schliessen: funktion(alt.pfad)
+    return pool
+
+
+# =============================================================
+# CACHE-VERSIONEN
+# =============================================================
+# Zähler in der Tabelle cache_versionen, über die In-Process-Caches aller Worker erkennen,
+# dass ein anderer Prozess die zugrunde liegenden Daten geändert hat. Fehlt die Tabelle
+# (alte Datenbank, database_setup.py noch nicht ausgeführt), liefert versionen_lesen None
+# und die Caches werden bei jedem Zugriff neu aufgebaut.
+def _fehlende_tabelle(fehler): return 'no such table' in str(fehler)
+
+def versionen_lesen(conn, *schluessel):
+    try: rows = conn.execute(f"SELECT schluessel, version FROM cache_versionen WHERE schluessel IN ({','.join('?' for _ in schluessel)})", schluessel).fetchall()
+    except sqlite3.OperationalError as e:
+        if _fehlende_tabelle(e): return None
+        raise
+    werte = {row[0]: row[1] for row in rows}
+    return tuple(werte.get(s, 0) for s in schluessel)
+
+def version_erhoehen(conn, *schluessel):
+    # Muss in derselben Transaktion wie die eigentliche Änderung laufen
+    try: conn.executemany('INSERT INTO cache_versionen (schluessel, version) VALUES (?, 1) ON CONFLICT (schluessel) DO UPDATE SET version = version + 1', [(s,) for s in schluessel])
+    except sqlite3.OperationalError as e:
+        if not _fehlende_tabelle(e): raise
@@ -0,0 +1,66 @@
+import os, re
+from db import DATENBANK_PFAD
+
+# =============================================================
+# GILDEN (eine SQLite-Datenbank pro Gilde)
+# =============================================================
+# Mit LOOT_GILDEN zeigt ein Prozess auf ein Verzeichnis mit einer Datenbank <gilde>.db pro Gilde.
+# Welche Gilde eine Anfrage meint, bestimmt die Weiche vor der App: die Subdomain unter
+# LOOT_GILDEN_DOMAIN (naxx.loot.example.org -> 'naxx') oder der URL-Prefix /g/<gilde>/. Der Prefix
+# wandert nach SCRIPT_NAME, dadurch erzeugt url_for() alle Links der Gilde mit Prefix. Neue Gilden
+# legt nur database_setup.py --gilde an; unbekannte Gilden bekommen 404.
+# Ohne LOOT_GILDEN bleibt alles wie bisher: eine Datenbank unter DATENBANK_PFAD.
+VERZEICHNIS = os.environ.get('LOOT_GILDEN')
+DOMAIN = os.environ.get('LOOT_GILDEN_DOMAIN')
+PREFIX = '/g/'
+_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,39}$')
+
+def gueltig(gilde): return bool(gilde) and _NAME.match(gilde) is not None
+
+def pfad(gilde, verzeichnis=None):
+    if not gueltig(gilde): raise ValueError(f"Ungültiger Gildenname '{gilde}' (erlaubt: a-z, 0-9, - und _, höchstens 40 Zeichen)")
+    return os.path.join(verzeichnis or VERZEICHNIS, f'{gilde}.db')
+
+def vorhanden(gilde): return gueltig(gilde) and os.path.exists(pfad(gilde))
+
+def alle(verzeichnis=None):
+    verzeichnis = verzeichnis or VERZEICHNIS
+    if not verzeichnis or not os.path.isdir(verzeichnis): return []
+    return sorted(name[:-3] for name in os.listdir(verzeichnis) if name.endswith('.db') and gueltig(name[:-3]))
+
+
+class Weiche:
+    # WSGI-Middleware: legt die Gilde unter environ['loot.gilde'] ab (None = keine angegeben)
+    def __init__(self, app): self.app = app
+
+    def __call__(self, environ, start_response):
+        gilde = None
+        if DOMAIN:
+            host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+            if host.endswith('.' + DOMAIN): gilde = host[:-len(DOMAIN) - 1]
+        pfad_info = environ.get('PATH_INFO', '')
+        if gilde is None and pfad_info.startswith(PREFIX):
+            gilde, _, rest = pfad_info[len(PREFIX):].partition('/')
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + PREFIX + gilde; environ['PATH_INFO'] = '/' + rest
+        environ['loot.gilde'] = gilde
+        return self.app(environ, start_response)
+
+
+# --- Kommandozeile ---
+def optionen(parser):
+    gruppe = parser.add_mutually_exclusive_group()
+    gruppe.add_argument('--gilde', help='nur die Datenbank dieser Gilde (in LOOT_GILDEN bzw. --gilden-verzeichnis)')
+    gruppe.add_argument('--alle-gilden', action='store_true', help='nacheinander alle Gilden-Datenbanken')
+    parser.add_argument('--gilden-verzeichnis', default=VERZEICHNIS, help='Standard: LOOT_GILDEN')
+
+def datenbanken(args, anlegen=False):
+    # Pfade, auf denen ein Kommando laufen soll; ohne --gilde/--alle-gilden nur DATENBANK_PFAD.
+    # Eine unbekannte Gilde ist ein Fehler, außer beim Anlegen (database_setup.py).
+    if not args.gilde and not args.alle_gilden: return [DATENBANK_PFAD]
+    if not args.gilden_verzeichnis: raise SystemExit('Fehler: --gilde/--alle-gilden brauchen LOOT_GILDEN oder --gilden-verzeichnis.')
+    if args.gilde:
+        try: ziel = pfad(args.gilde, args.gilden_verzeichnis)
+        except ValueError as e: raise SystemExit(f'Fehler: {e}')
+        if not anlegen and not os.path.exists(ziel): raise SystemExit(f"Fehler: Gilde '{args.gilde}' gibt es nicht (anlegen mit: python database_setup.py --gilde {args.gilde}).")
+        return [ziel]
+    return [pfad(gilde, args.gilden_verzeichnis) for gilde in alle(args.gilden_verzeichnis)]
@@ -0,0 +1,12 @@
+import os
+
+# =============================================================
+# GUNICORN (wird aus dem Arbeitsverzeichnis automatisch geladen)
+# =============================================================
+# gthread statt Sync-Worker: ein offener Live-Feed (raid_events) belegt nur einen Thread, die
+# übrigen bedienen weiter normale Seiten. raid_events.MAX_STREAMS muss unter THREADS bleiben.
+bind = os.environ.get('LOOT_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('LOOT_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('LOOT_THREADS', 16))
+wsgi_app = 'app:app'
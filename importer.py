@@ -1,22 +1,70 @@
-import sqlite3, csv, sys
-def import_items_from_csv(filename):
-    conn = sqlite3.connect('loot_system.db')
-    cursor = conn.cursor()
+import argparse, csv, sqlite3, sys, time
+from db import verbinden, version_erhoehen
+from database_setup import migrieren
+import gilden
+
+# =============================================================
+# ITEM-IMPORT (CSV: Item-Name, Boss-Name, Raid-Instanz, Ruestungstyp)
+# =============================================================
+# Upsert über item_name: vorhandene Items behalten ihre id, damit loot_punkte, reservierungen
+# und wishlist nicht per ON DELETE CASCADE verschwinden (wie früher bei INSERT OR REPLACE).
+# Alle Dateien laufen in einer Transaktion; ist eine Zeile ungültig, wird nichts übernommen.
+# Aufruf: python importer.py [--dry-run] [--gilde NAME | --alle-gilden] import_aq40.csv import_naxx.csv
+_UPSERT = '''INSERT INTO items (item_name, boss_name, raid_instanz, ruestungstyp) VALUES (?, ?, ?, ?)
+             ON CONFLICT (item_name) DO UPDATE SET boss_name = excluded.boss_name, raid_instanz = excluded.raid_instanz, ruestungstyp = excluded.ruestungstyp'''
+
+class ImportFehler(Exception): pass
+
+def zeilen_lesen(dateiname):
+    # Liest die Datei zeilenweise; liefert (item_name, boss_name, raid_instanz, ruestungstyp)
+    with open(dateiname, mode='r', encoding='utf-8-sig', newline='') as datei:
+        leser = csv.reader(datei); next(leser, None)
+        for row in leser:
+            if not any(col.strip() for col in row): continue
+            if len(row) < 4: raise ImportFehler(f"{dateiname}:{leser.line_num}: {len(row)} statt 4 Spalten")
+            item_name, boss_name, raid_instanz, ruestungstyp = [col.strip() for col in row[:4]]
+            if not (item_name and boss_name and raid_instanz): raise ImportFehler(f"{dateiname}:{leser.line_num}: Item-, Boss- und Raid-Name dürfen nicht leer sein")
+            yield item_name, boss_name, raid_instanz, ruestungstyp or None
+
+def items_importieren(conn, dateinamen, probelauf=False):
+    # Vergleicht jedes Item mit dem aktuellen Stand und schreibt nur neue oder geänderte.
+    # Kommt ein Item mehrfach vor (auch dateiübergreifend), gilt die letzte Zeile.
+    zeilen = {}; doppelt = 0
+    for dateiname in dateinamen:
+        for werte in zeilen_lesen(dateiname):
+            doppelt += werte[0] in zeilen; zeilen[werte[0]] = werte[1:]
+    vorhanden = {row[0]: tuple(row[1:]) for row in conn.execute('SELECT item_name, boss_name, raid_instanz, ruestungstyp FROM items')}
+    zaehler = {'neu': 0, 'geaendert': 0, 'unveraendert': 0, 'doppelt': doppelt}
+    def aenderungen():
+        for item_name, werte in zeilen.items():
+            alt = vorhanden.get(item_name)
+            if alt == werte: zaehler['unveraendert'] += 1; continue
+            zaehler['neu' if alt is None else 'geaendert'] += 1
+            yield (item_name,) + werte
     try:
-        with open(filename, mode='r', encoding='utf-8') as file:
-            csv_reader = csv.reader(file)
-            next(csv_reader)
-            item_count = 0
-            for row in csv_reader:
-                if len(row) >= 4:
-                    item_name, boss_name, raid_instanz, ruestungstyp = [col.strip() for col in row]
-                    cursor.execute("INSERT OR REPLACE INTO items (item_name, boss_name, raid_instanz, ruestungstyp) VALUES (?, ?, ?, ?)",
-                                 (item_name, boss_name, raid_instanz, ruestungstyp))
-                    item_count += 1
-        conn.commit()
-        conn.close()
-        print(f"\nImport aus '{filename}' erfolgreich. {item_count} Items verarbeitet.")
-    except Exception as e: print(f"\nFehler: {e}")
+        if probelauf:
+            for _ in aenderungen(): pass
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(_UPSERT, aenderungen())
+            if zaehler['neu'] or zaehler['geaendert']: version_erhoehen(conn, 'items')  # Item-Katalog der laufenden App neu laden lassen
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction: conn.rollback()
+        raise
+    return zaehler
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1: import_items_from_csv(sys.argv[1])
-    else: print("Beispiel: python importer.py dateiname.csv")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Items aus CSV-Dateien importieren (Upsert über den Item-Namen).')
+    parser.add_argument('dateien', nargs='+', metavar='datei.csv')
+    parser.add_argument('--dry-run', action='store_true', help='nur anzeigen, was sich ändern würde')
+    gilden.optionen(parser); args = parser.parse_args(); fehler = 0
+    for pfad in gilden.datenbanken(args):
+        migrieren(pfad); conn = verbinden(pfad); start = time.perf_counter()
+        try: zaehler = items_importieren(conn, args.dateien, probelauf=args.dry_run)
+        except (ImportFehler, OSError, sqlite3.Error) as e: print(f"\n{pfad}: Fehler: {e} - nichts importiert."); fehler += 1; continue
+        finally: conn.close()
+        doppelt = f", {zaehler['doppelt']} doppelte Zeilen (letzte gilt)" if zaehler['doppelt'] else ''
+        print(f"\n{pfad}: {'Probelauf' if args.dry_run else 'Import'} aus {', '.join(args.dateien)} in {time.perf_counter() - start:.3f}s: "
+              f"{zaehler['neu']} neu, {zaehler['geaendert']} geändert, {zaehler['unveraendert']} unverändert{doppelt}.")
+    sys.exit(1 if fehler else 0)
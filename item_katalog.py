@@ -0,0 +1,90 @@
+import bisect, threading, unicodedata
+from db import versionen_lesen, shard
+
+# =============================================================
+# ITEM-KATALOG (In-Process-Cache für die Item-Suche)
+# =============================================================
+# Hält alle Items im Speicher, dazu einen Trigramm-Index über die normalisierten Namen und die
+# vorberechnete Zuordnung Klasse -> erlaubte Rüstungstypen. Änderungen an items (Admin-Routen,
+# importer.py) erhöhen den Versionszähler 'items'; weicht er ab, wird der Katalog neu aufgebaut.
+UNIVERSELLE_TYPEN = ['Reittier', 'Schmuckstück', 'Ring', 'Hals', 'Umhang', 'Einhand', 'Zweihand', 'Schildhand', 'Questgegenstand', 'Rezept', 'Sonstiges']
+_UMLAUTE = str.maketrans({'ä': 'a', 'ö': 'o', 'ü': 'u', 'ß': 'ss'})
+
+def normalisieren(text):
+    # Umlaut-unabhängig: "Rüstung", "Ruestung" und "Rustung" ergeben alle "rustung"
+    text = (text or '').lower().translate(_UMLAUTE).replace('ae', 'a').replace('oe', 'o').replace('ue', 'u')
+    text = ''.join(z for z in unicodedata.normalize('NFKD', text) if not unicodedata.combining(z))
+    return ' '.join(''.join(z if z.isalnum() else ' ' for z in text).split())
+
+def _trigramme(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def erlaubte_typen(item_class_map):
+    # Klasse -> erlaubte Rüstungstypen; '' (keine Klasse) erlaubt alle bekannten Typen
+    klassen = {k for liste in item_class_map.values() for k in liste}
+    typen = {klasse: frozenset(UNIVERSELLE_TYPEN + [t for t, liste in item_class_map.items() if klasse in liste]) for klasse in klassen}
+    typen[''] = frozenset(UNIVERSELLE_TYPEN + list(item_class_map))
+    return typen
+
+
+class ItemKatalog:
+    def __init__(self, items, version):
+        self.version = version
+        self.items = [dict(item) for item in items]
+        self.namen = [normalisieren(item['item_name']) for item in self.items]
+        self.nach_id = {item['id']: item for item in self.items}
+        self.nach_instanz = {}
+        for pos, item in enumerate(self.items): self.nach_instanz.setdefault(item['raid_instanz'], []).append(pos)
+        self.trigramme = {}
+        for pos, name in enumerate(self.namen):
+            for tri in _trigramme(name): self.trigramme.setdefault(tri, set()).add(pos)
+        # Sortierte Wortanfänge (Name ab jedem Wort) für die Präfixsuche bei Eingaben unter drei Zeichen
+        self.sortiert = sorted((name[i:], pos) for pos, name in enumerate(self.namen) for i in range(len(name)) if i == 0 or name[i - 1] == ' ')
+
+    def _kandidaten(self, q):
+        if len(q) >= 3:
+            mengen = sorted((self.trigramme.get(tri, set()) for tri in _trigramme(q)), key=len)
+            treffer = set.intersection(*mengen) if mengen else set()
+            return [pos for pos in treffer if q in self.namen[pos]]
+        start = bisect.bisect_left(self.sortiert, (q,))
+        ergebnis = {}
+        for rest, pos in self.sortiert[start:]:
+            if not rest.startswith(q): break
+            ergebnis[pos] = None
+        return list(ergebnis)
+
+    def _rang(self, q):
+        # Rangfolge: exakter Name, Namensanfang, Wortanfang, irgendwo im Namen; dann kürzere Namen zuerst
+        def rang(pos):
+            name = self.namen[pos]
+            stufe = 0 if name == q else 1 if name.startswith(q) else 2 if (' ' + q) in (' ' + name) else 3
+            return (stufe, len(name), name)
+        return rang
+
+    def suchen(self, query, typen=None, limit=10):
+        q = normalisieren(query)
+        if not q: return []
+        treffer = [pos for pos in self._kandidaten(q) if typen is None or self.items[pos]['ruestungstyp'] in typen]
+        return [dict(self.items[pos]) for pos in sorted(treffer, key=self._rang(q))[:limit]]
+
+    def seite(self, query='', instanz=None, boss=None, start=0, anzahl=20):
+        # Für die Auswahlfelder im Admin-Bereich: ohne Suchbegriff alphabetisch, sonst wie suchen() sortiert.
+        # Liefert (items, Start der nächsten Seite oder None)
+        q = normalisieren(query)
+        if q: positionen = sorted(self._kandidaten(q), key=self._rang(q))
+        else: positionen = self.nach_instanz.get(instanz, []) if instanz is not None else range(len(self.items))
+        treffer = [pos for pos in positionen if (instanz is None or self.items[pos]['raid_instanz'] == instanz) and (boss is None or self.items[pos]['boss_name'] == boss)]
+        weiter = start + anzahl if len(treffer) > start + anzahl else None
+        return [dict(self.items[pos]) for pos in treffer[start:start + anzahl]], weiter
+
+
+_kataloge = {}  # pro Datenbank (Gilde)
+_lock = threading.Lock()
+
+def katalog(conn):
+    version = versionen_lesen(conn, 'items')
+    aktuell = _kataloge.get(shard(conn))
+    if aktuell is not None and version is not None and aktuell.version == version: return aktuell
+    neu = ItemKatalog(conn.execute('SELECT * FROM items ORDER BY item_name').fetchall(), version)
+    with _lock: _kataloge[shard(conn)] = neu
+    return neu
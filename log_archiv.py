@@ -0,0 +1,47 @@
+import argparse, json, zlib
+from db import verbinden, version_erhoehen
+from database_setup import migrieren
+
+# =============================================================
+# LOG-ARCHIV
+# =============================================================
+# Verschiebt die Logs abgeschlossener Raids, die älter als LOG_ARCHIV_TAGE sind, aus der
+# logs-Tabelle in logs_archiv (ein zlib-komprimierter JSON-Block pro Raid). archiv_detail()
+# liest sie von dort weiterhin. Aufruf: python log_archiv.py [tage] [--gilde NAME | --alle-gilden]
+LOG_ARCHIV_TAGE = 90
+_SPALTEN = ['id', 'zeitstempel', 'aktion', 'details', 'raid_id', 'benutzer', 'item_id', 'charakter_id', 'punkte_alt', 'punkte_neu']
+
+def _entpacken(daten): return json.loads(zlib.decompress(daten))
+
+def archivierte_logs(conn, raid_id, aktion=None):
+    row = conn.execute('SELECT daten FROM logs_archiv WHERE raid_id = ?', (raid_id,)).fetchone()
+    if not row: return []
+    return [log for log in _entpacken(row['daten']) if aktion is None or log['aktion'] == aktion]
+
+def logs_archivieren(conn, alter_tage=LOG_ARCHIV_TAGE):
+    # Eine Transaktion für alle Raids; liefert {raid_id: anzahl verschobener Einträge}
+    # Modifier mit Vorzeichen: ein negatives Alter (Raids bis so viele Tage in der Zukunft) ergibt '+N days', nicht '--N days'
+    raids = conn.execute("SELECT id FROM raids WHERE status = 'Abgeschlossen' AND raid_datum < date('now', ?) AND EXISTS (SELECT 1 FROM logs WHERE logs.raid_id = raids.id)", (f'{-int(alter_tage):+d} days',)).fetchall()
+    ergebnis = {}
+    for raid in raids:
+        logs = [dict(zip(_SPALTEN, row)) for row in conn.execute(f"SELECT {', '.join(_SPALTEN)} FROM logs WHERE raid_id = ? ORDER BY zeitstempel, id", (raid['id'],))]
+        vorhanden = conn.execute('SELECT daten FROM logs_archiv WHERE raid_id = ?', (raid['id'],)).fetchone()
+        alle = (_entpacken(vorhanden['daten']) if vorhanden else []) + logs
+        daten = zlib.compress(json.dumps(alle, ensure_ascii=False).encode('utf-8'), 9)
+        conn.execute('INSERT INTO logs_archiv (raid_id, anzahl, daten) VALUES (?, ?, ?) ON CONFLICT (raid_id) DO UPDATE SET anzahl = excluded.anzahl, daten = excluded.daten, archiviert_am = CURRENT_TIMESTAMP', (raid['id'], len(alle), daten))
+        conn.execute('DELETE FROM logs WHERE raid_id = ?', (raid['id'],))
+        ergebnis[raid['id']] = len(logs)
+    if ergebnis: version_erhoehen(conn, 'log_aktionen')  # Aktionen, die nur diese Raids hatten, fallen aus dem Filter
+    conn.commit()
+    return ergebnis
+
+if __name__ == '__main__':
+    import gilden
+    parser = argparse.ArgumentParser(description='Logs abgeschlossener Raids ins Archiv verschieben.')
+    parser.add_argument('tage', nargs='?', type=int, default=LOG_ARCHIV_TAGE, help=f'Mindestalter der Raids in Tagen (Standard: {LOG_ARCHIV_TAGE})')
+    gilden.optionen(parser); args = parser.parse_args()
+    for pfad in gilden.datenbanken(args):
+        migrieren(pfad); conn = verbinden(pfad)
+        try: ergebnis = logs_archivieren(conn, args.tage)
+        finally: conn.close()
+        print(f"{pfad}: {sum(ergebnis.values())} Log-Einträge aus {len(ergebnis)} abgeschlossenen Raids archiviert (älter als {args.tage} Tage).")
@@ -0,0 +1,159 @@
+import cProfile, io, pstats, re, sqlite3, threading, time
+from collections import deque
+from db import Verbindung
+
+# =============================================================
+# METRIKEN (Latenz pro Route, SQL pro Anfrage, langsame Abfragen)
+# =============================================================
+# MessVerbindung zählt und misst jede Anweisung, die über die Verbindung läuft; app.py startet
+# pro Anfrage eine Messung und bucht sie am Ende auf den Endpoint. Alles bleibt im Prozess
+# (pro Worker); Kosten pro Anweisung: zwei perf_counter-Aufrufe und eine Addition.
+# Gemessen wird execute() bis zur ersten Ergebniszeile; das Abholen weiterer Zeilen zählt nicht mit.
+AKTIV = True
+LANGSAM_MS = 50  # Anweisungen ab dieser Dauer landen im Slow-Query-Log
+LANGSAM_ANZAHL = 200
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_lokal = threading.local()
+_lock = threading.Lock()
+_routen = {}
+_langsam = deque(maxlen=LANGSAM_ANZAHL)
+_gestartet = time.time()
+
+_LITERALE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTEN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+def normalisieren(sql):
+    # Literale und lange IN-Listen zusammenfassen, damit gleiche Abfragen gleich aussehen
+    sql = _LITERALE.sub('?', ' '.join(sql.split()))
+    return _LISTEN.sub('(?, ...)', sql)
+
+def _buchen(sql, parameter_anzahl, dauer):
+    messung = getattr(_lokal, 'messung', None)
+    if messung is not None: messung['anweisungen'] += 1; messung['sql_zeit'] += dauer
+    if dauer * 1000 >= LANGSAM_MS:
+        _langsam.append({'zeit': time.time(), 'route': messung['route'] if messung else None, 'sql': normalisieren(sql), 'parameter': parameter_anzahl, 'dauer_ms': round(dauer * 1000, 2)})
+
+def _anzahl(parameter):
+    try: return len(parameter)
+    except TypeError: return 0
+
+
+class MessCursor(sqlite3.Cursor):
+    def execute(self, sql, parameter=()):
+        if not AKTIV: return super().execute(sql, parameter)
+        start = time.perf_counter()
+        try: return super().execute(sql, parameter)
+        finally: _buchen(sql, _anzahl(parameter), time.perf_counter() - start)
+
+    def executemany(self, sql, parameter):
+        if not AKTIV: return super().executemany(sql, parameter)
+        # Generatoren (z.B. aus dem Import) nicht auflisten; dann bleibt die Parameterzahl unbekannt (0)
+        anzahl = _anzahl(parameter[0]) * len(parameter) if isinstance(parameter, (list, tuple)) and parameter else 0
+        start = time.perf_counter()
+        try: return super().executemany(sql, parameter)
+        finally: _buchen(sql, anzahl, time.perf_counter() - start)
+
+
+class MessVerbindung(Verbindung):
+    # Connection.execute() der C-Implementierung umgeht überschriebene Cursor-Methoden,
+    # deshalb laufen execute/executemany hier ausdrücklich über MessCursor
+    def cursor(self, factory=MessCursor): return super().cursor(factory)
+    def execute(self, sql, parameter=()): return self.cursor().execute(sql, parameter)
+    def executemany(self, sql, parameter): return self.cursor().executemany(sql, parameter)
+
+
+# --- Anfragen ---
+def anfrage_beginnen(route):
+    if AKTIV: _lokal.messung = {'route': route, 'start': time.perf_counter(), 'anweisungen': 0, 'sql_zeit': 0.0}
+    profiler.beginnen(route)
+
+def anfrage_beenden():
+    profiler.beenden()
+    messung = getattr(_lokal, 'messung', None); _lokal.messung = None
+    if messung is None: return
+    dauer_ms = (time.perf_counter() - messung['start']) * 1000
+    with _lock:
+        r = _routen.get(messung['route'])
+        if r is None: r = _routen[messung['route']] = {'anzahl': 0, 'summe_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(BUCKETS_MS) + 1), 'anweisungen': 0, 'sql_ms': 0.0}
+        r['anzahl'] += 1; r['summe_ms'] += dauer_ms; r['max_ms'] = max(r['max_ms'], dauer_ms)
+        r['anweisungen'] += messung['anweisungen']; r['sql_ms'] += messung['sql_zeit'] * 1000
+        i = 0
+        while i < len(BUCKETS_MS) and dauer_ms > BUCKETS_MS[i]: i += 1
+        r['buckets'][i] += 1
+
+def _perzentil(r, p):
+    # Obergrenze des Buckets, in dem das Perzentil liegt (wie histogram_quantile, ohne Interpolation)
+    ziel = r['anzahl'] * p / 100; summe = 0
+    for grenze, anzahl in zip(BUCKETS_MS + (None,), r['buckets']):
+        summe += anzahl
+        if summe >= ziel: return grenze if grenze is not None else round(r['max_ms'], 1)
+    return None
+
+def zusammenfassung():
+    with _lock: routen = {name: dict(r, buckets=list(r['buckets'])) for name, r in _routen.items()}
+    zeilen = [{'route': name, 'anzahl': r['anzahl'], 'mittel_ms': round(r['summe_ms'] / r['anzahl'], 2), 'p50_ms': _perzentil(r, 50), 'p95_ms': _perzentil(r, 95),
+               'p99_ms': _perzentil(r, 99), 'max_ms': round(r['max_ms'], 2), 'sql_pro_anfrage': round(r['anweisungen'] / r['anzahl'], 1),
+               'sql_ms_pro_anfrage': round(r['sql_ms'] / r['anzahl'], 2)} for name, r in routen.items()]
+    return sorted(zeilen, key=lambda z: -z['mittel_ms'] * z['anzahl'])
+
+def langsame_abfragen(): return list(reversed(_langsam))
+
+def zuruecksetzen():
+    with _lock: _routen.clear(); _langsam.clear()
+
+def _label(name): return name.replace('\\', '\\\\').replace('"', '\\"')
+
+def prometheus(prefix='loot'):
+    # Text-Format für Prometheus; Dauer in Sekunden, Buckets kumulativ
+    with _lock: routen = {name: dict(r, buckets=list(r['buckets'])) for name, r in _routen.items()}
+    zeilen = [f'# HELP {prefix}_request_dauer_sekunden Dauer der Anfragen pro Route', f'# TYPE {prefix}_request_dauer_sekunden histogram']
+    for name, r in sorted(routen.items()):
+        label = _label(name); summe = 0
+        for grenze, anzahl in zip(BUCKETS_MS, r['buckets']):
+            summe += anzahl; zeilen.append(f'{prefix}_request_dauer_sekunden_bucket{{route="{label}",le="{grenze / 1000:g}"}} {summe}')
+        zeilen.append(f'{prefix}_request_dauer_sekunden_bucket{{route="{label}",le="+Inf"}} {r["anzahl"]}')
+        zeilen.append(f'{prefix}_request_dauer_sekunden_sum{{route="{label}"}} {r["summe_ms"] / 1000:.6f}')
+        zeilen.append(f'{prefix}_request_dauer_sekunden_count{{route="{label}"}} {r["anzahl"]}')
+    for metrik, feld, faktor, hilfe in (('sql_anweisungen_total', 'anweisungen', 1, 'SQL-Anweisungen pro Route'), ('sql_sekunden_total', 'sql_ms', 1000, 'SQL-Zeit pro Route')):
+        zeilen += [f'# HELP {prefix}_{metrik} {hilfe}', f'# TYPE {prefix}_{metrik} counter']
+        zeilen += [f'{prefix}_{metrik}{{route="{_label(name)}"}} {r[feld] / faktor:g}' for name, r in sorted(routen.items())]
+    zeilen += [f'# HELP {prefix}_langsame_abfragen Einträge im Slow-Query-Log (max. {LANGSAM_ANZAHL})', f'# TYPE {prefix}_langsame_abfragen gauge', f'{prefix}_langsame_abfragen {len(_langsam)}',
+               f'# TYPE {prefix}_prozess_start_sekunden gauge', f'{prefix}_prozess_start_sekunden {_gestartet:.0f}']
+    return '\n'.join(zeilen) + '\n'
+
+
+# --- Profiler ---
+class Profiler:
+    # Profiliert zur Laufzeit jede n-te Anfrage einer einzelnen Route mit cProfile, bis
+    # 'anfragen' Stichproben gesammelt sind. Immer nur eine Anfrage gleichzeitig (cProfile
+    # misst nur den Thread, der enable() aufruft).
+    def __init__(self):
+        self.route = None; self.jede = 1; self.anfragen = 0; self.gesammelt = 0
+        self._zaehler = 0; self._profil = None; self._belegt = threading.Lock(); self._lokal = threading.local()
+
+    def starten(self, route, jede=1, anfragen=20):
+        with _lock: self.route = route; self.jede = max(1, jede); self.anfragen = anfragen; self.gesammelt = 0; self._zaehler = 0; self._profil = cProfile.Profile()
+
+    def stoppen(self):
+        with _lock: self.route = None
+
+    def beginnen(self, route):
+        if self.route is None or route != self.route or self.gesammelt >= self.anfragen: return
+        with _lock: self._zaehler += 1; dran = self._zaehler % self.jede == 0
+        if dran and self._belegt.acquire(blocking=False):
+            self._lokal.aktiv = self._profil; self._profil.enable()
+
+    def beenden(self):
+        profil = getattr(self._lokal, 'aktiv', None)
+        if profil is None: return
+        profil.disable(); self._lokal.aktiv = None; self.gesammelt += 1; self._belegt.release()
+        if self.gesammelt >= self.anfragen: self.stoppen()
+
+    def bericht(self, zeilen=30):
+        if self._profil is None or not self.gesammelt: return ''
+        ausgabe = io.StringIO()
+        with self._belegt: pstats.Stats(self._profil, stream=ausgabe).sort_stats('cumulative').print_stats(zeilen)
+        return ausgabe.getvalue()
+
+profiler = Profiler()
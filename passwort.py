@@ -0,0 +1,82 @@
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import bcrypt
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# =============================================================
+# PASSWORT-HASHING (begrenzter Pool, Rehash beim Login)
+# =============================================================
+# Hashen und Prüfen laufen in einem kleinen Thread-Pool pro Prozess. bcrypt und hashlib geben
+# dabei den GIL frei; unter gunicorn -k gthread bedienen die übrigen Threads eines Workers
+# währenddessen normale Seiten. Ein Sync-Worker wartet weiter selbst auf das Ergebnis, aber
+# nie länger als WARTEN_SEKUNDEN auf einen Platz: ist der Pool voll oder hat eine IP bzw. ein
+# Benutzername schon zu viele Versuche in Arbeit, kommt sofort Ueberlastet (die Route antwortet 429).
+# ALGORITHMUS: 'bcrypt' oder eine werkzeug-Methode ('scrypt', 'pbkdf2:sha256:600000', ...).
+# Gespeicherte Hashes mit anderem Verfahren oder anderen Kosten werden beim nächsten Login ersetzt.
+ALGORITHMUS = os.environ.get('LOOT_PASSWORT_ALGORITHMUS', 'scrypt')
+BCRYPT_KOSTEN = int(os.environ.get('LOOT_BCRYPT_KOSTEN', 12))
+POOL_GROESSE = int(os.environ.get('LOOT_HASH_THREADS', 2))
+WARTESCHLANGE = 8  # Aufträge, die zusätzlich zu POOL_GROESSE warten dürfen
+WARTEN_SEKUNDEN = 2.0
+MAX_PRO_IP = 4
+MAX_PRO_NAME = 2
+
+
+class Ueberlastet(Exception):
+    pass
+
+
+_pool = None
+_pool_pid = None
+_plaetze = threading.BoundedSemaphore(POOL_GROESSE + WARTESCHLANGE)
+_in_arbeit = {}
+_lock = threading.Lock()
+
+def _ausfuehren(ip, name, funktion, *argumente):
+    global _pool, _pool_pid
+    grenzen = {'ip': MAX_PRO_IP, 'name': MAX_PRO_NAME}
+    schluessel = [(art, wert) for art, wert in (('ip', ip), ('name', name)) if wert is not None]
+    with _lock:
+        if any(_in_arbeit.get(s, 0) >= grenzen[s[0]] for s in schluessel): raise Ueberlastet()
+        for s in schluessel: _in_arbeit[s] = _in_arbeit.get(s, 0) + 1
+        if _pool is None or _pool_pid != os.getpid(): _pool = ThreadPoolExecutor(POOL_GROESSE, thread_name_prefix='passwort'); _pool_pid = os.getpid()
+    try:
+        if not _plaetze.acquire(timeout=WARTEN_SEKUNDEN): raise Ueberlastet()
+        try: return _pool.submit(funktion, *argumente).result()
+        finally: _plaetze.release()
+    finally:
+        with _lock:
+            for s in schluessel:
+                _in_arbeit[s] -= 1
+                if not _in_arbeit[s]: del _in_arbeit[s]
+
+def _hash_erzeugen(passwort):
+    if ALGORITHMUS == 'bcrypt': return bcrypt.hashpw(passwort.encode('utf-8'), bcrypt.gensalt(BCRYPT_KOSTEN)).decode('ascii')
+    return generate_password_hash(passwort, method=ALGORITHMUS)
+
+def _hash_pruefen(gespeichert, passwort):
+    if gespeichert.startswith(('$2a$', '$2b$', '$2y$')): return bcrypt.checkpw(passwort.encode('utf-8'), gespeichert.encode('ascii'))
+    return check_password_hash(gespeichert, passwort)
+
+@lru_cache(maxsize=None)
+def _werkzeug_kennung(methode):
+    # Vollständige Methodenangabe, wie werkzeug sie vor das erste '$' schreibt (z.B. 'scrypt:32768:8:1')
+    return generate_password_hash('', method=methode).split('$', 1)[0]
+
+def veraltet(gespeichert):
+    # True, wenn der Hash nicht mit dem eingestellten Verfahren und den eingestellten Kosten erzeugt wurde
+    if ALGORITHMUS == 'bcrypt': return not gespeichert.startswith(('$2a$', '$2b$', '$2y$')) or int(gespeichert[4:6]) != BCRYPT_KOSTEN
+    return gespeichert.split('$', 1)[0] != _werkzeug_kennung(ALGORITHMUS)
+
+def hashen(passwort, ip=None, name=None):
+    return _ausfuehren(ip, name, _hash_erzeugen, passwort)
+
+def _pruefen_und_erneuern(gespeichert, passwort):
+    if gespeichert is None: _hash_erzeugen(passwort); return False, None  # gleiche Laufzeit für unbekannte Benutzer
+    if not _hash_pruefen(gespeichert, passwort): return False, None
+    return True, (_hash_erzeugen(passwort) if veraltet(gespeichert) else None)
+
+def pruefen(gespeichert, passwort, ip=None, name=None):
+    # Liefert (korrekt, neuer_hash); neuer_hash ist gesetzt, wenn der gespeicherte Hash ersetzt werden soll
+    return _ausfuehren(ip, name, _pruefen_und_erneuern, gespeichert, passwort)
@@ -0,0 +1,95 @@
+import logging, queue, threading
+from db import verbinden, beim_schliessen, versionen_lesen, version_erhoehen, shard
+
+# =============================================================
+# STRUKTURIERTES LOG-BUCH
+# =============================================================
+# log_action() sammelt Einträge pro Anfrage; geschrieben werden sie mit einem executemany in
+# derselben Transaktion wie die eigentliche Änderung (db_commit). Optional übernimmt ein
+# Hintergrund-Thread das Schreiben gebündelt über eine eigene Verbindung.
+# Der Thread endet nach LEERLAUF_SEKUNDEN ohne neue Einträge und schließt dabei seine Verbindung.
+LOG_SPALTEN = ('aktion', 'details', 'benutzer', 'raid_id', 'item_id', 'charakter_id', 'punkte_alt', 'punkte_neu')
+_INSERT = f"INSERT INTO logs ({', '.join(LOG_SPALTEN)}) VALUES ({', '.join('?' for _ in LOG_SPALTEN)})"
+LEERLAUF_SEKUNDEN = 30
+log = logging.getLogger(__name__)
+
+def eintraege_schreiben(conn, eintraege):
+    if not eintraege: return
+    bekannt = _aktionen.get(shard(conn))
+    if bekannt is None or any(e['aktion'] not in bekannt[1] for e in eintraege):
+        # Erst gegen den Stand in der Datenbank prüfen; der Zähler steigt nur für eine wirklich neue Aktion
+        if not {e['aktion'] for e in eintraege} <= _aktionen_stand(conn): version_erhoehen(conn, 'log_aktionen')
+    conn.executemany(_INSERT, [tuple(e[s] for s in LOG_SPALTEN) for e in eintraege])
+
+
+# --- Aktionen für den Filter in /admin/logs ---
+# Pro Datenbank zwischengespeichert unter dem Zähler 'log_aktionen'. Den erhöhen eintraege_schreiben (nur für eine
+# Aktion, die es noch nicht gibt) und log_archiv (beim Verschieben können Aktionen verschwinden). Neu gelesen wird
+# mit einem Sprung über idx_logs_aktion_zeit, eine Indexsuche pro Aktion statt eines Durchlaufs über alle Logs.
+_AKTIONEN = ('WITH RECURSIVE a(aktion) AS (SELECT MIN(aktion) FROM logs UNION ALL SELECT (SELECT MIN(aktion) FROM logs WHERE aktion > a.aktion) FROM a WHERE a.aktion IS NOT NULL) '
+             'SELECT aktion FROM a WHERE aktion IS NOT NULL')
+_aktionen = {}  # pro Datenbank (Gilde): (version, frozenset)
+_aktionen_lock = threading.Lock()
+
+def _aktionen_stand(conn):
+    # Zähler vor den Zeilen lesen: ist der Cache danach zu groß, dann nur um eine gerade committete Aktion
+    version = versionen_lesen(conn, 'log_aktionen'); aktuell = _aktionen.get(shard(conn))
+    if aktuell is not None and version is not None and aktuell[0] == version: return aktuell[1]
+    neu = frozenset(row[0] for row in conn.execute(_AKTIONEN))
+    if version is not None:
+        with _aktionen_lock: _aktionen[shard(conn)] = (version, neu)
+    return neu
+
+def aktionen(conn): return sorted(_aktionen_stand(conn))
+
+
+class HintergrundSchreiber:
+    # Für hohe Schreiblast: Einträge landen erst nach dem Commit der Anfrage in der Queue und werden
+    # vom Thread in Blöcken geschrieben. Der Audit-Eintrag ist dann nicht mehr atomar mit der Änderung.
+    def __init__(self, pfad, block_groesse=200):
+        self.pfad = pfad; self.block_groesse = block_groesse
+        self._queue = queue.Queue(); self._thread = None; self._lock = threading.Lock()
+
+    def einreihen(self, eintraege):
+        # Unter dem Lock, damit der Thread nicht gerade wegen einer leeren Queue endet, während Einträge dazukommen
+        with self._lock:
+            for eintrag in eintraege: self._queue.put(eintrag)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._schleife, name='log-schreiber', daemon=True); self._thread.start()
+
+    def _schleife(self):
+        conn = verbinden(self.pfad)
+        try:
+            while True:
+                try: block = [self._queue.get(timeout=LEERLAUF_SEKUNDEN)]
+                except queue.Empty:
+                    with self._lock:
+                        if self._queue.empty(): self._thread = None; return
+                    continue
+                while len(block) < self.block_groesse:
+                    try: block.append(self._queue.get_nowait())
+                    except queue.Empty: break
+                try:
+                    with conn: eintraege_schreiben(conn, block)
+                except Exception: log.exception('Log-Schreiber: %d Einträge verworfen', len(block))
+                finally:
+                    for _ in block: self._queue.task_done()
+        finally: conn.close()
+
+    def warten(self):
+        self._queue.join()
+
+
+_schreiber = {}
+_schreiber_lock = threading.Lock()
+
+def schreiber(pfad):
+    with _schreiber_lock:
+        if pfad not in _schreiber: _schreiber[pfad] = HintergrundSchreiber(pfad)
+        return _schreiber[pfad]
+
+@beim_schliessen
+def _pool_geschlossen(pfad):
+    # Noch eingereihte Einträge schreibt der alte Schreiber zu Ende, danach endet sein Thread im Leerlauf
+    with _schreiber_lock: _schreiber.pop(pfad, None)
+    with _aktionen_lock: _aktionen.pop(pfad, None)
@@ -0,0 +1,153 @@
+import argparse, sys
+from itertools import groupby
+
+# =============================================================
+# LOOT-PUNKTE ENGINE
+# =============================================================
+# Jede Reservierung eines gesperrten Raids bringt einen Punkt auf das reservierte Item.
+# Alle Deltas eines Raids (oder einer einzelnen Anmeldung) werden in einem Aggregat über
+# reservierungen x anmeldungen berechnet und mit einem einzigen Statement angewendet,
+# unabhängig von der Anzahl der Teilnehmer. Commit übernimmt der Aufrufer.
+#
+# Jede Änderung landet zuerst als Buchung im append-only Journal punkte_buchungen und wird
+# dann auf loot_punkte angewendet; loot_punkte ist damit ein abgeleiteter Cache, der sich
+# jederzeit aus dem Journal neu aufbauen lässt. Alle Schreibzugriffe auf Punkte laufen über
+# dieses Modul. Arten einer Buchung:
+#   raid       Gutschrift beim Sperren eines Raids (wert = Anzahl Punkte)
+#   entzug     Rücknahme; wie bisher nur, wenn genug Punkte vorhanden sind (wert = Anzahl Punkte)
+#   vergabe    Item vergeben, Punkte auf wert (0) gesetzt
+#   manuell    Punkte von einem Admin auf wert gesetzt
+#   uebernahme Stand aus der Zeit vor dem Journal
+# Snapshots (punkte_snapshots/_werte) halten den abgespielten Stand bis zu einer Buchung fest;
+# Abspielen beginnt immer beim nächstgelegenen Snapshot. Einträge mit 0 Punkten und fehlende
+# Einträge gelten als gleich.
+GUTSCHRIFT, ENTZUG, VERGABE, MANUELL, UEBERNAHME = 'raid', 'entzug', 'vergabe', 'manuell', 'uebernahme'
+SNAPSHOT_ABSTAND = 10000  # neue Buchungen, nach denen punkte_vergeben einen Snapshot anlegt
+
+def _deltas(filter_sql):
+    return f'SELECT a.raid_id, a.spieler_id, r.item_id, COUNT(*) AS anzahl FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id WHERE {filter_sql} GROUP BY a.raid_id, a.spieler_id, r.item_id'
+
+def _filter(raid_id, anmeldung_id):
+    return ('a.id = ?', (anmeldung_id,)) if anmeldung_id is not None else ('a.raid_id = ?', (raid_id,))
+
+def _letzte_buchung(conn):
+    return conn.execute('SELECT IFNULL(MAX(id), 0) FROM punkte_buchungen').fetchone()[0]
+
+def _buchen(conn, art, filter_sql, params):
+    # Schreibt die Deltas als Buchungen und liefert die id davor; die neuen Buchungen sind dann alle mit id > davor
+    davor = _letzte_buchung(conn)
+    conn.execute(f'INSERT INTO punkte_buchungen (raid_id, spieler_id, item_id, art, wert) SELECT raid_id, spieler_id, item_id, ?, anzahl FROM ({_deltas(filter_sql)}) ORDER BY spieler_id, item_id', (art,) + params)
+    return davor
+
+def punkte_vergeben(conn, raid_id):
+    # Schreibt alle Punkte eines Raids per Bulk-UPSERT gut und liefert die Summe der vergebenen Punkte
+    davor = _buchen(conn, GUTSCHRIFT, *_filter(raid_id, None))
+    conn.execute('INSERT INTO loot_punkte (spieler_id, item_id, punkte) SELECT spieler_id, item_id, wert FROM punkte_buchungen WHERE id > ? ON CONFLICT (spieler_id, item_id) DO UPDATE SET punkte = punkte + excluded.punkte', (davor,))
+    gesamt = conn.execute('SELECT IFNULL(SUM(wert), 0) FROM punkte_buchungen WHERE id > ?', (davor,)).fetchone()[0]
+    if _letzte_buchung(conn) - _letzter_snapshot(conn) >= SNAPSHOT_ABSTAND: snapshot_erstellen(conn)
+    return gesamt
+
+def punkte_entziehen(conn, raid_id=None, anmeldung_id=None):
+    # Gegenstück zu punkte_vergeben für einen ganzen Raid oder eine einzelne Anmeldung.
+    # Wie bisher wird nur abgezogen, wenn genug Punkte vorhanden sind; die Buchung entsteht immer.
+    davor = _buchen(conn, ENTZUG, *_filter(raid_id, anmeldung_id))
+    conn.execute('UPDATE loot_punkte SET punkte = punkte - b.wert FROM (SELECT spieler_id, item_id, wert FROM punkte_buchungen WHERE id > ?) AS b WHERE loot_punkte.spieler_id = b.spieler_id AND loot_punkte.item_id = b.item_id AND loot_punkte.punkte >= b.wert', (davor,))
+
+def punkte_setzen(conn, spieler_id, item_id, punkte, art=MANUELL, raid_id=None):
+    # Setzt einen einzelnen Eintrag auf einen festen Wert (Vergabe: 0, Admin-Korrektur: beliebig). Die Buchung wird
+    # immer geschrieben; eine neue loot_punkte-Zeile nur für Punkte > 0, eine Vergabe ohne Reservierung legt keine Nullzeile an
+    conn.execute('INSERT INTO punkte_buchungen (raid_id, spieler_id, item_id, art, wert) VALUES (?, ?, ?, ?, ?)', (raid_id, spieler_id, item_id, art, punkte))
+    if punkte > 0: conn.execute('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (?, ?, ?) ON CONFLICT (spieler_id, item_id) DO UPDATE SET punkte = excluded.punkte', (spieler_id, item_id, punkte))
+    else: conn.execute('UPDATE loot_punkte SET punkte = ? WHERE spieler_id = ? AND item_id = ?', (punkte, spieler_id, item_id))
+
+
+# --- Abspielen, Snapshots, Prüfung ---
+def _anwenden(punkte, art, wert):
+    if art == GUTSCHRIFT: return punkte + wert
+    if art == ENTZUG: return punkte - wert if punkte >= wert else punkte
+    return wert
+
+def _letzter_snapshot(conn):
+    return conn.execute('SELECT IFNULL(MAX(buchung_id), 0) FROM punkte_snapshots').fetchone()[0]
+
+def _abspielen(conn, bis=None, mit_cache=False):
+    # Ein sortierter Durchlauf über Snapshot-Werte, Buchungen danach und (optional) loot_punkte.
+    # Liefert (spieler_id, item_id, punkte laut Journal, punkte in loot_punkte oder None)
+    if bis is None: bis = _letzte_buchung(conn)
+    snapshot = conn.execute('SELECT id, buchung_id FROM punkte_snapshots WHERE buchung_id <= ? ORDER BY buchung_id DESC LIMIT 1', (bis,)).fetchone()
+    teile = ['SELECT spieler_id, item_id, 1 AS quelle, id, art, wert FROM punkte_buchungen WHERE id > ? AND id <= ?']; params = [snapshot[1] if snapshot else 0, bis]
+    if snapshot: teile.append('SELECT spieler_id, item_id, 0, 0, NULL, punkte FROM punkte_snapshot_werte WHERE snapshot_id = ?'); params.append(snapshot[0])
+    if mit_cache: teile.append('SELECT spieler_id, item_id, 2, 0, NULL, punkte FROM loot_punkte')
+    zeilen = conn.execute(' UNION ALL '.join(teile) + ' ORDER BY 1, 2, 3, 4', params)
+    for (spieler_id, item_id), gruppe in groupby(zeilen, key=lambda z: (z[0], z[1])):
+        punkte = 0; cache = None
+        for _, _, quelle, _, art, wert in gruppe:
+            if quelle == 2: cache = wert
+            else: punkte = _anwenden(punkte, art, wert) if quelle == 1 else wert
+        yield spieler_id, item_id, punkte, cache
+
+def stand_bis(conn, buchung_id=None):
+    # Punktestand nach der Buchung buchung_id (None = aktuell) als {(spieler_id, item_id): punkte}, ohne Nullen
+    return {(s, i): p for s, i, p, _ in _abspielen(conn, buchung_id) if p}
+
+def stand_nach_raid(conn, raid_id):
+    # Punktestand direkt nach der letzten Buchung dieses Raids; None, wenn der Raid nie gebucht hat
+    bis = conn.execute('SELECT MAX(id) FROM punkte_buchungen WHERE raid_id = ?', (raid_id,)).fetchone()[0]
+    return stand_bis(conn, bis) if bis is not None else None
+
+def snapshot_erstellen(conn):
+    bis = _letzte_buchung(conn); werte = list(stand_bis(conn, bis).items())
+    snapshot_id = conn.execute('INSERT INTO punkte_snapshots (buchung_id) VALUES (?)', (bis,)).lastrowid
+    conn.executemany('INSERT INTO punkte_snapshot_werte (snapshot_id, spieler_id, item_id, punkte) VALUES (?, ?, ?, ?)', [(snapshot_id, s, i, p) for (s, i), p in werte])
+    return snapshot_id
+
+def abweichungen(conn):
+    # Vergleicht loot_punkte in einem Durchlauf mit dem Journal; liefert (spieler_id, item_id, cache, journal)
+    for spieler_id, item_id, punkte, cache in _abspielen(conn, mit_cache=True):
+        if (cache or 0) != punkte: yield spieler_id, item_id, cache or 0, punkte
+
+def neu_aufbauen(conn):
+    # Korrigiert alle abweichenden loot_punkte-Einträge auf den Stand des Journals; liefert deren Anzahl.
+    # Danach muss der Aufrufer version_erhoehen(conn, 'loot_punkte') und committen.
+    korrekturen = [(s, i, journal) for s, i, _, journal in abweichungen(conn)]
+    conn.executemany('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (?, ?, ?) ON CONFLICT (spieler_id, item_id) DO UPDATE SET punkte = excluded.punkte', korrekturen)
+    return len(korrekturen)
+
+
+def _kommando(conn, args):
+    # Ein Befehl der Kommandozeile auf einer Datenbank; liefert den Exit-Code
+    if args.befehl == 'pruefen':
+        conn.execute('BEGIN'); anzahl = 0  # eine Lesetransaktion: Cache und Journal vom selben Stand
+        for spieler_id, item_id, cache, journal in abweichungen(conn):
+            anzahl += 1; print(f"Spieler {spieler_id}, Item {item_id}: loot_punkte {cache}, Journal {journal}")
+        conn.rollback(); print(f"{anzahl} Abweichungen zwischen loot_punkte und Journal.")
+        return 1 if anzahl else 0
+    if args.befehl == 'aufbauen':
+        from db import version_erhoehen
+        conn.execute('BEGIN IMMEDIATE'); anzahl = neu_aufbauen(conn)
+        if anzahl: version_erhoehen(conn, 'loot_punkte')
+        conn.commit(); print(f"{anzahl} Einträge in loot_punkte korrigiert.")
+    elif args.befehl == 'snapshot':
+        conn.execute('BEGIN IMMEDIATE'); snapshot_id = snapshot_erstellen(conn); conn.commit(); print(f"Snapshot {snapshot_id} angelegt.")
+    else:
+        werte = stand_nach_raid(conn, args.raid) if args.raid is not None else stand_bis(conn)
+        if werte is None: print(f"Raid {args.raid} hat keine Punkte gebucht."); return 1
+        for (spieler_id, item_id), punkte in sorted(werte.items()): print(f"{spieler_id}\t{item_id}\t{punkte}")
+    return 0
+
+
+if __name__ == '__main__':
+    from db import verbinden
+    from database_setup import migrieren
+    import gilden
+    parser = argparse.ArgumentParser(description='Punkte-Journal prüfen, loot_punkte neu aufbauen, Snapshots anlegen.')
+    parser.add_argument('befehl', choices=['pruefen', 'aufbauen', 'snapshot', 'stand'])
+    parser.add_argument('--raid', type=int, help='bei stand: Punktestand direkt nach diesem Raid')
+    gilden.optionen(parser); args = parser.parse_args()
+    pfade = gilden.datenbanken(args); exit_code = 0
+    for pfad in pfade:
+        if len(pfade) > 1: print(f"== {pfad}")
+        migrieren(pfad); conn = verbinden(pfad)
+        try: exit_code = max(exit_code, _kommando(conn, args))
+        finally: conn.close()
+    sys.exit(exit_code)
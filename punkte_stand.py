@@ -0,0 +1,102 @@
+import bisect, json, threading, time
+from db import versionen_lesen, shard
+
+# =============================================================
+# PUNKTESTAND (In-Process-Snapshot für /punkte)
+# =============================================================
+# Alle loot_punkte-Einträge mit Punkten > 0 samt Item- und Charakternamen, pro Sortierung
+# einmal vorsortiert. Gültig, solange die Versionszähler 'loot_punkte' und 'items' unverändert
+# sind; item_vergeben und punkte_anpassen pflegen ihn nach dem Commit inkrementell (punkte_setzen), alle anderen
+# Schreibpfade erhöhen nur den Zähler und der Snapshot wird beim nächsten Zugriff neu geladen.
+SORTIERUNGEN = ('item_name', 'charakter_name', 'punkte')
+
+def _schluessel(eintrag, sortierung):
+    # Eindeutig über (spieler_id, item_id), damit die Keyset-Pagination stabil ist
+    return (eintrag[sortierung], eintrag['item_name'], eintrag['charakter_name'], eintrag['spieler_id'], eintrag['item_id'])
+
+def cursor_lesen(text, sortierung):
+    # Cursor aus ?nach= (JSON-Liste wie _schluessel); None = erste Seite, wenn Form oder Typen nicht zur Sortierung passen
+    try: werte = json.loads(text)
+    except ValueError: return None
+    typen = (int if sortierung == 'punkte' else str, str, str, int, int)
+    if not isinstance(werte, list) or len(werte) != len(typen) or any(type(w) is not t for w, t in zip(werte, typen)): return None
+    return tuple(werte)
+
+
+class Punktestand:
+    def __init__(self, eintraege, version):
+        self.version = version; self.geaendert = time.time()
+        self.eintraege = {(e['spieler_id'], e['item_id']): e for e in eintraege}
+        self._sortiert = {}
+
+    def _liste(self, sortierung):
+        # (schluessel, eintraege) aufsteigend; absteigende Seiten laufen rückwärts über dieselbe Liste
+        if sortierung not in self._sortiert:
+            eintraege = sorted(self.eintraege.values(), key=lambda e: _schluessel(e, sortierung))
+            self._sortiert[sortierung] = ([_schluessel(e, sortierung) for e in eintraege], eintraege)
+        return self._sortiert[sortierung]
+
+    def seite(self, sortierung='item_name', absteigend=False, nach=None, item_id=None, klasse=None, anzahl=100):
+        # Liefert (eintraege, schluessel des letzten Eintrags oder None, wenn es keine weitere Seite gibt)
+        schluessel, eintraege = self._liste(sortierung)
+        if absteigend:
+            start = len(eintraege) - 1 if nach is None else bisect.bisect_left(schluessel, nach) - 1
+            positionen = range(start, -1, -1)
+        else: positionen = range(0 if nach is None else bisect.bisect_right(schluessel, nach), len(eintraege))
+        ergebnis = []
+        for pos in positionen:
+            e = eintraege[pos]
+            if (item_id is None or e['item_id'] == item_id) and (klasse is None or e['klasse'] == klasse):
+                if len(ergebnis) == anzahl: return ergebnis, list(_schluessel(ergebnis[-1], sortierung))
+                ergebnis.append(e)
+        return ergebnis, None
+
+    def mit_version(self, version):
+        kopie = Punktestand.__new__(Punktestand); kopie.__dict__.update(self.__dict__, version=version, geaendert=time.time())
+        return kopie
+
+    def geaendert_mit(self, alt, neu, version):
+        # Kopie mit einem ersetzten Eintrag; die vorsortierten Listen werden per bisect angepasst statt neu sortiert
+        kopie = self.mit_version(version); kopie.eintraege = dict(self.eintraege); kopie._sortiert = {}
+        kopie.eintraege.pop((alt['spieler_id'], alt['item_id']), None)
+        if neu: kopie.eintraege[(neu['spieler_id'], neu['item_id'])] = neu
+        for sortierung, (schluessel, eintraege) in self._sortiert.items():
+            schluessel = list(schluessel); eintraege = list(eintraege)
+            if (alt['spieler_id'], alt['item_id']) in self.eintraege:
+                pos = bisect.bisect_left(schluessel, _schluessel(alt, sortierung)); del schluessel[pos]; del eintraege[pos]
+            if neu:
+                pos = bisect.bisect_left(schluessel, _schluessel(neu, sortierung)); schluessel.insert(pos, _schluessel(neu, sortierung)); eintraege.insert(pos, neu)
+            kopie._sortiert[sortierung] = (schluessel, eintraege)
+        return kopie
+
+
+_staende = {}  # pro Datenbank (Gilde)
+_lock = threading.Lock()
+
+def version(conn):
+    # Für ETags: liest nur die beiden Zählerzeilen, nicht den Punktestand selbst
+    return versionen_lesen(conn, 'loot_punkte', 'items')
+
+def stand(conn):
+    stempel = version(conn); aktuell = _staende.get(shard(conn))
+    if aktuell is not None and stempel is not None and aktuell.version == stempel: return aktuell
+    rows = conn.execute('SELECT lp.spieler_id, lp.item_id, i.item_name, c.charakter_name, c.klasse, lp.punkte FROM loot_punkte lp JOIN charaktere c ON lp.spieler_id = c.id JOIN items i ON lp.item_id = i.id WHERE lp.punkte > 0')
+    neu = Punktestand([dict(row) for row in rows], stempel)
+    with _lock: _staende[shard(conn)] = neu
+    return neu
+
+def punkte_setzen(conn, spieler_id, item_id, punkte):
+    # Erst nach dem Commit der Änderung (samt version_erhoehen(conn, 'loot_punkte')) aufrufen, damit ein Rollback
+    # nie im Snapshot landet. Passt nur, wenn der Snapshot genau den Stand vor dieser Änderung kennt und seitdem
+    # niemand sonst committet hat, sonst wird er verworfen.
+    neu = version(conn); schluessel = shard(conn)
+    with _lock:
+        aktuell = _staende.get(schluessel)
+        if aktuell is None: return
+        if neu is None or aktuell.version != (neu[0] - 1, neu[1]): _staende.pop(schluessel, None); return
+        alt = aktuell.eintraege.get((spieler_id, item_id))
+        if alt is None and punkte > 0:
+            row = conn.execute('SELECT c.charakter_name, c.klasse, i.item_name FROM charaktere c, items i WHERE c.id = ? AND i.id = ?', (spieler_id, item_id)).fetchone()
+            if row is None: _staende.pop(schluessel, None); return
+            alt = {'spieler_id': spieler_id, 'item_id': item_id, 'item_name': row['item_name'], 'charakter_name': row['charakter_name'], 'klasse': row['klasse'], 'punkte': 0}
+        _staende[schluessel] = aktuell.geaendert_mit(alt, dict(alt, punkte=punkte) if punkte > 0 else None, neu) if alt else aktuell.mit_version(neu)
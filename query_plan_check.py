@@ -0,0 +1,77 @@
+import ast, os, re, sqlite3, sys, tempfile
+from database_setup import migrieren
+
+# =============================================================
+# EXPLAIN QUERY PLAN CHECK
+# =============================================================
+# Sucht alle SQL-Strings in den App-Modulen, lässt sie gegen eine frisch migrierte Datenbank
+# mit EXPLAIN QUERY PLAN laufen und schlägt fehl (Exit-Code 1), sobald eine Abfrage eine große
+# Tabelle komplett durchläuft, ohne Index oder über einen ganzen Covering-Index (z.B. SELECT DISTINCT
+# über alle Logs). Aufruf: python query_plan_check.py
+MODULE = ['app.py', 'punkte.py', 'raid_index.py', 'db.py', 'log_archiv.py', 'item_katalog.py', 'punkte_stand.py', 'raid_events.py', 'analyse.py', 'sicherung.py', 'protokoll.py']
+GROSSE_TABELLEN = {'anmeldungen', 'reservierungen', 'loot_punkte', 'logs', 'wishlist', 'punkte_buchungen'}
+# Bewusste Vollscans: (Tabelle, Anfang der Abfrage) -> Begründung
+ERLAUBTE_SCANS = {
+    ('loot_punkte', 'SELECT lp.spieler_id, lp.item_id, i.item_name, c.charakter_name, c.klasse, lp.punkte FROM loot_punkte lp'): 'Punktestand-Snapshot lädt alle Einträge mit Punkten',
+    ('loot_punkte', 'SELECT spieler_id, item_id, 2, 0, NULL, punkte FROM loot_punkte'): 'punkte.py pruefen vergleicht den ganzen Cache mit dem Journal',
+    ('reservierungen', 'SELECT a.raid_id, a.spieler_id, r.item_id FROM reservierungen r'): 'Saison-Analyse lädt alle Reservierungen einmal als Spalten',
+    ('punkte_buchungen', 'SELECT raid_id, spieler_id, item_id FROM punkte_buchungen'): 'Saison-Analyse lädt alle Vergaben aus dem Journal',
+    ('loot_punkte', 'SELECT spieler_id, item_id, punkte FROM loot_punkte'): 'Saison-Analyse lädt den ganzen Punktestand',
+}
+# Ersatzwerte für Platzhalter in f-Strings, damit sich die Abfragen erklären lassen
+F_STRING_WERTE = {'sort_by': 'item_name', 'order': 'ASC', 'filter_sql': 'a.raid_id = ?', 'charakter_filter': 'w.charakter_id = ?',
+                  'where': 'WHERE aktion = ? AND (zeitstempel, id) < (?, ?)', "', '.join(LOG_SPALTEN)": 'aktion, details',
+                  "', '.join('?' for _ in LOG_SPALTEN)": '?, ?'}
+SQL_ANFANG = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+ALIAS = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|SET\b|GROUP\b|ORDER\b|LIMIT\b)(\w+))?', re.IGNORECASE)
+
+def _f_string(knoten, quelle):
+    teile = []
+    for teil in knoten.values:
+        if isinstance(teil, ast.Constant): teile.append(str(teil.value))
+        else:
+            ausdruck = ast.get_source_segment(quelle, teil.value) or ''
+            if ausdruck in F_STRING_WERTE: teile.append(F_STRING_WERTE[ausdruck])
+            elif ausdruck.startswith('_deltas('):
+                from punkte import _deltas; teile.append(_deltas('a.raid_id = ?'))
+            else: teile.append('?')
+    return ''.join(teile)
+
+def abfragen_sammeln(pfad):
+    quelle = open(pfad, encoding='utf-8').read(); baum = ast.parse(quelle)
+    f_string_teile = {id(teil) for k in ast.walk(baum) if isinstance(k, ast.JoinedStr) for teil in k.values}
+    for knoten in ast.walk(baum):
+        if id(knoten) in f_string_teile: continue
+        if isinstance(knoten, ast.Constant) and isinstance(knoten.value, str): sql = knoten.value
+        elif isinstance(knoten, ast.JoinedStr): sql = _f_string(knoten, quelle)
+        else: continue
+        if SQL_ANFANG.match(sql): yield knoten.lineno, ' '.join(sql.split())
+
+def vollscans(conn, sql):
+    aliase = {(m.group(2) or m.group(1)).lower(): m.group(1).lower() for m in ALIAS.finditer(sql)}
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?')).fetchall()
+    for zeile in plan:
+        treffer = re.match(r'SCAN (\w+)(.*)', zeile[3])
+        if not treffer or ('USING' in treffer.group(2) and 'COVERING INDEX' not in treffer.group(2)): continue
+        tabelle = aliase.get(treffer.group(1).lower(), treffer.group(1).lower())
+        if tabelle in GROSSE_TABELLEN: yield tabelle
+
+def pruefen(basis=os.path.dirname(os.path.abspath(__file__))):
+    fehler = 0; geprueft = 0
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        pfad = os.path.join(verzeichnis, 'plan.db'); migrieren(pfad)
+        conn = sqlite3.connect(pfad)
+        for modul in MODULE:
+            for zeile, sql in abfragen_sammeln(os.path.join(basis, modul)):
+                try: tabellen = list(vollscans(conn, sql))
+                except sqlite3.Error as e: print(f"{modul}:{zeile}: übersprungen ({e})"); continue
+                geprueft += 1
+                for tabelle in tabellen:
+                    if any(tabelle == t and sql.startswith(anfang) for t, anfang in ERLAUBTE_SCANS): continue
+                    fehler += 1; print(f"{modul}:{zeile}: Vollscan auf '{tabelle}': {sql[:160]}")
+        conn.close()
+    print(f"{geprueft} Abfragen geprüft, {fehler} Vollscans auf großen Tabellen.")
+    return fehler == 0
+
+if __name__ == '__main__':
+    sys.exit(0 if pruefen() else 1)
@@ -0,0 +1,140 @@
+import json, logging, os, threading, time
+from collections import deque
+from db import verbinden, beim_schliessen
+
+# =============================================================
+# RAID-EREIGNISSE (Live-Feed per Server-Sent Events)
+# =============================================================
+# Schreibende Routen legen kompakte Ereignisse in raid_events ab, in derselben Transaktion wie
+# die Änderung. Pro Prozess und Datenbank liest ein Verteiler-Thread neue Zeilen über die id nach
+# (alle POLL_SEKUNDEN, sofort nach wecken() im eigenen Prozess) und verteilt sie über eine
+# Condition an die offenen Streams. So kommen auch Ereignisse anderer gunicorn-Worker an. Der Thread und
+# seine Verbindung leben nur, solange Streams offen sind, und enden spätestens, wenn db.pool_fuer den Pool schließt.
+# Jeder offene Stream belegt einen Worker-Thread (gunicorn.conf.py startet gthread-Worker), deshalb
+# höchstens MAX_STREAMS pro Prozess, die Hälfte der Threads. Darüber antwortet die Route mit 204; der Browser
+# verbindet sich dann nicht neu und static/js/ereignisse.js fragt stattdessen regelmäßig seit() ab.
+POLL_SEKUNDEN = 1.0
+MAX_STREAMS = int(os.environ.get('LOOT_MAX_STREAMS', int(os.environ.get('LOOT_THREADS', 16)) // 2))
+HERZSCHLAG_SEKUNDEN = 15
+STREAM_SEKUNDEN = 300  # danach verbindet sich der Browser mit Last-Event-ID neu
+PUFFER = 1000
+AUFBEWAHRUNG = '-1 day'
+log = logging.getLogger(__name__)
+_streams = threading.BoundedSemaphore(MAX_STREAMS) if MAX_STREAMS else threading.Semaphore(0)
+
+def stream_platz():
+    # Reserviert einen Stream-Platz ohne zu warten; freigeben mit stream_freigeben, wenn die Antwort geschlossen wird
+    return _streams.acquire(blocking=False)
+
+def stream_freigeben(): _streams.release()
+
+def ereignis_schreiben(conn, raid_id, typ, **daten):
+    conn.execute('INSERT INTO raid_events (raid_id, typ, daten) VALUES (?, ?, ?)', (raid_id, typ, json.dumps(daten, ensure_ascii=False)))
+
+def _daten(ereignis): return dict(json.loads(ereignis['daten']), raid_id=ereignis['raid_id'])
+
+def _format(ereignis):
+    return f"id: {ereignis['id']}\nevent: {ereignis['typ']}\ndata: {json.dumps(_daten(ereignis), ensure_ascii=False)}\n\n"
+
+def seit(conn, letzte_id, raid_id=None):
+    # Für Clients ohne Stream: Ereignisse nach letzte_id (None = keine, nur der aktuelle Stand); liefert (ereignisse, letzte_id)
+    if letzte_id is None: return [], conn.execute('SELECT IFNULL(MAX(id), 0) FROM raid_events').fetchone()[0]
+    sql = 'SELECT id, raid_id, typ, daten FROM raid_events WHERE id > ?' + (' AND raid_id = ?' if raid_id is not None else '') + ' ORDER BY id LIMIT ?'
+    rows = conn.execute(sql, (letzte_id,) + ((raid_id,) if raid_id is not None else ()) + (PUFFER,)).fetchall()
+    return [{'id': row['id'], 'typ': row['typ'], 'daten': _daten(row)} for row in rows], rows[-1]['id'] if rows else letzte_id
+
+
+class Verteiler:
+    def __init__(self, pfad):
+        self.pfad = pfad; self.letzte_id = None
+        self._puffer = deque(maxlen=PUFFER); self._bedingung = threading.Condition()
+        self._wecken = threading.Event(); self._lock = threading.Lock(); self._thread = None
+        self._abonnenten = 0; self._gestoppt = False
+
+    def _anmelden(self):
+        # Zählt einen Stream und startet den Thread, falls er nicht läuft
+        with self._lock:
+            if self._thread is None:
+                conn = verbinden(self.pfad)
+                with self._bedingung:
+                    # Der Puffer eines früheren Threads hätte eine Lücke bis zum neuen Startpunkt
+                    self.letzte_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM raid_events').fetchone()[0]; self._puffer.clear()
+                self._thread = threading.Thread(target=self._schleife, args=(conn,), name='raid-events', daemon=True); self._thread.start()
+            self._abonnenten += 1
+
+    def _abmelden(self):
+        with self._lock: self._abonnenten -= 1
+
+    def stoppen(self):
+        # Pool geschlossen: der Thread endet, offene Streams auch (der Browser verbindet sich mit Last-Event-ID neu)
+        self._gestoppt = True; self._wecken.set()
+        with self._bedingung: self._bedingung.notify_all()
+
+    def wecken(self):
+        # Nach dem Commit einer Anfrage, die Ereignisse geschrieben hat
+        self._wecken.set()
+
+    def _schleife(self, conn):
+        aufgeraeumt = 0
+        try:
+            while True:
+                self._wecken.wait(POLL_SEKUNDEN); self._wecken.clear()
+                with self._lock:
+                    if self._gestoppt or not self._abonnenten: self._thread = None; return
+                try:
+                    rows = conn.execute('SELECT id, raid_id, typ, daten FROM raid_events WHERE id > ? ORDER BY id LIMIT 500', (self.letzte_id,)).fetchall()
+                    if rows:
+                        with self._bedingung:
+                            self._puffer.extend(dict(row) for row in rows); self.letzte_id = rows[-1]['id']; self._bedingung.notify_all()
+                        if len(rows) == 500: self._wecken.set()
+                    if time.monotonic() - aufgeraeumt > 600:
+                        with conn: conn.execute("DELETE FROM raid_events WHERE zeit < datetime('now', ?)", (AUFBEWAHRUNG,))
+                        aufgeraeumt = time.monotonic()
+                except Exception: log.exception('Raid-Ereignisse: Nachlesen fehlgeschlagen'); time.sleep(POLL_SEKUNDEN)
+        finally: conn.close()
+
+    def abonnieren(self, raid_id=None, letzte_event_id=None):
+        # Generator mit fertig formatierten SSE-Nachrichten; raid_id None = alle Raids
+        self._anmelden()
+        try: yield from self._nachrichten(raid_id, letzte_event_id)
+        finally: self._abmelden()
+
+    def _nachrichten(self, raid_id, letzte_event_id):
+        ende = time.monotonic() + STREAM_SEKUNDEN
+        with self._bedingung: letzte = self.letzte_id
+        yield 'retry: 3000\n\n'
+        # Wiederverbindung: Verpasstes direkt aus der Tabelle nachliefern
+        if letzte_event_id is not None and letzte_event_id < letzte: yield from self._nachlesen(raid_id, letzte_event_id, letzte)
+        while time.monotonic() < ende and not self._gestoppt:
+            with self._bedingung:
+                if self.letzte_id <= letzte: self._bedingung.wait(HERZSCHLAG_SEKUNDEN)
+                # Voller Puffer, dessen ältestes Ereignis schon hinter letzte liegt: dazwischen wurde etwas verdrängt
+                luecke = len(self._puffer) == PUFFER and self._puffer[0]['id'] - 1 > letzte; bis = self.letzte_id
+                neu = [] if luecke else [e for e in self._puffer if e['id'] > letzte]
+            if luecke: yield from self._nachlesen(raid_id, letzte, bis); letzte = bis; continue
+            if not neu: yield ': ping\n\n'; continue
+            letzte = neu[-1]['id']
+            for ereignis in neu:
+                if raid_id is None or ereignis['raid_id'] == raid_id: yield _format(ereignis)
+
+    def _nachlesen(self, raid_id, von, bis):
+        # Ereignisse mit von < id <= bis aus der Tabelle, für Wiederverbindungen und Streams, die der Puffer überholt hat
+        conn = verbinden(self.pfad)
+        try:
+            sql = 'SELECT id, raid_id, typ, daten FROM raid_events WHERE id > ? AND id <= ?' + (' AND raid_id = ?' if raid_id is not None else '') + ' ORDER BY id'
+            for row in conn.execute(sql, (von, bis) + ((raid_id,) if raid_id is not None else ())): yield _format(row)
+        finally: conn.close()
+
+
+_verteiler = {}
+_verteiler_lock = threading.Lock()
+
+def verteiler(pfad):
+    with _verteiler_lock:
+        if pfad not in _verteiler: _verteiler[pfad] = Verteiler(pfad)
+        return _verteiler[pfad]
+
+@beim_schliessen
+def _pool_geschlossen(pfad):
+    with _verteiler_lock: alt = _verteiler.pop(pfad, None)
+    if alt: alt.stoppen()
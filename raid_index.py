@@ -0,0 +1,65 @@
+import threading
+from db import versionen_lesen, shard
+
+# =============================================================
+# RAID-INDEX (Wer hat welches Item reserviert?)
+# =============================================================
+# Pro Raid: item_id -> Liste der reservierenden Charaktere mit aktuellen Loot-Punkten,
+# absteigend nach Punkten sortiert. Aufgebaut beim Sperren des Raids, danach inkrementell
+# gepflegt, immer erst nach dem Commit. Jeder Index merkt sich den Stand der Versionszähler
+# 'loot_punkte' und 'raid:<id>'; weicht der Stand in der Datenbank ab (anderer Worker), wird
+# er beim nächsten Zugriff neu aufgebaut. Schlüssel ist (Datenbank, raid_id), damit sich die
+# Gilden eines Prozesses nicht in die Quere kommen.
+_indizes = {}
+_lock = threading.Lock()
+
+def _stempel(conn, raid_id):
+    return versionen_lesen(conn, 'loot_punkte', f'raid:{raid_id}')
+
+def _sortieren(eintraege):
+    eintraege.sort(key=lambda e: (-e['punkte'], e['charakter_name']))
+
+def index_aufbauen(conn, raid_id):
+    # Stempel vor den Zeilen lesen: committet dazwischen ein anderer Schreiber, sind die Zeilen höchstens
+    # neuer als der Stempel und der Index wird beim nächsten Zugriff neu aufgebaut, nie umgekehrt
+    items = {}; stempel = _stempel(conn, raid_id)
+    rows = conn.execute('SELECT r.item_id, a.spieler_id, c.charakter_name, IFNULL(lp.punkte, 0) as punkte FROM reservierungen r JOIN anmeldungen a ON r.anmeldung_id = a.id JOIN charaktere c ON a.spieler_id = c.id LEFT JOIN loot_punkte lp ON lp.spieler_id = a.spieler_id AND lp.item_id = r.item_id WHERE a.raid_id = ? ORDER BY r.item_id, punkte DESC, c.charakter_name', (raid_id,))
+    for row in rows: items.setdefault(row['item_id'], []).append({'spieler_id': row['spieler_id'], 'charakter_name': row['charakter_name'], 'punkte': row['punkte']})
+    with _lock:
+        if stempel is None: _indizes.pop((shard(conn), raid_id), None)
+        else: _indizes[(shard(conn), raid_id)] = (stempel, items)
+    return items
+
+def reservierungen_fuer_item(conn, raid_id, item_id):
+    with _lock: eintrag = _indizes.get((shard(conn), raid_id))
+    if eintrag is None or eintrag[0] != _stempel(conn, raid_id): items = index_aufbauen(conn, raid_id)
+    else: items = eintrag[1]
+    return [dict(e) for e in items.get(item_id, [])]
+
+def _anpassen(conn, raid_id, punkte_erhoeht, raid_erhoeht, aenderung):
+    # Inkrementelle Änderung; erst nach dem Commit der Änderung (samt version_erhoehen) aufrufen, damit ein
+    # Rollback nie im Index landet. Passt nur, wenn der Index genau den Stand vor dieser Änderung kennt und
+    # seitdem niemand sonst committet hat, sonst wird er verworfen.
+    neu = _stempel(conn, raid_id); schluessel = (shard(conn), raid_id)
+    with _lock:
+        eintrag = _indizes.get(schluessel)
+        if eintrag is None: return
+        if neu is None or eintrag[0] != (neu[0] - punkte_erhoeht, neu[1] - raid_erhoeht): _indizes.pop(schluessel, None); return
+        aenderung(eintrag[1]); _indizes[schluessel] = (neu, eintrag[1])
+
+def punkte_setzen(conn, raid_id, spieler_id, item_id, punkte):
+    def aenderung(items):
+        for e in items.get(item_id, []):
+            if e['spieler_id'] == spieler_id: e['punkte'] = punkte
+        _sortieren(items.get(item_id, []))
+    _anpassen(conn, raid_id, 1, 0, aenderung)
+
+def spieler_entfernen(conn, raid_id, spieler_id, punkte_erhoeht=1):
+    def aenderung(items):
+        for item_id in list(items):
+            items[item_id] = [e for e in items[item_id] if e['spieler_id'] != spieler_id]
+            if not items[item_id]: del items[item_id]
+    _anpassen(conn, raid_id, punkte_erhoeht, 1, aenderung)
+
+def verwerfen(conn, raid_id):
+    with _lock: _indizes.pop((shard(conn), raid_id), None)
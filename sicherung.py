@@ -0,0 +1,220 @@
+import argparse, gzip, logging, os, queue, re, shutil, sqlite3, sys, tempfile, threading, time
+from datetime import datetime
+from db import verbinden, beim_schliessen
+
+# =============================================================
+# ONLINE-SICHERUNGEN (Backup-API, gzip, Aufbewahrung)
+# =============================================================
+# Eine Sicherung öffnet zuerst eine Lesetransaktion auf einer eigenen Verbindung; deren Stand ist der
+# Zeitpunkt der Sicherung (dauert etwa eine Millisekunde). Danach kopiert die Backup-API genau diesen
+# Stand in Schritten von SCHRITT_SEITEN Seiten, mit PAUSE_SEKUNDEN zwischen den Schritten, in eine
+# temporäre Datei, die anschließend mit gzip komprimiert wird. Im WAL-Modus hält die Lesetransaktion
+# keinen Schreiber auf, und weil sich ihr Stand nicht ändert, muss die Backup-API nie von vorn anfangen.
+# Automatische Sicherungen (vor dem Sperren eines Raids, nach dem Abschließen) laufen in einem
+# Hintergrund-Thread pro Datenbank, der endet, sobald nichts mehr wartet; die Anfrage hält nur den Zeitpunkt fest.
+# Kommandozeile: python sicherung.py erstellen|liste|pruefen|wiederherstellen|aufraeumen (--help)
+VERZEICHNIS = os.environ.get('LOOT_BACKUPS', 'backups')  # darunter ein Unterverzeichnis pro Datenbank
+AUTOMATISCH = os.environ.get('LOOT_BACKUPS_AUTOMATISCH', '1') == '1'
+SCHRITT_SEITEN = 256
+PAUSE_SEKUNDEN = 0.002
+GZIP_STUFE = 1  # Stufe 6 spart nur etwa 10 % mehr Platz, braucht aber die dreifache CPU-Zeit
+WARTESCHLANGE = 2  # festgehaltene Zeitpunkte, die auf den Thread warten dürfen; weitere werden übersprungen
+BEHALTEN_LETZTE = 10  # Aufbewahrung: die neuesten n Sicherungen,
+BEHALTEN_TAGE = 14  # dazu die jeweils letzte der letzten 14 Tage
+BEHALTEN_MONATE = 12  # und die jeweils letzte der letzten 12 Monate
+_DATEI = re.compile(r'^(\d{8}-\d{6}-\d{6})-([a-z0-9-]+)\.db\.gz$')
+log = logging.getLogger(__name__)
+
+
+def verzeichnis_fuer(pfad, basis=None):
+    return os.path.join(basis or VERZEICHNIS, os.path.splitext(os.path.basename(pfad))[0])
+
+def zeitpunkt_festhalten(pfad):
+    # Verbindung mit offener Lesetransaktion; alles, was sie liest (auch die Backup-API), ist dieser Stand
+    quelle = verbinden(pfad); quelle.execute('BEGIN'); quelle.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+    quelle.zeit = datetime.now(); return quelle
+
+def _anlass(text): return re.sub(r'[^a-z0-9-]+', '-', text.lower()).strip('-') or 'manuell'
+
+def erstellen(pfad, anlass='manuell', basis=None, quelle=None):
+    # Schreibt <zeit>-<anlass>.db.gz und räumt danach auf; liefert Datei, Größen und Dauer
+    start = time.perf_counter()
+    if quelle is None: quelle = zeitpunkt_festhalten(pfad)
+    zeit = quelle.zeit  # der Dateiname nennt den gesicherten Stand, nicht den Beginn des Kopierens
+    ziel_verzeichnis = verzeichnis_fuer(pfad, basis); os.makedirs(ziel_verzeichnis, exist_ok=True)
+    datei = os.path.join(ziel_verzeichnis, f"{zeit:%Y%m%d-%H%M%S-%f}-{_anlass(anlass)}.db.gz")
+    roh = datei + '.tmp'
+    try:
+        ziel = sqlite3.connect(roh)
+        try: quelle.backup(ziel, pages=SCHRITT_SEITEN, progress=lambda *_: time.sleep(PAUSE_SEKUNDEN))
+        finally: ziel.close()
+        kopiert = time.perf_counter()
+        with open(roh, 'rb') as ein, gzip.open(datei + '.part', 'wb', compresslevel=GZIP_STUFE) as aus:
+            # auch das Komprimieren in Schritten, damit es Anfragen auf einem knappen Kern nicht verdrängt
+            while block := ein.read(SCHRITT_SEITEN * 1024): aus.write(block); time.sleep(PAUSE_SEKUNDEN)
+        os.replace(datei + '.part', datei); groesse = os.path.getsize(roh)
+    finally:
+        quelle.close()
+        for rest in (roh, datei + '.part'):
+            if os.path.exists(rest): os.remove(rest)
+    aufraeumen(ziel_verzeichnis)
+    return {'datei': datei, 'bytes': groesse, 'bytes_gz': os.path.getsize(datei), 'kopieren_s': round(kopiert - start, 3), 'gesamt_s': round(time.perf_counter() - start, 3)}
+
+def sicherungen(verzeichnis):
+    # [(zeit, anlass, pfad)], neueste zuerst
+    if not os.path.isdir(verzeichnis): return []
+    treffer = [(_DATEI.match(name), name) for name in os.listdir(verzeichnis)]
+    return sorted(((datetime.strptime(m.group(1), '%Y%m%d-%H%M%S-%f'), m.group(2), os.path.join(verzeichnis, name)) for m, name in treffer if m), reverse=True)
+
+def aufraeumen(verzeichnis, jetzt=None):
+    # Löscht alle Sicherungen, die keine der BEHALTEN-Regeln trifft; liefert die gelöschten Pfade
+    jetzt = jetzt or datetime.now(); alle = sicherungen(verzeichnis); behalten = set(s[2] for s in alle[:BEHALTEN_LETZTE]); tage = set(); monate = set()
+    for zeit, _, datei in alle:
+        tag, monat = zeit.date(), (zeit.year, zeit.month)
+        if (jetzt.date() - tag).days < BEHALTEN_TAGE and tag not in tage: tage.add(tag); behalten.add(datei)
+        if (jetzt.year - monat[0]) * 12 + jetzt.month - monat[1] < BEHALTEN_MONATE and monat not in monate: monate.add(monat); behalten.add(datei)
+    geloescht = [s[2] for s in alle if s[2] not in behalten]
+    for datei in geloescht: os.remove(datei)
+    return geloescht
+
+
+# --- Automatische Sicherungen ---
+class Planer:
+    # Ein Thread pro Datenbank arbeitet die festgehaltenen Zeitpunkte nacheinander ab
+    def __init__(self, pfad):
+        self.pfad = pfad; self._queue = queue.Queue(WARTESCHLANGE); self._thread = None; self._lock = threading.Lock()
+
+    def anfordern(self, anlass):
+        quelle = zeitpunkt_festhalten(self.pfad)
+        with self._lock:
+            try: self._queue.put_nowait((quelle, anlass))
+            except queue.Full: quelle.close(); log.warning("Sicherung '%s' übersprungen: %d Sicherungen warten bereits.", anlass, WARTESCHLANGE); return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._schleife, name='sicherung', daemon=True); self._thread.start()
+
+    def _schleife(self):
+        while True:
+            with self._lock:
+                try: quelle, anlass = self._queue.get_nowait()
+                except queue.Empty: self._thread = None; return
+            try: erstellen(self.pfad, anlass, quelle=quelle)
+            except Exception: log.exception("Sicherung '%s' fehlgeschlagen", anlass)
+            finally: self._queue.task_done()
+
+    def warten(self):
+        self._queue.join()
+
+
+_planer = {}
+_planer_lock = threading.Lock()
+
+def planer(pfad):
+    with _planer_lock:
+        if pfad not in _planer: _planer[pfad] = Planer(pfad)
+        return _planer[pfad]
+
+@beim_schliessen
+def _pool_geschlossen(pfad):
+    # Angeforderte Sicherungen laufen noch zu Ende, danach endet der Thread ohnehin
+    with _planer_lock: _planer.pop(pfad, None)
+
+def planen(pfad, anlass):
+    # Aus den Routen: hält den aktuellen Stand fest und sichert ihn im Hintergrund (wenn AUTOMATISCH)
+    if AUTOMATISCH: planer(pfad).anfordern(anlass)
+
+
+# --- Prüfen und Wiederherstellen ---
+def _entpacken(datei, ziel):
+    with gzip.open(datei, 'rb') as ein, open(ziel, 'wb') as aus: shutil.copyfileobj(ein, aus, 1 << 20)
+
+def _punkte(conn):
+    cursor = conn.cursor(); cursor.row_factory = None
+    return cursor.execute('SELECT spieler_id, item_id, punkte FROM loot_punkte WHERE punkte != 0 ORDER BY spieler_id, item_id')
+
+def punkte_unterschiede(sicherung, live):
+    # Mischt beide sortierten Punktestände in einem Durchlauf; liefert (spieler_id, item_id, punkte_sicherung, punkte_live)
+    a, b = _punkte(sicherung), _punkte(live); x, y = next(a, None), next(b, None)
+    while x is not None or y is not None:
+        if y is None or (x is not None and x[:2] < y[:2]): yield x[0], x[1], x[2], 0; x = next(a, None)
+        elif x is None or y[:2] < x[:2]: yield y[0], y[1], 0, y[2]; y = next(b, None)
+        else:
+            if x[2] != y[2]: yield x[0], x[1], x[2], y[2]
+            x, y = next(a, None), next(b, None)
+
+def pruefen(datei, live_pfad=None, zeilen=20):
+    # Integritätsprüfung einer Sicherung und (optional) Unterschiede in loot_punkte zur Live-Datenbank
+    with tempfile.TemporaryDirectory() as tmp:
+        roh = os.path.join(tmp, 'pruefen.db'); _entpacken(datei, roh)
+        conn = sqlite3.connect(roh)
+        try:
+            integritaet = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+            bericht = {'datei': datei, 'integritaet': integritaet, 'ok': integritaet == ['ok'], 'schema_version': conn.execute('PRAGMA user_version').fetchone()[0]}
+            if bericht['ok'] and live_pfad:
+                live = verbinden(live_pfad)
+                try:
+                    live.execute('BEGIN'); anzahl = 0; beispiele = []
+                    for unterschied in punkte_unterschiede(conn, live):
+                        anzahl += 1
+                        if len(beispiele) < zeilen: beispiele.append(unterschied)
+                    live.rollback()
+                finally: live.close()
+                bericht.update(unterschiede=anzahl, beispiele=beispiele)
+        finally: conn.close()
+    return bericht
+
+def wiederherstellen(datei, ziel):
+    # Spielt die Sicherung über die Backup-API in ziel ein (Schreiber auf ziel warten so lange) und erhöht danach
+    # alle Cache-Zähler über den bisherigen Stand hinaus, damit kein Worker einen alten Cache für gültig hält
+    from database_setup import migrieren
+    with tempfile.TemporaryDirectory() as tmp:
+        roh = os.path.join(tmp, 'wiederherstellen.db'); _entpacken(datei, roh)
+        quelle = sqlite3.connect(roh)
+        try:
+            if quelle.execute('PRAGMA integrity_check').fetchone()[0] != 'ok': raise ValueError(f"{datei} ist beschädigt (integrity_check)")
+            conn = verbinden(ziel)
+            try:
+                try: vorher = dict(conn.execute('SELECT schluessel, version FROM cache_versionen').fetchall())
+                except sqlite3.OperationalError: vorher = {}
+                quelle.backup(conn)
+                with conn:
+                    nachher = dict(conn.execute('SELECT schluessel, version FROM cache_versionen').fetchall())
+                    conn.executemany('INSERT INTO cache_versionen (schluessel, version) VALUES (?, ?) ON CONFLICT (schluessel) DO UPDATE SET version = excluded.version',
+                                     [(s, max(vorher.get(s, 0), nachher.get(s, 0)) + 1) for s in set(vorher) | set(nachher)])
+            finally: conn.close()
+        finally: quelle.close()
+    return migrieren(ziel)
+
+
+if __name__ == '__main__':
+    import gilden
+    parser = argparse.ArgumentParser(description='Online-Sicherungen der Datenbank erstellen, prüfen und wiederherstellen.')
+    parser.add_argument('befehl', choices=['erstellen', 'liste', 'pruefen', 'wiederherstellen', 'aufraeumen'])
+    parser.add_argument('datei', nargs='?', help='bei pruefen/wiederherstellen: die Sicherung (.db.gz)')
+    parser.add_argument('--ziel', help='bei wiederherstellen: Ziel-Datenbank (Standard: die Live-Datenbank)')
+    parser.add_argument('--ueberschreiben', action='store_true', help='bei wiederherstellen: eine bestehende Ziel-Datenbank ersetzen')
+    parser.add_argument('--backups', default=VERZEICHNIS, help=f'Backup-Verzeichnis (Standard: {VERZEICHNIS}, LOOT_BACKUPS)')
+    gilden.optionen(parser); args = parser.parse_args(); exit_code = 0
+    if args.befehl in ('pruefen', 'wiederherstellen') and not args.datei: parser.error(f'{args.befehl} braucht eine Sicherungsdatei')
+    if args.befehl in ('pruefen', 'wiederherstellen') and args.alle_gilden: parser.error(f'{args.befehl} gilt für eine Datenbank: --gilde NAME statt --alle-gilden')
+    for pfad in gilden.datenbanken(args):
+        if args.befehl == 'erstellen':
+            e = erstellen(pfad, 'manuell', args.backups)
+            print(f"{e['datei']}: {e['bytes'] / 1e6:.1f} MB, komprimiert {e['bytes_gz'] / 1e6:.1f} MB, Kopieren {e['kopieren_s']}s, gesamt {e['gesamt_s']}s")
+        elif args.befehl == 'liste':
+            for zeit, anlass, datei in sicherungen(verzeichnis_fuer(pfad, args.backups)): print(f"{zeit:%Y-%m-%d %H:%M:%S}  {anlass:<24} {os.path.getsize(datei) / 1e6:>8.1f} MB  {datei}")
+        elif args.befehl == 'aufraeumen':
+            geloescht = aufraeumen(verzeichnis_fuer(pfad, args.backups)); print(f"{pfad}: {len(geloescht)} Sicherungen gelöscht.")
+        elif args.befehl == 'pruefen':
+            b = pruefen(args.datei, pfad if os.path.exists(pfad) else None)
+            print(f"{b['datei']}: integrity_check {'ok' if b['ok'] else '; '.join(b['integritaet'][:5])}, Schema-Version {b['schema_version']}")
+            if 'unterschiede' in b:
+                print(f"{b['unterschiede']} Unterschiede in loot_punkte gegenüber {pfad} (Sicherung -> live):")
+                for spieler_id, item_id, alt, neu in b['beispiele']: print(f"  Spieler {spieler_id}, Item {item_id}: {alt} -> {neu}")
+            exit_code = 0 if b['ok'] else 1
+        else:
+            ziel = args.ziel or pfad
+            if os.path.exists(ziel) and not args.ueberschreiben: sys.exit(f"Fehler: {ziel} existiert; mit --ueberschreiben ersetzen (vorher am besten 'erstellen').")
+            try: alt, neu = wiederherstellen(args.datei, ziel)
+            except ValueError as e: sys.exit(f"Fehler: {e}")
+            print(f"{args.datei} nach {ziel} wiederhergestellt (Schema-Version {alt} -> {neu}).")
+    sys.exit(exit_code)
@@ -0,0 +1,46 @@
+// Auswahlfeld mit Suche für große Listen (Charaktere, Items): die Optionen kommen seitenweise vom
+// Server statt vollständig im HTML. Antwort der API: {"eintraege": [{id, ...}], "weiter": Schlüssel der nächsten Seite oder null}
+// suche: <input>, auswahl: <select>, mehr: Button für die nächste Seite,
+// url(q): Adresse ohne Seitenschlüssel, text(eintrag): Beschriftung, platzhalter: Text der leeren Option
+function auswahlFeld(suche, auswahl, mehr, url, text, platzhalter) {
+    let weiter = null, anfrage = 0, timer = null;
+
+    function option(wert, beschriftung) {
+        const element = document.createElement('option');
+        element.value = wert;
+        element.textContent = beschriftung;
+        return element;
+    }
+
+    function laden(anhaengen) {
+        const nummer = ++anfrage;
+        const nach = anhaengen && weiter !== null ? `&nach=${encodeURIComponent(JSON.stringify(weiter))}` : '';
+        return fetch(url(suche.value.trim()) + nach)
+            .then(response => response.json())
+            .then(daten => {
+                if (nummer !== anfrage) return;  // eine neuere Eingabe ist schon unterwegs
+                const vorher = auswahl.value;
+                if (!anhaengen) {
+                    auswahl.innerHTML = '';
+                    auswahl.appendChild(option('', platzhalter));
+                }
+                daten.eintraege.forEach(eintrag => auswahl.appendChild(option(eintrag.id, text(eintrag))));
+                weiter = daten.weiter;
+                mehr.hidden = weiter === null;
+                if (anhaengen) return;
+                auswahl.value = vorher;
+                if (!auswahl.value && daten.eintraege.length === 1) auswahl.value = daten.eintraege[0].id;
+                if (auswahl.value !== vorher) auswahl.dispatchEvent(new Event('change'));
+            });
+    }
+
+    suche.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => laden(false), 200);
+    });
+    mehr.addEventListener('click', event => {
+        event.preventDefault();
+        laden(true);
+    });
+    return { neuLaden: () => laden(false) };
+}
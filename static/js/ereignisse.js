@@ -0,0 +1,39 @@
+// Live-Feed für eine Seite: handler bildet Ereignistyp -> Funktion(event) ab, event.data ist JSON wie beim EventSource.
+// Antwortet der Server mit 204 (alle Stream-Plätze des Prozesses belegt) oder bricht der Stream endgültig ab,
+// wird stattdessen alle POLL_MS die JSON-Route neuUrl nach Ereignissen seit der zuletzt gesehenen ID gefragt.
+// Kommt dort keine JSON-Antwort (abgelaufene Sitzung leitet zum Login um, Serverfehler), endet das Abfragen;
+// nur Netzfehler werden wiederholt.
+function liveEreignisse(streamUrl, neuUrl, handler) {
+    const POLL_MS = 5000;
+    let letzteId = null, timer = null, beendet = false;
+    const quelle = new EventSource(streamUrl);
+    Object.keys(handler).forEach(typ => quelle.addEventListener(typ, event => {
+        if (event.lastEventId) letzteId = event.lastEventId;
+        handler[typ](event);
+    }));
+
+    function abfragen() {
+        fetch(letzteId === null ? neuUrl : `${neuUrl}?nach=${encodeURIComponent(letzteId)}`)
+            .then(response => {
+                if (!response.ok || response.redirected || !(response.headers.get('Content-Type') || '').includes('application/json')) throw new Error(`Live-Feed: HTTP ${response.status}`);
+                return response.json();
+            })
+            .then(antwort => {
+                antwort.ereignisse.forEach(e => {
+                    if (!beendet && handler[e.typ]) handler[e.typ]({ data: JSON.stringify(e.daten), lastEventId: String(e.id) });
+                });
+                letzteId = antwort.letzte_id;
+                if (!beendet) timer = setTimeout(abfragen, POLL_MS);
+            })
+            .catch(fehler => {
+                // fetch selbst scheitert nur am Netz (TypeError): dann später erneut versuchen
+                if (fehler instanceof TypeError && !beendet) { timer = setTimeout(abfragen, POLL_MS); return; }
+                console.warn(fehler); beendet = true;
+            });
+    }
+    quelle.addEventListener('error', () => {
+        if (quelle.readyState === EventSource.CLOSED && !beendet && timer === null) abfragen();
+    });
+
+    return { close() { beendet = true; quelle.close(); clearTimeout(timer); } };
+}
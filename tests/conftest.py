@@ -0,0 +1,30 @@
+import os, sys
+import pytest
+
+# Die Module liegen flach im Projektverzeichnis (import db, punkte, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import verbinden
+from database_setup import migrieren
+
+
+@pytest.fixture
+def pfad(tmp_path):
+    # Frisch migrierte Datenbank pro Test
+    pfad = str(tmp_path / 'test.db'); migrieren(pfad); return pfad
+
+@pytest.fixture
+def conn(pfad):
+    conn = verbinden(pfad); yield conn; conn.close()
+
+@pytest.fixture
+def raid(conn):
+    # Ein Benutzer, drei Charaktere, drei Items und ein offener Raid mit Reservierungen:
+    # A reserviert Item 1 und 2, B Item 1, C Item 3. Liefert die raid_id.
+    conn.execute("INSERT INTO users (username, password_hash, role) VALUES ('admin', 'x', 'admin')")
+    conn.executemany("INSERT INTO charaktere (user_id, charakter_name, klasse, rollen) VALUES (1, ?, 'Krieger', 'Tank')", [('A',), ('B',), ('C',)])
+    conn.executemany("INSERT INTO items (item_name, boss_name, raid_instanz) VALUES (?, 'Boss', 'Naxxramas')", [('Schwert',), ('Schild',), ('Helm',)])
+    raid_id = conn.execute("INSERT INTO raids (raid_instanz, raid_datum, raid_zeit) VALUES ('Naxxramas', '2026-10-20', '20:00')").lastrowid
+    for spieler_id, items in ((1, (1, 2)), (2, (1,)), (3, (3,))):
+        anmeldung_id = conn.execute("INSERT INTO anmeldungen (spieler_id, raid_id, rolle_angemeldet) VALUES (?, ?, 'Tank')", (spieler_id, raid_id)).lastrowid
+        conn.executemany('INSERT INTO reservierungen (anmeldung_id, item_id) VALUES (?, ?)', [(anmeldung_id, item_id) for item_id in items])
+    conn.commit(); return raid_id
@@ -0,0 +1,78 @@
+import sqlite3
+import pytest
+import benutzer_cache, item_katalog, protokoll, punkte_stand, raid_index
+from db import version_erhoehen, verbinden
+from punkte import punkte_vergeben, punkte_setzen, VERGABE
+
+# Die zweite Verbindung steht für einen anderen Worker: eine rohe sqlite3-Verbindung ohne Pfad,
+# die keinen In-Process-Cache dieses Prozesses anfasst und nur über cache_versionen Bescheid gibt.
+@pytest.fixture
+def anderer(pfad):
+    conn = sqlite3.connect(pfad); conn.row_factory = sqlite3.Row; yield conn; conn.close()
+
+@pytest.fixture
+def gesperrt(conn, raid):
+    punkte_vergeben(conn, raid); version_erhoehen(conn, 'loot_punkte', f'raid:{raid}'); conn.commit(); return raid
+
+def punkte_von(stand):
+    return {schluessel: e['punkte'] for schluessel, e in stand.eintraege.items()}
+
+def test_punktestand_sieht_commits_anderer_worker(conn, anderer, gesperrt):
+    vorher = punkte_stand.stand(conn)
+    assert punkte_stand.stand(conn) is vorher  # Treffer ohne neue Abfrage
+    with anderer: anderer.execute('UPDATE loot_punkte SET punkte = 5 WHERE spieler_id = 3'); version_erhoehen(anderer, 'loot_punkte')
+    assert punkte_von(punkte_stand.stand(conn)) == {(1, 1): 1, (1, 2): 1, (2, 1): 1, (3, 3): 5}
+
+def test_rollback_bleibt_nicht_im_punktestand(conn, anderer, gesperrt):
+    punkte_stand.stand(conn)
+    # Eigene Änderung samt Zählererhöhung wird zurückgerollt ...
+    punkte_setzen(conn, 1, 1, 77); version_erhoehen(conn, 'loot_punkte'); conn.rollback()
+    # ... und ein anderer Worker committet danach unter derselben Versionsnummer etwas anderes
+    with anderer: anderer.execute('UPDATE loot_punkte SET punkte = 5 WHERE spieler_id = 3'); version_erhoehen(anderer, 'loot_punkte')
+    assert punkte_von(punkte_stand.stand(conn)) == {(1, 1): 1, (1, 2): 1, (2, 1): 1, (3, 3): 5}
+
+def test_write_through_nach_dem_commit(conn, anderer, gesperrt):
+    vorher = punkte_stand.stand(conn)
+    punkte_setzen(conn, 1, 1, 0, art=VERGABE); version_erhoehen(conn, 'loot_punkte'); conn.commit()
+    punkte_stand.punkte_setzen(conn, 1, 1, 0)
+    nachher = punkte_stand.stand(conn)
+    assert nachher is not vorher and punkte_von(nachher) == {(1, 2): 1, (2, 1): 1, (3, 3): 1}
+    # Hat dazwischen ein anderer Worker committet, passt die Versionsnummer nicht mehr: der Snapshot wird verworfen
+    punkte_setzen(conn, 1, 2, 4); version_erhoehen(conn, 'loot_punkte'); conn.commit()
+    with anderer: anderer.execute('UPDATE loot_punkte SET punkte = 8 WHERE spieler_id = 3'); version_erhoehen(anderer, 'loot_punkte')
+    punkte_stand.punkte_setzen(conn, 1, 2, 4)
+    assert punkte_von(punkte_stand.stand(conn)) == {(1, 2): 4, (2, 1): 1, (3, 3): 8}
+
+def test_raid_index_sieht_commits_anderer_worker(conn, anderer, gesperrt):
+    raid_index.index_aufbauen(conn, gesperrt)
+    assert [(e['spieler_id'], e['punkte']) for e in raid_index.reservierungen_fuer_item(conn, gesperrt, 1)] == [(1, 1), (2, 1)]
+    with anderer: anderer.execute('UPDATE loot_punkte SET punkte = 3 WHERE spieler_id = 2 AND item_id = 1'); version_erhoehen(anderer, 'loot_punkte')
+    assert [(e['spieler_id'], e['punkte']) for e in raid_index.reservierungen_fuer_item(conn, gesperrt, 1)] == [(2, 3), (1, 1)]
+    # Abmeldung bei einem anderen Worker erhöht 'raid:<id>'
+    with anderer: anderer.execute('DELETE FROM anmeldungen WHERE spieler_id = 2'); version_erhoehen(anderer, f'raid:{gesperrt}')
+    assert [e['spieler_id'] for e in raid_index.reservierungen_fuer_item(conn, gesperrt, 1)] == [1]
+
+def test_item_katalog_sieht_commits_anderer_worker(conn, anderer, raid):
+    version_erhoehen(conn, 'items'); conn.commit()
+    katalog = item_katalog.katalog(conn)
+    assert item_katalog.katalog(conn) is katalog
+    with anderer: anderer.execute("INSERT INTO items (item_name, boss_name, raid_instanz) VALUES ('Zauberstab', 'Boss', 'Naxxramas')"); version_erhoehen(anderer, 'items')
+    assert 'Zauberstab' in [item['item_name'] for item in item_katalog.katalog(conn).items]
+
+def test_benutzer_cache_sieht_commits_anderer_worker(pfad, conn, anderer, raid, monkeypatch):
+    monkeypatch.setattr(benutzer_cache, 'TTL_SEKUNDEN', 0)
+    version_erhoehen(conn, 'users'); conn.commit()
+    assert benutzer_cache.laden(pfad, lambda: conn, 1) == (1, 'admin', 'admin')
+    with anderer: anderer.execute("UPDATE users SET role = 'member' WHERE id = 1"); version_erhoehen(anderer, 'users')
+    assert benutzer_cache.laden(pfad, lambda: conn, 1) == (1, 'admin', 'member')
+
+def test_log_aktionen_sehen_commits_anderer_worker(conn, anderer):
+    eintrag = lambda aktion: dict.fromkeys(protokoll.LOG_SPALTEN) | {'aktion': aktion, 'details': '-'}
+    with conn: protokoll.eintraege_schreiben(conn, [eintrag('Raid Erstellt')])
+    assert protokoll.aktionen(conn) == ['Raid Erstellt']
+    with anderer: protokoll.eintraege_schreiben(anderer, [eintrag('Item Vergeben')])
+    assert protokoll.aktionen(conn) == ['Item Vergeben', 'Raid Erstellt']
+    # Zurückgerollte neue Aktion: beim nächsten Schreiben wird der Zähler trotzdem erhöht
+    conn.execute('BEGIN'); protokoll.eintraege_schreiben(conn, [eintrag('Raid Gelöscht')]); conn.rollback()
+    with anderer: protokoll.eintraege_schreiben(anderer, [eintrag('Raid Gelöscht')])
+    assert protokoll.aktionen(conn) == ['Item Vergeben', 'Raid Erstellt', 'Raid Gelöscht']
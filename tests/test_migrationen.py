@@ -0,0 +1,62 @@
+import sqlite3
+from database_setup import migrieren, MIGRATIONEN
+
+# Schema der ersten Version (database_setup.py vor den Migrationen, ohne user_version)
+BASIS = [
+    'CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, zeitstempel TIMESTAMP DEFAULT CURRENT_TIMESTAMP, aktion TEXT NOT NULL, details TEXT NOT NULL, raid_id INTEGER)',
+    'CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT NOT NULL UNIQUE, boss_name TEXT NOT NULL, raid_instanz TEXT NOT NULL, ruestungstyp TEXT)',
+    "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'member')",
+    'CREATE TABLE charaktere (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, charakter_name TEXT NOT NULL UNIQUE, klasse TEXT NOT NULL, rollen TEXT NOT NULL, FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)',
+    "CREATE TABLE raids (id INTEGER PRIMARY KEY AUTOINCREMENT, raid_instanz TEXT NOT NULL, raid_datum DATE NOT NULL, raid_zeit TIME NOT NULL, raid_titel TEXT, status TEXT NOT NULL DEFAULT 'Offen', punkte_vergeben INTEGER NOT NULL DEFAULT 0, erstellt_am TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+    'CREATE TABLE anmeldungen (id INTEGER PRIMARY KEY AUTOINCREMENT, spieler_id INTEGER NOT NULL, raid_id INTEGER NOT NULL, rolle_angemeldet TEXT NOT NULL, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (raid_id) REFERENCES raids (id) ON DELETE CASCADE)',
+    'CREATE TABLE loot_punkte (spieler_id INTEGER, item_id INTEGER, punkte INTEGER NOT NULL DEFAULT 0, FOREIGN KEY (spieler_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (spieler_id, item_id))',
+    'CREATE TABLE reservierungen (anmeldung_id INTEGER NOT NULL, item_id INTEGER NOT NULL, FOREIGN KEY (anmeldung_id) REFERENCES anmeldungen (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (anmeldung_id, item_id))',
+    'CREATE TABLE wishlist (charakter_id INTEGER NOT NULL, item_id INTEGER NOT NULL, prioritaet INTEGER NOT NULL, FOREIGN KEY (charakter_id) REFERENCES charaktere (id) ON DELETE CASCADE, FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE, PRIMARY KEY (charakter_id, item_id))',
+]
+
+def basis_datenbank(pfad):
+    conn = sqlite3.connect(pfad)
+    for sql in BASIS: conn.execute(sql)
+    conn.execute("INSERT INTO users (username, password_hash) VALUES ('chef', 'x')")
+    conn.executemany("INSERT INTO charaktere (user_id, charakter_name, klasse, rollen) VALUES (1, ?, 'Magier', 'DPS')", [('A',), ('B',)])
+    conn.executemany("INSERT INTO items (item_name, boss_name, raid_instanz) VALUES (?, 'Boss', 'Naxxramas')", [('Stab',), ('Robe',)])
+    conn.execute("INSERT INTO raids (raid_instanz, raid_datum, raid_zeit) VALUES ('Naxxramas', '2026-01-01', '20:00')")
+    # Doppelte Anmeldung von A (gab es ohne UNIQUE-Index) mit unterschiedlichen Reservierungen
+    conn.executemany("INSERT INTO anmeldungen (spieler_id, raid_id, rolle_angemeldet) VALUES (?, 1, 'DPS')", [(1,), (1,), (2,)])
+    conn.executemany('INSERT INTO reservierungen (anmeldung_id, item_id) VALUES (?, ?)', [(1, 1), (2, 2), (3, 1)])
+    conn.executemany('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (?, ?, ?)', [(1, 1, 3), (2, 1, 0), (2, 2, 5)])
+    conn.executemany('INSERT INTO logs (aktion, details, raid_id) VALUES (?, ?, ?)', [('Raid Erstellt', '[chef] Raid angelegt', 1), ('Import', 'ohne Benutzer', None)])
+    conn.commit(); conn.close()
+
+def test_upgrade_von_der_ersten_version(tmp_path):
+    pfad = str(tmp_path / 'alt.db'); basis_datenbank(pfad)
+    assert migrieren(pfad) == (0, len(MIGRATIONEN))
+    conn = sqlite3.connect(pfad)
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert conn.execute('PRAGMA foreign_key_check').fetchall() == []
+    # Doppelte Anmeldung zusammengeführt, die Reservierungen der jüngeren hängen an der älteren
+    assert conn.execute('SELECT id, spieler_id FROM anmeldungen ORDER BY id').fetchall() == [(1, 1), (3, 2)]
+    assert conn.execute('SELECT anmeldung_id, item_id FROM reservierungen ORDER BY 1, 2').fetchall() == [(1, 1), (1, 2), (3, 1)]
+    # Benutzer aus dem alten details-Präfix, neue Spalten leer
+    assert conn.execute('SELECT aktion, benutzer, item_id, charakter_id FROM logs ORDER BY id').fetchall() == [('Raid Erstellt', 'chef', None, None), ('Import', None, None, None)]
+    # Der bisherige Punktestand ist die Startbuchung des Journals
+    assert conn.execute('SELECT spieler_id, item_id, art, wert FROM punkte_buchungen ORDER BY id').fetchall() == [(1, 1, 'uebernahme', 3), (2, 1, 'uebernahme', 0), (2, 2, 'uebernahme', 5)]
+    assert conn.execute('SELECT spieler_id, item_id, punkte FROM loot_punkte ORDER BY 1, 2').fetchall() == [(1, 1, 3), (2, 1, 0), (2, 2, 5)]
+    tabellen = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'cache_versionen', 'logs_archiv', 'raid_events', 'punkte_snapshots', 'punkte_snapshot_werte', 'idempotenz'} <= tabellen
+    conn.close()
+
+def test_upgrade_stimmt_mit_neuer_datenbank_ueberein(tmp_path):
+    # Gleiche Tabellen, Spalten und Indizes wie eine von Grund auf angelegte Datenbank
+    alt, neu = str(tmp_path / 'alt.db'), str(tmp_path / 'neu.db'); basis_datenbank(alt); migrieren(alt); migrieren(neu)
+    def schema(pfad):
+        conn = sqlite3.connect(pfad)
+        try:
+            objekte = conn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY 1, 2").fetchall()
+            spalten = {t: conn.execute(f'PRAGMA table_info({t})').fetchall() for typ, t, _ in objekte if typ == 'table'}
+            return objekte, spalten
+        finally: conn.close()
+    assert schema(alt) == schema(neu)
+
+def test_migrieren_ist_wiederholbar(pfad):
+    assert migrieren(pfad) == (len(MIGRATIONEN), len(MIGRATIONEN))
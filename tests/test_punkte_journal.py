@@ -0,0 +1,58 @@
+import punkte
+from punkte import punkte_vergeben, punkte_entziehen, punkte_setzen, abweichungen, neu_aufbauen, stand_bis, stand_nach_raid, snapshot_erstellen, VERGABE
+
+def loot_punkte(conn):
+    return {(row['spieler_id'], row['item_id']): row['punkte'] for row in conn.execute('SELECT * FROM loot_punkte') if row['punkte']}
+
+def raid_sperren(conn, raid_id):
+    gesamt = punkte_vergeben(conn, raid_id); conn.commit(); return gesamt
+
+def test_gutschrift_vergabe_entzug_bleiben_im_einklang(conn, raid):
+    assert raid_sperren(conn, raid) == 4
+    assert loot_punkte(conn) == {(1, 1): 1, (1, 2): 1, (2, 1): 1, (3, 3): 1}
+    punkte_setzen(conn, 1, 1, 0, art=VERGABE, raid_id=raid)
+    punkte_setzen(conn, 2, 3, 0, art=VERGABE, raid_id=raid)  # ohne Reservierung: keine Nullzeile
+    punkte_setzen(conn, 3, 3, 7)
+    anmeldung_b = conn.execute('SELECT id FROM anmeldungen WHERE spieler_id = 2').fetchone()[0]
+    punkte_entziehen(conn, anmeldung_id=anmeldung_b); conn.commit()
+    assert loot_punkte(conn) == {(1, 2): 1, (3, 3): 7}
+    assert conn.execute('SELECT COUNT(*) FROM loot_punkte WHERE spieler_id = 2 AND item_id = 3').fetchone()[0] == 0
+    assert list(abweichungen(conn)) == []
+    assert stand_bis(conn) == loot_punkte(conn)
+
+def test_entzug_ohne_genug_punkte_aendert_nichts(conn, raid):
+    raid_sperren(conn, raid); punkte_setzen(conn, 1, 1, 0, art=VERGABE, raid_id=raid)
+    punkte_entziehen(conn, raid_id=raid); conn.commit()
+    # A hatte auf Item 1 nur noch 0 Punkte: wie bisher bleibt es dabei, statt negativ zu werden
+    assert loot_punkte(conn) == {}
+    assert list(abweichungen(conn)) == []
+
+def test_abweichungen_und_neu_aufbauen(conn, raid):
+    raid_sperren(conn, raid); punkte_setzen(conn, 3, 3, 4); conn.commit()
+    soll = loot_punkte(conn)
+    # loot_punkte an drei Stellen beschädigen: falscher Wert, fehlende Zeile, Zeile ohne Buchung
+    conn.execute('UPDATE loot_punkte SET punkte = 9 WHERE spieler_id = 1 AND item_id = 1')
+    conn.execute('DELETE FROM loot_punkte WHERE spieler_id = 3 AND item_id = 3')
+    conn.execute('INSERT INTO loot_punkte (spieler_id, item_id, punkte) VALUES (2, 2, 5)')
+    conn.commit()
+    assert sorted(abweichungen(conn)) == [(1, 1, 9, 1), (2, 2, 5, 0), (3, 3, 0, 4)]
+    assert neu_aufbauen(conn) == 3; conn.commit()
+    assert list(abweichungen(conn)) == []
+    assert loot_punkte(conn) == soll
+
+def test_abspielen_ab_snapshot(conn, raid):
+    raid_sperren(conn, raid); snapshot_erstellen(conn); conn.commit()
+    punkte_setzen(conn, 1, 2, 0, art=VERGABE, raid_id=raid); punkte_setzen(conn, 2, 1, 6); conn.commit()
+    # Nach dem Snapshot geänderte Buchungen des Journals davor dürfen keine Rolle mehr spielen
+    conn.execute("UPDATE punkte_buchungen SET wert = 100 WHERE art = 'raid'"); conn.commit()
+    assert stand_bis(conn) == {(1, 1): 1, (2, 1): 6, (3, 3): 1}
+    assert list(abweichungen(conn)) == []
+
+def test_automatischer_snapshot_und_stand_nach_raid(conn, raid, monkeypatch):
+    monkeypatch.setattr(punkte, 'SNAPSHOT_ABSTAND', 1)
+    raid_sperren(conn, raid)
+    assert conn.execute('SELECT COUNT(*) FROM punkte_snapshots').fetchone()[0] == 1
+    punkte_setzen(conn, 1, 1, 0, art=VERGABE, raid_id=raid); punkte_setzen(conn, 3, 3, 2); conn.commit()
+    assert stand_nach_raid(conn, raid) == {(1, 2): 1, (2, 1): 1, (3, 3): 1}
+    assert stand_nach_raid(conn, raid + 1) is None
+    assert stand_bis(conn) == loot_punkte(conn)